@@ -267,10 +267,22 @@ def main():
         # Insert batch into MongoDB
         if mongo_collection is not None and batch_docs:
             try:
-                result = mongo_collection.insert_many(batch_docs)
-                print(f"[Bluesky Scraper] Inserted {len(result.inserted_ids)} posts to MongoDB for batch {batch_num}.", flush=True)
+                result = mongo_collection.insert_many(batch_docs, ordered=False)
+                inserted = len(result.inserted_ids)
+                print(f"[Bluesky Scraper] Inserted {inserted} posts to MongoDB for batch {batch_num}.", flush=True)
+            except pymongo.errors.BulkWriteError as e:
+                # Duplicates are rejected one by one, the other posts are still inserted
+                inserted = e.details.get("nInserted", 0)
+                print(f"[Bluesky Scraper] MongoDB insert error for batch {batch_num}: {e}", flush=True)
             except Exception as e:
+                inserted = 0
                 print(f"[Bluesky Scraper] MongoDB insert error for batch {batch_num}: {e}", flush=True)
+            if inserted:
+                # Unanalysed post counters kept by the sentiment-analysis service (see its db_connection.py)
+                try:
+                    mongo_db['analysis_stats'].update_one({"_id": "unanalysed_backlog"}, {"$inc": {"bluesky": inserted}})
+                except Exception as e:
+                    print(f"[Bluesky Scraper] Error updating the unanalysed post count: {e}", flush=True)
         print(f"[Bluesky Scraper] [Batch {batch_num}] Fetched {len(posts)} posts, total fetched: {post_count}, total saved: {saved_count}", flush=True)
         if saved_count >= MAX_POSTS:
             break
@@ -13,6 +13,7 @@ import requests
 from pathlib import Path
 from dotenv import load_dotenv
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 
 # Load .env from parent directory (server/.env)
 env_path = Path(__file__).resolve().parent.parent / ".env"
@@ -29,6 +30,27 @@ MONGO_URI = os.getenv("MONGO_URI")
 client = MongoClient(MONGO_URI)
 db = client[os.getenv("MONGO_DB_NAME", "social-listening")]
 db_collection = db["reddit_posts"]
+# Unanalysed post counters kept by the sentiment-analysis service (see its db_connection.py)
+stats_collection = db["analysis_stats"]
+
+
+def save_posts(posts_list):
+    """Insert scraped posts, skipping ones already stored, and add the new ones to the unanalysed count"""
+    try:
+        inserted = len(db_collection.insert_many(posts_list, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Duplicates are rejected one by one, the other posts are still inserted
+        inserted = e.details.get("nInserted", 0)
+        print(f"MongoDB insertion error: {e}")
+    except Exception as e:
+        print(f"MongoDB insertion error: {e}")
+        return
+    print(f"Inserted {inserted} posts into MongoDB")
+    if inserted:
+        try:
+            stats_collection.update_one({"_id": "unanalysed_backlog"}, {"$inc": {"reddit": inserted}})
+        except Exception as e:
+            print(f"Error updating the unanalysed post count: {e}")
 
 
 class RedditScraper:
@@ -115,11 +137,7 @@ class RedditScraper:
                 }
                 posts_list.append(post_dict)
             if posts_list:
-                try:
-                    db_collection.insert_many(posts_list)
-                    print(f"Inserted {len(posts_list)} posts into MongoDB")
-                except Exception as e:
-                    print(f"MongoDB insertion error: {e}")
+                save_posts(posts_list)
                 
             print(f"Scraped {len(posts_list)} posts from r/{subreddit_name}")
         except Exception as e:
@@ -206,11 +224,7 @@ class RedditScraper:
                 posts_list.append(post_dict)
 
             if posts_list:
-                try:
-                    db_collection.insert_many(posts_list)
-                    print(f"Inserted {len(posts_list)} posts into MongoDB")
-                except Exception as e:
-                    print(f"MongoDB insertion error: {e}")
+                save_posts(posts_list)
                 
             print(f"Found {len(posts_list)} posts matching '{query}' in r/{subreddit_name}")
         except Exception as e:
@@ -257,11 +271,7 @@ class RedditScraper:
             posts_list.append(post_dict)
 
         if posts_list:
-                try:
-                    db_collection.insert_many(posts_list)
-                    print(f"Inserted {len(posts_list)} posts into MongoDB")
-                except Exception as e:
-                    print(f"MongoDB insertion error: {e}")
+                save_posts(posts_list)
             
             
         print(f"Found {len(posts_list)} posts matching '{query}' across all of Reddit")
@@ -474,11 +484,7 @@ class RedditScraper:
                 all_results.append(post_dict)
 
             if posts_list:
-                try:
-                    db_collection.insert_many(posts_list)
-                    print(f"Inserted {len(posts_list)} posts into MongoDB")
-                except Exception as e:
-                    print(f"MongoDB insertion error: {e}")
+                save_posts(posts_list)
                 
         print(f"Found {len(all_results)} posts matching '{query}' across {len(subreddit_list)} subreddits")
         return all_results
@@ -0,0 +1,274 @@
+"""
+Pick the torch thread count, RoBERTa batch size and precision for this host.
+
+Each configuration scores a synthetic agricultural corpus and is measured in posts/second and
+p95 batch latency. The fastest configuration whose labels agree with fp32 (and that meets the
+optional latency budget) is written to models/autotune.json, which CombinedAnalyzer reads at boot.
+
+Run from the sentiment-analysis directory:
+    python autotune.py [--threads 4 8 16] [--batch-sizes 16 32 64 128] [--precisions fp32 bf16 int8]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+
+from inference_pool import configured_pool_shape
+from spacy_bundle import load_gazetteer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TUNING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "autotune.json")
+
+# Bump when the meaning of the tuning file changes so older files are ignored
+TUNING_VERSION = 1
+
+DEFAULT_BATCH_SIZES = (16, 32, 64, 128)
+DEFAULT_PRECISIONS = ("fp32", "bf16", "int8")
+
+# Share of labels a reduced-precision configuration must keep identical to fp32
+DEFAULT_MIN_AGREEMENT = 0.97
+
+SENTENCE_TEMPLATES = (
+    "{crop} fields showing {symptom} after the {season} rains",
+    "Worried about {disease} spreading through the {crop} this {season}",
+    "Great {season} for {crop}, no sign of {disease} so far",
+    "Neighbour lost half his {crop} to {disease}, the {symptom} came on fast",
+    "Sprayed the {crop} early this {season}, hoping to keep {disease} away",
+    "Yields looking strong, the {crop} recovered well from the {symptom}",
+    "Anyone else seeing {symptom} on their {crop}? Could it be {disease}?",
+    "Prices for {crop} are up again before the {season}"
+)
+
+def tuning_path(path=None):
+    """The tuning file: the explicit path, then SENTIMENT_TUNING_PATH, then models/autotune.json"""
+    return path or os.environ.get("SENTIMENT_TUNING_PATH", DEFAULT_TUNING_PATH)
+
+def host_fingerprint():
+    """Properties of the host a tuning result is only valid for"""
+    return {
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+        "torch": torch.__version__
+    }
+
+def load_tuning(path=None):
+    """
+    Read the tuning file written by autotune
+
+    Returns:
+        dict: The tuning report, or None if there is none or it was tuned on a different host
+    """
+    path = tuning_path(path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            tuning = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read tuning file {path}: {str(e)}")
+        return None
+    if tuning.get("version") != TUNING_VERSION:
+        logger.warning(f"Ignoring tuning file {path} from an older autotune version, run 'python autotune.py' again")
+        return None
+    if tuning.get("host") != host_fingerprint():
+        logger.warning(f"Ignoring tuning file {path}, it was tuned on a different host ({tuning.get('host')})")
+        return None
+    if tuning.get("pool") != configured_pool_shape():
+        logger.warning(f"Ignoring tuning file {path}, it was tuned for a different inference pool ({tuning.get('pool')})")
+        return None
+    return tuning
+
+def save_tuning(tuning, path=None):
+    """Write a tuning report where load_tuning will find it"""
+    path = tuning_path(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(tuning, f, indent=2)
+    logger.info(f"Wrote tuning to {path}")
+
+def synthetic_corpus(posts, seed=42):
+    """
+    Agricultural posts built from the gazetteer. Most are one to three sentences, with a tail
+    of long posts so multi-window scoring is part of the measurement
+    """
+    gazetteer = load_gazetteer()
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(posts):
+        sentence_count = rng.randint(1, 3) if rng.random() < 0.9 else rng.randint(20, 60)
+        sentences = [
+            rng.choice(SENTENCE_TEMPLATES).format(
+                crop=rng.choice(gazetteer["CROP"]),
+                disease=rng.choice(gazetteer["DISEASE"]),
+                symptom=rng.choice(gazetteer["SYMPTOM"]),
+                season=rng.choice(gazetteer["SEASONAL"])
+            )
+            for _ in range(sentence_count)
+        ]
+        corpus.append(". ".join(sentences))
+    return corpus
+
+def measure(analyzer, cleaned_texts, batch_size):
+    """
+    Score the corpus in batches of batch_size, as the batch endpoints do
+
+    Returns:
+        tuple: (posts per second, p95 batch latency in milliseconds, sentiment labels)
+    """
+    # Warm up allocator and kernel caches outside the timing
+    analyzer.analyze_cleaned_batch(cleaned_texts[:batch_size], batch_size)
+
+    latencies = []
+    labels = []
+    start_time = time.perf_counter()
+    for start in range(0, len(cleaned_texts), batch_size):
+        batch_start = time.perf_counter()
+        results = analyzer.analyze_cleaned_batch(cleaned_texts[start:start + batch_size], batch_size)
+        latencies.append(time.perf_counter() - batch_start)
+        labels.extend(result["sentiment"]["sentiment"] for result in results)
+    elapsed = time.perf_counter() - start_time
+    return len(cleaned_texts) / elapsed, 1000 * float(np.percentile(latencies, 95)), labels
+
+def run_sweep(analyzer, corpus, threads=None, batch_sizes=DEFAULT_BATCH_SIZES, precisions=DEFAULT_PRECISIONS,
+              min_agreement=DEFAULT_MIN_AGREEMENT, max_p95_ms=None):
+    """
+    Measure every thread count, batch size and precision combination and pick the best
+
+    Args:
+        analyzer (CombinedAnalyzer): Loaded analyzer, left running the selected configuration
+        corpus (list): Raw texts, e.g. from synthetic_corpus
+        threads (list): torch intra-op thread counts. Defaults to powers of two up to the core count.
+            With an inference pool configured, only its threads per worker are measured, since the
+            workers set their own thread count
+        batch_sizes (list): RoBERTa batch sizes
+        precisions (list): Precision modes; fp32 is always measured as the label reference
+        min_agreement (float): Minimum share of labels identical to fp32
+        max_p95_ms (float): Optional p95 latency budget per batch
+    Returns:
+        dict: The tuning report, with the selected configuration under "selected"
+    """
+    cores = os.cpu_count() or 1
+    pool = configured_pool_shape()
+    if pool is not None:
+        if threads and list(threads) != [pool["threads_per_worker"]]:
+            logger.warning(f"Inference pool workers run {pool['threads_per_worker']} torch threads each, "
+                           f"measuring that instead of {threads}")
+        threads = [pool["threads_per_worker"]]
+    elif not threads:
+        threads = sorted({min(cores, 2 ** power) for power in range(cores.bit_length() + 1)})
+    precisions = ["fp32"] + [precision for precision in precisions if precision != "fp32"]
+    cleaned_texts = [analyzer.clean_text(text) for text in corpus]
+
+    results = []
+    reference_labels = None
+    for precision in precisions:
+        analyzer.set_precision(precision)
+        agreement = None
+        for thread_count in threads:
+            torch.set_num_threads(thread_count)
+            for batch_size in batch_sizes:
+                posts_per_second, p95_ms, labels = measure(analyzer, cleaned_texts, batch_size)
+                if reference_labels is None:
+                    reference_labels = labels
+                if agreement is None:
+                    agreement = float(np.mean([label == reference for label, reference in zip(labels, reference_labels)]))
+                results.append({
+                    "precision": precision,
+                    "torch_threads": thread_count,
+                    "batch_size": batch_size,
+                    "posts_per_second": round(posts_per_second, 2),
+                    "p95_ms": round(p95_ms, 2),
+                    "label_agreement": round(agreement, 5)
+                })
+                logger.info(f"Autotune {precision}, {thread_count} threads, batch {batch_size}: "
+                            f"{posts_per_second:.1f} posts/s, p95 {p95_ms:.1f}ms, agreement {agreement:.3f}")
+
+    accurate = [result for result in results if result["label_agreement"] >= min_agreement]
+    within_budget = [result for result in accurate if max_p95_ms is None or result["p95_ms"] <= max_p95_ms]
+    if within_budget:
+        selected = max(within_budget, key=lambda result: result["posts_per_second"])
+    else:
+        logger.warning(f"No configuration meets the {max_p95_ms}ms p95 budget, selecting the lowest latency one")
+        selected = min(accurate, key=lambda result: result["p95_ms"])
+
+    apply_tuning(analyzer, selected)
+    return {
+        "version": TUNING_VERSION,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": host_fingerprint(),
+        "pool": pool,
+        "model_id": analyzer.model_id,
+        "backend": analyzer.backend,
+        "corpus_posts": len(corpus),
+        "min_agreement": min_agreement,
+        "max_p95_ms": max_p95_ms,
+        "selected": selected,
+        "results": results
+    }
+
+def apply_tuning(analyzer, selected):
+    """Switch a loaded analyzer to a tuned configuration"""
+    analyzer.set_precision(selected["precision"])
+    torch.set_num_threads(selected["torch_threads"])
+    analyzer.batch_size = selected["batch_size"]
+
+def autotune_on_startup(analyzer, path=None):
+    """
+    Run a short sweep at boot when SENTIMENT_AUTOTUNE is on and this host has no tuning yet.
+    The sweep runs in a subprocess: the server forks its inference workers after startup, and
+    forking a process whose torch/OpenMP thread pool has already run inference can hang them
+
+    Returns:
+        dict: The new tuning report, or None if no sweep ran
+    """
+    if os.environ.get("SENTIMENT_AUTOTUNE", "").lower() not in ("1", "true", "yes", "on"):
+        return None
+    if analyzer.tuning is not None:
+        return None
+    logger.info("No tuning for this host, running a startup autotune sweep")
+    posts = int(os.environ.get("SENTIMENT_AUTOTUNE_POSTS", 128))
+    path = tuning_path(path)
+    script = os.path.abspath(__file__)
+    result = subprocess.run([sys.executable, script, "--posts", str(posts), "--output", path],
+                            cwd=os.path.dirname(script))
+    if result.returncode != 0:
+        logger.error(f"Startup autotune sweep failed with exit code {result.returncode}, serving untuned")
+        return None
+    tuning = load_tuning(path)
+    if tuning is None:
+        return None
+    apply_tuning(analyzer, tuning["selected"])
+    analyzer.tuning = tuning
+    return tuning
+
+if __name__ == '__main__':
+    from combined_analyzer import CombinedAnalyzer, PRECISION_MODES
+    from sentiment_cache import SentimentCache
+
+    parser = argparse.ArgumentParser(description="Tune thread count, batch size and precision for this host")
+    parser.add_argument("--threads", type=int, nargs="+", default=None)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--precisions", choices=PRECISION_MODES, nargs="+", default=list(DEFAULT_PRECISIONS))
+    parser.add_argument("--posts", type=int, default=256, help="Size of the synthetic corpus")
+    parser.add_argument("--min-agreement", type=float, default=DEFAULT_MIN_AGREEMENT)
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Latency budget per batch")
+    parser.add_argument("--output", default=None, help="Defaults to SENTIMENT_TUNING_PATH, then models/autotune.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Measure the model, not the result cache
+    analyzer = CombinedAnalyzer(precision="fp32", cache=SentimentCache(max_memory_entries=1))
+    tuning = run_sweep(analyzer, synthetic_corpus(args.posts), args.threads, args.batch_sizes, args.precisions,
+                       args.min_agreement, args.max_p95_ms)
+    save_tuning(tuning, args.output)
+    print(json.dumps(tuning["selected"], indent=2))
@@ -0,0 +1,67 @@
+"""
+Measure the per-post cost of text cleaning: the original four re.sub passes, the fused
+pattern applied post by post and over a whole batch, and the batch with every offset map built.
+
+Run from the sentiment-analysis directory:
+    python benchmarks/benchmark_cleaning.py --posts 20000
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_cleaning import clean_batch_with_offsets, clean_text_with_offsets
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "preprocessing", "llm-tuning", "train_data.json")
+
+def load_corpus(posts):
+    """Repeat the training texts, each with a URL, mention and hashtag, up to the requested number of posts"""
+    with open(DATA_FILE, 'r', encoding='utf-8') as f:
+        texts = [item["text"] for item in json.load(f)]
+    return [f"@farmer{i} {texts[i % len(texts)]} https://example.com/post/{i} #harvest" for i in range(posts)]
+
+def legacy_clean(text):
+    """The original cleaning: four uncompiled re.sub passes per post, without offsets"""
+    text = text.lower()
+    text = re.sub(r'https?://\S+|www\.\S+', '', text)
+    text = re.sub(r'[@#]\w+', '', text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def time_per_post(clean, corpus, repeats=5):
+    """Best-of-repeats microseconds per post"""
+    best = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        clean(corpus)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return round(1e6 * best / len(corpus), 2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text cleaning")
+    parser.add_argument("--posts", type=int, default=20000)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.posts)
+    results = {
+        "legacy_us_per_post": time_per_post(lambda texts: [legacy_clean(text) for text in texts], corpus),
+        "single_us_per_post": time_per_post(lambda texts: [clean_text_with_offsets(text) for text in texts], corpus),
+        "batch_us_per_post": time_per_post(clean_batch_with_offsets, corpus),
+        # Offset maps are built only for posts with terms or entities; this is the cost when every post has one
+        "batch_with_offsets_us_per_post": time_per_post(
+            lambda texts: [offset_map.to_original(0) for _, offset_map in clean_batch_with_offsets(texts)], corpus
+        )
+    }
+    results["cleaned_text_identical"] = [legacy_clean(text) for text in corpus] == \
+        [cleaned_text for cleaned_text, _ in clean_batch_with_offsets(corpus)]
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Show that gazetteer match time stays flat as the vocabulary grows, compared with token-pattern Matcher rules.
+
+The real gazetteer is padded with synthetic one- to three-word terms up to each size.
+
+Run from the sentiment-analysis directory:
+    python benchmarks/benchmark_gazetteer.py --sizes 100 1000 10000 50000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+import spacy
+from spacy.matcher import Matcher
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_spacy_profiles import load_corpus
+from spacy_bundle import load_gazetteer
+
+def synthetic_gazetteer(size, seed=42):
+    """The real gazetteer plus random pseudo-words spread over its labels, size terms in total"""
+    gazetteer = load_gazetteer()
+    labels = list(gazetteer)
+    rng = random.Random(seed)
+    while sum(len(terms) for terms in gazetteer.values()) < size:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(rng.randint(1, 3))]
+        gazetteer[rng.choice(labels)].append(" ".join(words))
+    return gazetteer
+
+def time_matching(component, docs, repeats=3):
+    """Best-of-repeats seconds to run a matcher component over every doc"""
+    best = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        for doc in docs:
+            component(doc)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+class TokenPatternMatcher:
+    """The old approach: one Matcher token pattern per term"""
+    def __init__(self, nlp, gazetteer):
+        self.matcher = Matcher(nlp.vocab)
+        for label, terms in gazetteer.items():
+            self.matcher.add(label, [[{"LOWER": word} for word in term.lower().split()] for term in terms])
+
+    def __call__(self, doc):
+        self.matcher(doc)
+        return doc
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gazetteer matching against vocabulary size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--posts", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = [text.lower() for text in load_corpus(args.posts)]
+    results = []
+    for size in args.sizes:
+        gazetteer = synthetic_gazetteer(size)
+
+        nlp = spacy.blank("en")
+        phrase_matcher = nlp.add_pipe("agricultural_matcher")
+        phrase_matcher.add_patterns(gazetteer)
+        token_matcher = TokenPatternMatcher(nlp, gazetteer)
+        docs = [nlp.make_doc(text) for text in corpus]
+
+        phrase_seconds = time_matching(phrase_matcher, docs)
+        token_seconds = time_matching(token_matcher, docs)
+
+        results.append({
+            "terms": sum(len(terms) for terms in gazetteer.values()),
+            "phrase_matcher_ms_per_post": round(1000 * phrase_seconds / len(corpus), 4),
+            "token_matcher_ms_per_post": round(1000 * token_seconds / len(corpus), 4)
+        })
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
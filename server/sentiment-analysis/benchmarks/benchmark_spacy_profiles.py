@@ -0,0 +1,59 @@
+"""
+Compare preprocessing throughput of the lean and full spaCy pipeline profiles.
+
+Run from the sentiment-analysis directory:
+    python benchmarks/benchmark_spacy_profiles.py --posts 5000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from combined_analyzer import CombinedAnalyzer, SPACY_PROFILES
+from sentiment_cache import SentimentCache
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "preprocessing", "llm-tuning", "train_data.json")
+
+def load_corpus(posts):
+    """Repeat the training texts until the corpus has the requested number of posts"""
+    with open(DATA_FILE, 'r', encoding='utf-8') as f:
+        texts = [item["text"] for item in json.load(f)]
+    return [texts[i % len(texts)] for i in range(posts)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark spaCy pipeline profiles")
+    parser.add_argument("--posts", type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    corpus = load_corpus(args.posts)
+    results = {}
+    terms = {}
+
+    for profile in SPACY_PROFILES:
+        # Memory-only cache so the benchmark leaves the on-disk tier alone
+        analyzer = CombinedAnalyzer(spacy_profile=profile, cache=SentimentCache(max_memory_entries=1))
+        analyzer.preprocess_batch(corpus[:100])  # warm up
+
+        start_time = time.perf_counter()
+        preprocessed = analyzer.preprocess_batch(corpus)
+        elapsed = time.perf_counter() - start_time
+
+        results[profile] = {
+            "components": analyzer.nlp.pipe_names,
+            "posts_per_second": round(len(corpus) / elapsed, 1)
+        }
+        terms[profile] = [item["agricultural_terms"] for item in preprocessed]
+
+    results["lean_speedup"] = round(results["lean"]["posts_per_second"] / results["full"]["posts_per_second"], 2)
+    results["matcher_output_identical"] = terms["lean"] == terms["full"]
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Report how often the cascade fast path agrees with the full model, per confidence threshold,
+on the held-out split of train_data.json.
+
+Run from the sentiment-analysis directory:
+    python benchmarks/cascade_report.py --sample-size 500
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from combined_analyzer import CombinedAnalyzer
+from precision_check import DATA_FILE, load_held_out_texts
+from sentiment_cache import SentimentCache
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cascade fast-path agreement with the full model")
+    parser.add_argument("--sample-size", type=int, default=500)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--data-file", default=DATA_FILE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    texts = load_held_out_texts(args.data_file, args.sample_size)
+    analyzer = CombinedAnalyzer(cache=SentimentCache(max_memory_entries=1))
+    report = analyzer.evaluate_cascade(texts, thresholds=args.thresholds)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
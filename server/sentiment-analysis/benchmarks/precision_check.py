@@ -0,0 +1,45 @@
+"""
+Compare a reduced-precision sentiment model against fp32 on the held-out split of train_data.json.
+
+Run from the sentiment-analysis directory:
+    python benchmarks/precision_check.py --precision int8 --sample-size 200
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+from sklearn.model_selection import train_test_split
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from combined_analyzer import CombinedAnalyzer, PRECISION_MODES
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "preprocessing", "llm-tuning", "train_data.json")
+
+def load_held_out_texts(data_file, sample_size):
+    """Return the validation texts, split the same way as tuning_script.py"""
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    texts = [item["text"] for item in data]
+    _, val_texts = train_test_split(texts, test_size=0.2, random_state=42)
+    return val_texts[:sample_size]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure accuracy drift of a model precision mode against fp32")
+    parser.add_argument("--precision", choices=PRECISION_MODES, default="int8")
+    parser.add_argument("--sample-size", type=int, default=200)
+    parser.add_argument("--data-file", default=DATA_FILE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    texts = load_held_out_texts(args.data_file, args.sample_size)
+    analyzer = CombinedAnalyzer(precision=args.precision)
+    report = analyzer.evaluate_precision(texts)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,118 +1,230 @@
+import contextlib
 import datetime
+import hashlib
 import json
 import logging
 import numpy as np
 import os
-import re
 import random
 import spacy
 import spacy.util
+import time
 import torch
 from pathlib import Path
 from spacy.cli import download
-from spacy.matcher import Matcher
 from spacy.training import Example
 from tqdm import tqdm
-from transformers import RobertaTokenizer, RobertaForSequenceClassification
+from transformers import RobertaTokenizerFast, RobertaForSequenceClassification
+from autotune import load_tuning
+from onnx_backend import DEFAULT_ONNX_PATH, load_onnx_backend
+from model_artifacts import (DEFAULT_SPACY_MODEL, load_manifest, resolve_artifact_dir,
+                             sentiment_model_path, spacy_model_path)
+from keyword_lexicon import KeywordLexicon
+from spacy_bundle import AGRICULTURAL_SPAN_KEY, build_pipeline, load_bundle
+from sentiment_cache import SentimentCache
+from text_cleaning import TokenFilter, clean_batch_with_offsets, clean_text_with_offsets
+
+# Numeric modes the RoBERTa model can run in
+PRECISION_MODES = ("fp32", "bf16", "int8")
+
+# Model tiers: "full" is the fine-tuned RoBERTa, "fast" the distilled student from tuning_script.py --distill
+MODEL_TIERS = ("full", "fast")
+DEFAULT_STUDENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "student")
+
+# Runtimes the RoBERTa model can be served through
+INFERENCE_BACKENDS = ("torch", "onnx")
+
+# RoBERTa window length (including special tokens) and overlap between consecutive windows
+MAX_WINDOW_TOKENS = 512
+WINDOW_STRIDE = 64
+
+# Bump when the shape of analysis results changes so cached results in the old shape are not served
+RESULT_FORMAT_VERSION = 3
+
+# Cascade fast path: posts start from a neutral prior refined by the keyword lexicon, and are
+# trusted without RoBERTa only if they are short and carry little sentiment evidence
+CASCADE_NEUTRAL_PRIOR = (0.05, 0.9, 0.05)
+CASCADE_MAX_TOKENS = 48
+CASCADE_EVIDENCE_LABELS = ("DISEASE", "SYMPTOM")
+CASCADE_TERM_WEIGHT = 0.15
+DEFAULT_CASCADE_THRESHOLD = 0.9
+
+# spaCy pipeline profiles: "full" is en_core_web_sm with tagger, parser and attribute ruler,
+# "lean" is the English tokenizer alone, which is all the preprocessing features read
+SPACY_PROFILES = ("full", "lean")
+
 
 class CombinedAnalyzer:
-    def __init__(self):
-        """Initialize the CombinedAnalyzer with required models and components"""
+    def __init__(self, batch_size=None, precision=None, backend=None, cache=None,
+                 spacy_processes=None, spacy_batch_size=None, spacy_profile=None, artifact_dir=None,
+                 cascade=None, cascade_threshold=None, model_tier=None):
+        """
+        Initialize the CombinedAnalyzer with required models and components
+        Args:
+            batch_size (int): Maximum number of texts per RoBERTa forward pass in analyze_batch.
+                Defaults to the SENTIMENT_BATCH_SIZE environment variable, then the tuned value, then 64
+            precision (str): "fp32", "bf16" (autocast) or "int8" (dynamic quantization).
+                Defaults to the SENTIMENT_MODEL_PRECISION environment variable, then the tuned value, then "fp32"
+            backend (str): "torch" or "onnx" (ONNX Runtime, falls back to torch if no graph is exported).
+                Defaults to the SENTIMENT_MODEL_BACKEND environment variable, then "torch"
+            cache (SentimentCache): Result cache in front of analyze_text and analyze_batch.
+                Defaults to SentimentCache.from_env()
+            spacy_processes (int): Worker processes for nlp.pipe in batch preprocessing.
+                Defaults to the SENTIMENT_SPACY_PROCESSES environment variable, then 1
+            spacy_batch_size (int): Texts buffered per nlp.pipe batch.
+                Defaults to the SENTIMENT_SPACY_BATCH_SIZE environment variable, then 256
+            spacy_profile (str): "lean" (tokenizer only) or "full" (en_core_web_sm components).
+                Defaults to the SENTIMENT_SPACY_PROFILE environment variable, then "lean"
+            artifact_dir (str): Local directory populated by `python model_artifacts.py --fetch`.
+                When set, models load offline from it. Defaults to the SENTIMENT_ARTIFACT_DIR
+                environment variable, then models/artifacts if it holds a manifest
+            cascade (bool): Score confidently neutral posts with the lexicon and skip RoBERTa for them.
+                Defaults to the SENTIMENT_CASCADE environment variable, then off
+            cascade_threshold (float): Minimum cheap-tier confidence (0-1) for skipping RoBERTa.
+                Defaults to the SENTIMENT_CASCADE_THRESHOLD environment variable, then 0.9
+            model_tier (str): "full" (fine-tuned RoBERTa) or "fast" (distilled student saved under
+                SENTIMENT_STUDENT_PATH). Defaults to the SENTIMENT_MODEL_TIER environment variable, then "full"
+        """
         self.logger = logging.getLogger(__name__)
-        self.ensure_model_downloaded()
-        # Create spaCy model with all necessary components
-        self.nlp = spacy.load("en_core_web_sm", disable=["ner"])  # Disable NER for faster processing
-        # Configure pipeline components
-        if "tagger" not in self.nlp.pipe_names:
-            self.nlp.add_pipe("tagger", before="parser")
-        
-        if "attribute_ruler" not in self.nlp.pipe_names:
-            self.nlp.add_pipe("attribute_ruler", after="tagger")
+        # Seconds spent in each startup phase, reported once the analyzer is ready
+        self.startup_timings = {}
+        startup_start = time.perf_counter()
+        # Thread count, batch size and precision picked for this host by autotune.py, if it has been run
+        self.tuning = load_tuning()
+        tuned = self.tuning["selected"] if self.tuning else {}
+        if self.tuning:
+            self.logger.info("Using tuned configuration from %s: %s", self.tuning["created_at"], tuned)
+        self.batch_size = batch_size or int(os.environ.get("SENTIMENT_BATCH_SIZE", 0)) or tuned.get("batch_size") or 64
+        torch_threads = int(os.environ.get("SENTIMENT_TORCH_THREADS", 0)) or tuned.get("torch_threads")
+        if torch_threads:
+            torch.set_num_threads(torch_threads)
+        self.max_window_tokens = MAX_WINDOW_TOKENS
+        self.window_stride = WINDOW_STRIDE
+        self.precision = (precision or os.environ.get("SENTIMENT_MODEL_PRECISION") or tuned.get("precision") or "fp32").lower()
+        if self.precision not in PRECISION_MODES:
+            self.logger.error("Unknown model precision %s, using fp32 instead.", self.precision)
+            self.precision = "fp32"
+        self.backend = (backend or os.environ.get("SENTIMENT_MODEL_BACKEND", "torch")).lower()
+        if self.backend not in INFERENCE_BACKENDS:
+            self.logger.error("Unknown inference backend %s, using torch instead.", self.backend)
+            self.backend = "torch"
+        self.spacy_processes = spacy_processes or int(os.environ.get("SENTIMENT_SPACY_PROCESSES", 1))
+        self.spacy_batch_size = spacy_batch_size or int(os.environ.get("SENTIMENT_SPACY_BATCH_SIZE", 256))
+        self.spacy_profile = (spacy_profile or os.environ.get("SENTIMENT_SPACY_PROFILE", "lean")).lower()
+        if self.spacy_profile not in SPACY_PROFILES:
+            self.logger.error("Unknown spaCy profile %s, using lean instead.", self.spacy_profile)
+            self.spacy_profile = "lean"
+        if cascade is None:
+            cascade = os.environ.get("SENTIMENT_CASCADE", "").lower() in ("1", "true", "yes", "on")
+        self.cascade = cascade
+        self.cascade_threshold = cascade_threshold if cascade_threshold is not None else \
+            float(os.environ.get("SENTIMENT_CASCADE_THRESHOLD", DEFAULT_CASCADE_THRESHOLD))
+        if not 0.0 <= self.cascade_threshold <= 1.0:
+            self.logger.error("Cascade threshold %s is outside 0-1, using %s instead.", self.cascade_threshold, DEFAULT_CASCADE_THRESHOLD)
+            self.cascade_threshold = DEFAULT_CASCADE_THRESHOLD
+        self.model_tier = (model_tier or os.environ.get("SENTIMENT_MODEL_TIER", "full")).lower()
+        if self.model_tier not in MODEL_TIERS:
+            self.logger.error("Unknown model tier %s, using full instead.", self.model_tier)
+            self.model_tier = "full"
+        self.student_path = os.environ.get("SENTIMENT_STUDENT_PATH", DEFAULT_STUDENT_PATH)
+        if self.model_tier == "fast" and not os.path.exists(os.path.join(self.student_path, "distillation.json")):
+            self.logger.error("No distilled student model at %s, using the full model instead. "
+                              "Train one with 'python tuning_script.py --distill'.", self.student_path)
+            self.model_tier = "full"
+        self.artifact_dir = resolve_artifact_dir(artifact_dir)
+        self.artifact_manifest = None
+        if self.artifact_dir:
+            # Fail fast rather than reaching for the network on an air-gapped node
+            self.artifact_manifest = load_manifest(self.artifact_dir)
+            self.logger.info("Loading models offline from %s", self.artifact_dir)
+
+        with self.startup_phase("spacy_pipeline"):
+            self.nlp = self.load_spacy_pipeline(self.spacy_profile)
         
         # Check for fine-tuned model and load if available
-        self.load_fine_tuned_model()
+        with self.startup_phase("sentiment_model"):
+            self.load_fine_tuned_model()
 
-        # Load sentiment keywords from JSON file
-        self.positive_keywords, self.negative_keywords = self.load_sentiment_keywords()
+        with self.startup_phase("keywords"):
+            self.load_lexicon()
 
-        # Configure attribute ruler patterns
-        ruler = self.nlp.get_pipe("attribute_ruler")
-        patterns = [
-            {"patterns": [[{"ORTH": "rust"}]], "attrs": {"TAG": "NN"}},
-            {"patterns": [[{"ORTH": "mildew"}]], "attrs": {"TAG": "NN"}},
-            {"patterns": [[{"ORTH": "wheat"}]], "attrs": {"TAG": "NN"}},
-            {"patterns": [[{"ORTH": "barley"}]], "attrs": {"TAG": "NN"}},
-            {"patterns": [[{"ORTH": "disease"}]], "attrs": {"TAG": "NN"}},
-            {"patterns": [[{"ORTH": "infection"}]], "attrs": {"TAG": "NN"}}
-        ]
-        for pattern in patterns:
-            ruler.add(pattern["patterns"], pattern["attrs"])
-        
-        # Initialize and configure the matcher with patterns
-        self.matcher = Matcher(self.nlp.vocab)
-        self.add_matcher_patterns()
+        with self.startup_phase("cache"):
+            # Cache of analysis results keyed by cleaned text, model and lexicon version
+            self.cache = cache if cache is not None else SentimentCache.from_env()
+
+        # The gazetteer ships inside the pipeline as the agricultural_matcher component
+        self.matcher = self.nlp.get_pipe("agricultural_matcher").matcher
+        self.gazetteer_version = self.nlp.get_pipe("agricultural_matcher").version
         
         # Log pipeline information
-        self.logger.info("Active pipeline components: %s", self.nlp.pipe_names)
+        self.logger.info("spaCy profile %s, active pipeline components: %s", self.spacy_profile, self.nlp.pipe_names)
         
         # Agricultural-specific stopwords
         self.agri_stopwords = {"field", "farm", "crop", "plant", "seed", "grow", "harvest"}
-        
-    def add_matcher_patterns(self):
-        """Add patterns to the matcher for identifying agricultural terms and diseases"""
-        # Disease patterns
-        disease_pattern = [
-            [{"LOWER": {"IN": ["rust", "mildew", "smut", "blight", "rot", "spot", "mosaic", "wilt", "canker", "scab"]}}],
-            [{"LOWER": "powdery"}, {"LOWER": "mildew"}],
-            [{"LOWER": "leaf"}, {"LOWER": "spot"}],
-            [{"LOWER": "stem"}, {"LOWER": "rust"}],
-            [{"LOWER": "black"}, {"LOWER": "leg"}],
-            [{"LOWER": "root"}, {"LOWER": "rot"}]
-        ]
-        
-        # Crop patterns
-        crop_pattern = [
-            [{"LOWER": {"IN": ["wheat", "barley", "corn", "rice", "soybean", "cotton", "canola", "oats"]}}],
-            [{"LOWER": {"IN": ["chickpea", "lentil", "lupin", "faba", "mungbean", "safflower", "sorghum"]}}]
-        ]
-        
-        # Symptom patterns
-        symptom_pattern = [
-            [{"LOWER": {"IN": ["wilting", "yellowing", "spotting", "lesion", "chlorosis", "necrosis"]}}],
-            [{"LOWER": "leaf"}, {"LOWER": {"IN": ["curl", "spot", "wilt", "burn"]}}],
-            [{"LOWER": "stem"}, {"LOWER": {"IN": ["canker", "rot", "lesion"]}}],
-            [{"LOWER": "root"}, {"LOWER": {"IN": ["rot", "damage", "lesion"]}}]
-        ]
-        
-        # Seasonal terms patterns
-        seasonal_pattern = [
-            # Months
-            [{"LOWER": {"IN": ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]}}],
-            # Seasons
-            [{"LOWER": {"IN": ["spring", "summer", "autumn", "fall", "winter"]}}],
-            # Growing seasons
-            [{"LOWER": {"IN": ["planting", "growing", "harvesting", "dormant", "flowering", "ripening"]}}],
-            # Weather conditions
-            [{"LOWER": {"IN": ["rainy", "dry", "wet", "humid", "frost", "drought", "flood"]}}],
-            # Time periods
-            [{"LOWER": {"IN": ["early", "mid", "late"]}}, {"LOWER": {"IN": ["season", "spring", "summer", "autumn", "fall", "winter"]}}]
-        ]
-        
-        # Add patterns to matcher
-        self.matcher.add("DISEASE", disease_pattern)
-        self.matcher.add("CROP", crop_pattern)
-        self.matcher.add("SYMPTOM", symptom_pattern)
-        self.matcher.add("SEASONAL", seasonal_pattern)
-        
-        self.logger.info("Matcher patterns configured for diseases, crops, and symptoms")
+        self.token_filter = TokenFilter(self.agri_stopwords)
+
+        self.startup_timings["total"] = round(time.perf_counter() - startup_start, 3)
+        self.logger.info("Analyzer ready in %.2fs (%s)", self.startup_timings["total"], ", ".join(
+            f"{phase} {seconds:.2f}s" for phase, seconds in self.startup_timings.items() if phase != "total"
+        ))
+
+    @classmethod
+    def for_rescoring(cls):
+        """
+        Build an analyzer with only the keyword lexicon loaded, enough to re-score stored
+        raw probabilities with rescore_sentiment without loading spaCy or the model
+        """
+        analyzer = cls.__new__(cls)
+        analyzer.logger = logging.getLogger(__name__)
+        analyzer.load_lexicon()
+        return analyzer
+
+    def load_lexicon(self):
+        """Load the sentiment keywords and compile them into the lexicon used for refinement"""
+        # Load sentiment keywords from JSON file
+        self.positive_keywords, self.negative_keywords = self.load_sentiment_keywords()
+        # Version the lexicon by content so cached results are invalidated when it changes
+        self.keywords_version = hashlib.sha256(
+            json.dumps([KeywordLexicon.VERSION, self.positive_keywords, self.negative_keywords], sort_keys=True).encode('utf-8')
+        ).hexdigest()[:12]
+        # Compile the lexicon once so refinement is a single pass per text
+        self.lexicon = KeywordLexicon(self.positive_keywords, self.negative_keywords)
+
+    @contextlib.contextmanager
+    def startup_phase(self, phase):
+        """Record the wall-clock time of one startup phase in self.startup_timings"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[phase] = round(time.perf_counter() - start, 3)
+
+    def load_spacy_pipeline(self, profile):
+        """
+        Load the pre-built spaCy bundle for a profile, or build the pipeline if there is none
+        Args:
+            profile (str): "lean" or "full"
+        Returns:
+            Language: The spaCy pipeline, ending in the agricultural_matcher component
+        """
+        nlp = load_bundle(profile)
+        if nlp is not None:
+            return nlp
+
+        spacy_model = DEFAULT_SPACY_MODEL
+        if profile == "full":
+            if self.artifact_dir:
+                spacy_model = spacy_model_path(self.artifact_dir, self.artifact_manifest.get("spacy_model", DEFAULT_SPACY_MODEL))
+            else:
+                self.ensure_model_downloaded()
+        return build_pipeline(profile, spacy_model)
 
     def ensure_model_downloaded(self):
         """Ensure the required spaCy model is downloaded"""
-        try:
-            spacy.load("en_core_web_sm")
-        except OSError:
+        # Check the installed packages instead of loading the pipeline only to throw it away
+        if not spacy.util.is_package(DEFAULT_SPACY_MODEL):
             self.logger.info("Downloading required model...")
-            download("en_core_web_sm")
+            download(DEFAULT_SPACY_MODEL)
 
     def load_sentiment_keywords(self):
         """Load sentiment keywords from JSON file"""
@@ -150,198 +262,709 @@ class CombinedAnalyzer:
             )
 
     def load_fine_tuned_model(self):
-        """Load fine-tuned RoBERTa model from Hugging Face Hub"""
+        """Load the distilled student, or the fine-tuned RoBERTa model from the artifact directory or Hugging Face Hub"""
+        if self.model_tier == "fast":
+            with open(os.path.join(self.student_path, "distillation.json"), 'r', encoding='utf-8') as f:
+                self.model_id = json.load(f)["model_id"]
+            self.logger.info("Loading distilled student %s from %s", self.model_id, self.student_path)
+            self.roberta_tokenizer = RobertaTokenizerFast.from_pretrained(self.student_path, local_files_only=True)
+            self.roberta_model = self.load_fp32_model()
+        elif self.artifact_dir:
+            # Pinned copy saved as safetensors, which from_pretrained memory-maps
+            self.model_id = self.artifact_manifest["model_id"]
+            self.logger.info("Loading %s from %s", self.model_id, self.artifact_dir)
+            self.roberta_tokenizer = RobertaTokenizerFast.from_pretrained(
+                sentiment_model_path(self.artifact_dir), local_files_only=True
+            )
+            self.roberta_model = self.load_fp32_model()
+        else:
+            self.load_hub_model()
+
+        self.roberta_model.eval()
+        self.roberta_model = self.apply_precision(self.roberta_model, self.precision)
+        self.logger.info("RoBERTa model running in %s precision", self.precision)
+
+        # Serve through ONNX Runtime when an exported graph for this model exists
+        self.onnx_backend = None
+        if self.backend == "onnx":
+            if self.precision != "fp32":
+                self.logger.info("The ONNX graph runs in fp32, %s precision only applies to the torch fallback", self.precision)
+            self.onnx_backend = load_onnx_backend(self.model_id, os.environ.get("SENTIMENT_ONNX_PATH", DEFAULT_ONNX_PATH))
+            if self.onnx_backend is None:
+                self.backend = "torch"
+        self.logger.info("Using the %s inference backend", self.backend)
+
+    def load_hub_model(self):
+        """Load the fine-tuned model from Hugging Face Hub, falling back to the base sentiment model"""
         try:
             self.logger.info("Loading fine-tuned RoBERTa model from Hugging Face Hub")
-            self.roberta_tokenizer = RobertaTokenizer.from_pretrained("group21/agricultural-sentiment-model")
-            self.roberta_model = RobertaForSequenceClassification.from_pretrained("group21/agricultural-sentiment-model")
+            self.model_id = "group21/agricultural-sentiment-model"
+            self.roberta_tokenizer = RobertaTokenizerFast.from_pretrained(self.model_id)
+            self.roberta_model = RobertaForSequenceClassification.from_pretrained(self.model_id)
             self.logger.info("Successfully loaded fine-tuned model from Hub")
         except Exception as e:
             self.logger.error("Error loading fine-tuned model: %s. Using default model instead.", str(e))
-            self.roberta_tokenizer = RobertaTokenizer.from_pretrained("cardiffnlp/twitter-roberta-base-sentiment") 
-            self.roberta_model = RobertaForSequenceClassification.from_pretrained("cardiffnlp/twitter-roberta-base-sentiment")
+            self.model_id = "cardiffnlp/twitter-roberta-base-sentiment"
+            self.roberta_tokenizer = RobertaTokenizerFast.from_pretrained(self.model_id) 
+            self.roberta_model = RobertaForSequenceClassification.from_pretrained(self.model_id)
+
+    def load_fp32_model(self):
+        """Load a fresh fp32 copy of the active model, from local files when it has them"""
+        if self.model_tier == "fast":
+            return RobertaForSequenceClassification.from_pretrained(
+                self.student_path, local_files_only=True, use_safetensors=True
+            )
+        if self.artifact_dir:
+            return RobertaForSequenceClassification.from_pretrained(
+                sentiment_model_path(self.artifact_dir), local_files_only=True, use_safetensors=True
+            )
+        return RobertaForSequenceClassification.from_pretrained(self.model_id)
+
+    def apply_precision(self, model, precision):
+        """
+        Convert an fp32 model to the requested numeric mode
+        Args:
+            model: The fp32 RoBERTa model
+            precision (str): One of PRECISION_MODES
+        Returns:
+            The model to use for inference
+        """
+        if precision == "int8":
+            # Quantize the Linear layers' weights, activations are quantized on the fly
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        # bf16 keeps fp32 weights and runs under autocast, see _precision_context
+        return model
+
+    def set_precision(self, precision):
+        """Switch the loaded model to another precision mode, starting again from the fp32 weights"""
+        if precision not in PRECISION_MODES:
+            raise ValueError(f"Unknown model precision {precision}")
+        if precision == self.precision:
+            return
+        self.roberta_model = self.apply_precision(self.load_fp32_model().eval(), precision)
+        self.precision = precision
+        self.logger.info("RoBERTa model running in %s precision", self.precision)
+
+    def _precision_context(self, precision):
+        """Return the autocast context for a precision mode"""
+        if precision == "bf16":
+            return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def evaluate_precision(self, texts, batch_size=None):
+        """
+        Compare the active precision against an fp32 copy of the model on a held-out sample
+        Args:
+            texts (list): Sample texts, preprocessed the same way as in analyze_text
+            batch_size (int): Maximum number of texts per forward pass
+        Returns:
+            dict: Label agreement, compound-score drift and throughput of both modes
+        """
+        batch_size = batch_size or self.batch_size
+        reference_model = self.load_fp32_model().eval()
+        processed_texts = [self.preprocess_text(text)["processed_text"] for text in texts]
+
+        timings = {}
+        scores = {}
+        for name, model, precision in (("reference", reference_model, "fp32"),
+                                       ("active", self.roberta_model, self.precision)):
+            start_time = datetime.datetime.now()
+            mode_scores = []
+            for start in range(0, len(processed_texts), batch_size):
+                batch_texts = processed_texts[start:start + batch_size]
+                mode_scores.extend(self._predict_probabilities(batch_texts, model=model, precision=precision))
+            timings[name] = (datetime.datetime.now() - start_time).total_seconds()
+            scores[name] = mode_scores
+
+        reference_results = [self._format_sentiment(text, score) for text, score in zip(processed_texts, scores["reference"])]
+        active_results = [self._format_sentiment(text, score) for text, score in zip(processed_texts, scores["active"])]
+
+        agreement = [ref["sentiment"] == act["sentiment"] for ref, act in zip(reference_results, active_results)]
+        compound_drift = np.abs([ref["compound"] - act["compound"] for ref, act in zip(reference_results, active_results)])
+        probability_drift = np.abs(np.array(scores["reference"]) - np.array(scores["active"]))
+        sample_count = len(processed_texts)
+
+        return {
+            "precision": self.precision,
+            "samples": sample_count,
+            "label_agreement": round(float(np.mean(agreement)), 5) if sample_count else None,
+            "mean_compound_drift": round(float(compound_drift.mean()), 5) if sample_count else None,
+            "max_compound_drift": round(float(compound_drift.max()), 5) if sample_count else None,
+            "max_probability_drift": round(float(probability_drift.max()), 5) if sample_count else None,
+            "fp32_posts_per_second": round(sample_count / timings["reference"], 2) if timings["reference"] else None,
+            "posts_per_second": round(sample_count / timings["active"], 2) if timings["active"] else None
+        }
         
+    def clean_text(self, text):
+        """Lowercase the text and strip URLs, hashtags, mentions and special characters"""
+        return self._clean_text_with_offsets(text)[0]
+
+    def _clean_text_with_offsets(self, text):
+        """
+        Clean the text and record where each cleaned word came from in the original
+        Args:
+            text (str): The raw input text
+        Returns:
+            tuple: (cleaned_text, offset_map) where offset_map is a lazily built text_cleaning.OffsetMap
+        """
+        return clean_text_with_offsets(text)
+
+    def _to_original_offset(self, offset_map, cleaned_offset, end=False):
+        """Map a character offset in the cleaned text to the original text"""
+        return offset_map.to_original(cleaned_offset, end)
+
+    def _with_original_offsets(self, items, offset_map):
+        """Copy term or entity dicts, moving their offsets from the cleaned to the original text"""
+        return [
+            {
+                **item,
+                "start": self._to_original_offset(offset_map, item["start"]),
+                "end": self._to_original_offset(offset_map, item["end"], end=True)
+            }
+            for item in items
+        ]
+
     def preprocess_text(self, text):
-        """Preprocess the input text"""
-        if text is None:
-            text = ""
-            
-        # Basic text cleaning
-        text = text.lower().strip()
-        
-        # Remove URLs
-        text = re.sub(r'https?://\S+|www\.\S+', '', text)
-        
-        # Remove hashtags and mentions
-        text = re.sub(r'[@#]\w+', '', text)
-        
-        # Remove special characters and emojis
-        text = re.sub(r'[^\w\s]', ' ', text)
-        
-        # Remove extra whitespace
-        text = ' '.join(text.split())
-        
+        """
+        Preprocess the input text with a single spaCy pass
+        Returns:
+            dict: processed_text, tokens, agricultural_terms, entities and the spaCy doc.
+                Term and entity offsets are character offsets into the original text
+        """
+        cleaned_text, offset_map = self._clean_text_with_offsets(text)
+        preprocessed = self._preprocess_cleaned_text(cleaned_text)
+        preprocessed["agricultural_terms"] = self._with_original_offsets(preprocessed["agricultural_terms"], offset_map)
+        preprocessed["entities"] = self._with_original_offsets(preprocessed["entities"], offset_map)
+        return preprocessed
+
+    def preprocess_batch(self, texts, ids=None, n_process=None, batch_size=None):
+        """
+        Preprocess many texts through spaCy's nlp.pipe
+        Args:
+            texts (list): The raw input texts
+            ids (list): Identifiers carried alongside each text (e.g. post IDs), defaults to list indices
+            n_process (int): Number of spaCy worker processes, defaults to the analyzer setting
+            batch_size (int): Number of texts spaCy buffers per batch, defaults to the analyzer setting
+        Returns:
+            list: preprocess_text style dicts with an added "id", in the same order as texts
+        """
+        if ids is None:
+            ids = list(range(len(texts)))
+        cleaned = clean_batch_with_offsets(texts)
+        results = self._preprocess_cleaned_batch([cleaned_text for cleaned_text, _ in cleaned], ids, n_process, batch_size)
+        for result, (_, offset_map) in zip(results, cleaned):
+            result["agricultural_terms"] = self._with_original_offsets(result["agricultural_terms"], offset_map)
+            result["entities"] = self._with_original_offsets(result["entities"], offset_map)
+        return results
+
+    def _preprocess_cleaned_batch(self, texts, contexts, n_process=None, batch_size=None):
+        """
+        Run nlp.pipe over cleaned texts, carrying a context value with each one
+        Returns:
+            list: _preprocess_cleaned_text style dicts with the context under "id", in input order
+        """
+        n_process = n_process or self.spacy_processes
+        batch_size = batch_size or self.spacy_batch_size
+        # Starting worker processes only pays off for large batches
+        if n_process > 1 and len(texts) < batch_size:
+            n_process = 1
+
+        try:
+            docs = self.nlp.pipe(zip(texts, contexts), as_tuples=True, n_process=n_process, batch_size=batch_size)
+            return [dict(self._process_doc(doc), id=context) for doc, context in docs]
+        except Exception as e:
+            self.logger.error(f"Error in batch preprocessing, preprocessing texts one by one: {str(e)}")
+            return [dict(self._preprocess_cleaned_text(text), id=context) for text, context in zip(texts, contexts)]
+
+    def _preprocess_cleaned_text(self, text):
+        """Run spaCy once over cleaned text; offsets in the result point into that cleaned text"""
         try:
             # Process with spaCy
-            doc = self.nlp(text)
-            
-            # Tokenize and clean tokens
-            tokens = []
-            processed_words = []
-            for token in doc:
-                # Skip whitespace tokens
-                if token.is_space:
-                    continue
-                # Skip stopwords (includes articles like 'the' and pronouns like 'it')
-                if token.is_stop:
-                    continue
-                # Skip agricultural stopwords
-                if token.text in self.agri_stopwords:
-                    continue
-                # Skip tokens that are just numbers
-                if token.like_num:
-                    continue
-                # Skip single-character tokens
-                if len(token.text) <= 1:
-                    continue
-                # Skip tokens that look like URLs or special characters
-                if re.match(r'^[^\w\s]+$', token.text):
-                    continue
-                # Skip tokens that look like hashtags or mentions
-                if re.match(r'^[@#]', token.text):
-                    continue
-                # Add cleaned token
-                tokens.append(token.text)
-                processed_words.append(token.text)
-            
-            # Create processed text without stopwords
-            processed_text = ' '.join(processed_words)
-            
-            # Extract agricultural terms
-            agricultural_terms = []
-            for match_id, start, end in self.matcher(doc):
-                span = doc[start:end]
-                agricultural_terms.append({
-                    "text": span.text,
-                    "label": self.nlp.vocab.strings[match_id],
-                    "start": start,
-                    "end": end
-                })
-            
-            return {
-                "processed_text": processed_text,
-                "tokens": tokens,
-                "agricultural_terms": agricultural_terms,
-                "doc": doc
-            }
+            return self._process_doc(self.nlp(text))
         except Exception as e:
             self.logger.error(f"Error in text preprocessing: {str(e)}")
             return {
                 "processed_text": text,
                 "tokens": [],
                 "agricultural_terms": [],
+                "entities": [],
                 "doc": None
             }
-        # Process with spaCy
-        doc = self.nlp(text)
 
+    def _process_doc(self, doc):
+        """Filter tokens and collect agricultural terms and entities from one spaCy doc"""
+        # Stopwords, numbers, single characters, special characters, hashtags and mentions
+        # are filtered with per-vocabulary-entry decisions rather than per-token checks
+        tokens = [token.text for token in doc if self.token_filter.keep(token)]
         
-        # Define evaluative words to preserve
-        evaluative_words = {
-            # Basic evaluative words
-            'good', 'bad', 'worse', 'worst', 'well', 'better', 'best',
-            # Positive agricultural terms
-            'healthy', 'thriving', 'robust', 'vigorous', 'strong', 'productive',
-            # Negative agricultural terms
-            'unhealthy', 'weak', 'poor', 'damaged', 'infected', 'diseased',
-            # Comparative terms
-            'more', 'less', 'most', 'least', 'greater', 'smaller',
-            # Intensity words
-            'very', 'extremely', 'highly', 'slightly', 'somewhat',
-            # Temporal evaluative words
-            'improving', 'declining', 'increasing', 'decreasing',
-            # Quality indicators
-            'excellent', 'outstanding', 'superior', 'inferior', 'adequate',
-            # Status indicators
-            'normal', 'abnormal', 'typical', 'atypical', 'standard',
-            # Growth-related
-            'growing', 'developing', 'mature', 'immature', 'ripe', 'unripe'
+        # Create processed text without stopwords
+        processed_text = ' '.join(tokens)
+        
+        # Extract agricultural terms
+        agricultural_terms = []
+        for span in doc.spans[AGRICULTURAL_SPAN_KEY]:
+            agricultural_terms.append({
+                "text": span.text,
+                "label": span.label_,
+                "start": span.start_char,
+                "end": span.end_char
+            })
+
+        # Named entities from the same doc, followed by the agricultural terms
+        entities = [
+            {
+                "text": ent.text,
+                "label": ent.label_,
+                "start": ent.start_char,
+                "end": ent.end_char
+            }
+            for ent in doc.ents
+        ]
+        entities.extend(agricultural_terms)
+        
+        return {
+            "processed_text": processed_text,
+            "tokens": tokens,
+            "agricultural_terms": agricultural_terms,
+            "entities": entities,
+            "doc": doc
         }
 
+    def cache_key(self, cleaned_text):
+        """Cache key for a cleaned text under the current model, precision, cascade setting, gazetteer and lexicon"""
+        model_version = f"{self.model_id}:{self.precision}:r{RESULT_FORMAT_VERSION}:g{self.gazetteer_version}"
+        if self.cascade:
+            model_version += f":cascade@{self.cascade_threshold}"
+        return SentimentCache.make_key(cleaned_text, model_version, self.keywords_version)
+
+    def _build_result(self, preprocessed, sentiment_results, tier="model", sentiment_raw=None):
+        """Assemble the analysis result; offsets still point into the cleaned text so it can be cached"""
+        return {
+            "sentiment": sentiment_results,
+            "sentiment_raw": sentiment_raw,
+            "tier": tier,
+            "entities": preprocessed["entities"],
+            "processed_text": preprocessed["processed_text"],
+            "agricultural_terms": preprocessed["agricultural_terms"]
+        }
+
+    def _finalise_result(self, result, offset_map):
+        """Copy a cleaned-text result with its offsets moved to the original text"""
+        return {
+            **result,
+            "entities": self._with_original_offsets(result["entities"], offset_map),
+            "agricultural_terms": self._with_original_offsets(result["agricultural_terms"], offset_map)
+        }
 
     def analyze_text(self, text):
         """Analyze text for sentiment and agricultural terms"""
-        # Preprocess text
-        preprocessed = self.preprocess_text(text)
-        processed_text = preprocessed["processed_text"]
-        
-        # Get sentiment analysis
-        sentiment_results = self.sentiment_analysis(processed_text)
+        # Every output depends only on the cleaned text, so identical reposts share one cache entry
+        cleaned_text, offset_map = self._clean_text_with_offsets(text)
+        if self.cache is not None:
+            cache_key = self.cache_key(cleaned_text)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self._finalise_result(cached, offset_map)
+
+        # One spaCy pass feeds tokens, agricultural terms and entities
+        preprocessed = self._preprocess_cleaned_text(cleaned_text)
         
-        # Extract entities
-        entities = self.extract_entities(processed_text)
+        # Get sentiment analysis, from the cascade fast path when it is confident enough
+        sentiment_results, raw_results, tiers = self._cascade_sentiment([preprocessed])
         
-        return {
-            "sentiment": sentiment_results,
-            "entities": entities,
-            "processed_text": processed_text,
-            "agricultural_terms": preprocessed["agricultural_terms"]
+        result = self._build_result(preprocessed, sentiment_results[0], tiers[0], raw_results[0])
+        if self.cache is not None:
+            self.cache.put(cache_key, result)
+        return self._finalise_result(result, offset_map)
+
+    def analyze_batch(self, texts, batch_size=None, runner=None):
+        """
+        Analyze a list of texts, running RoBERTa once per micro-batch instead of once per text
+        Args:
+            texts (list): The input texts to analyze
+            batch_size (int): Maximum number of texts per forward pass
+            runner (callable): Analyses a list of cleaned texts, e.g. on an InferencePool.
+                Defaults to analyze_cleaned_batch in this process
+        Returns:
+            list: One result per text, in the same format and order as analyze_text
+        """
+        cleaned = clean_batch_with_offsets(texts)
+        results = [None] * len(texts)
+
+        # Serve cache hits, looked up together, and analyse each distinct uncached text only once
+        cache_keys = [self.cache_key(cleaned_text) if self.cache is not None else cleaned_text
+                      for cleaned_text, _ in cleaned]
+        cached = self.cache.get_many(cache_keys) if self.cache is not None else {}
+        pending = {}
+        for index, ((cleaned_text, offset_map), cache_key) in enumerate(zip(cleaned, cache_keys)):
+            if cache_key in cached:
+                results[index] = self._finalise_result(cached[cache_key], offset_map)
+                continue
+            pending.setdefault(cache_key, (cleaned_text, []))[1].append(index)
+
+        if not pending:
+            return results
+
+        cache_keys = list(pending)
+        cleaned_texts = [pending[cache_key][0] for cache_key in cache_keys]
+        if runner is None:
+            built_results = self.analyze_cleaned_batch(cleaned_texts, batch_size)
+        else:
+            built_results = runner(cleaned_texts)
+
+        if self.cache is not None:
+            self.cache.put_many(zip(cache_keys, built_results))
+        for cache_key, result in zip(cache_keys, built_results):
+            for index in pending[cache_key][1]:
+                results[index] = self._finalise_result(result, cleaned[index][1])
+        return results
+
+    def analyze_cleaned_batch(self, cleaned_texts, batch_size=None):
+        """
+        Analyze already-cleaned texts without touching the cache
+        Args:
+            cleaned_texts (list): Texts as returned by clean_text
+            batch_size (int): Maximum number of texts per forward pass
+        Returns:
+            list: Results with offsets into the cleaned texts, as stored in the cache
+        """
+        preprocessed = self._preprocess_cleaned_batch(cleaned_texts, range(len(cleaned_texts)))
+        sentiment_results, raw_results, tiers = self._cascade_sentiment(preprocessed, batch_size)
+        return [self._build_result(item, sentiment, tier, raw)
+                for item, sentiment, raw, tier in zip(preprocessed, sentiment_results, raw_results, tiers)]
+
+    def _cascade_sentiment(self, preprocessed, batch_size=None):
+        """
+        Score preprocessed posts, answering from the cheap tier where cascade mode trusts it
+        and sending only the remaining posts through RoBERTa
+        Returns:
+            tuple: (sentiment results, raw scores as from sentiment_analysis_batch_raw,
+                tier per post: "cascade" or "model")
+        """
+        sentiment_results = [None] * len(preprocessed)
+        raw_results = [None] * len(preprocessed)
+        tiers = ["model"] * len(preprocessed)
+        if self.cascade and preprocessed:
+            cheap_scores, confidence = self.cascade_scores(preprocessed)
+            for index in np.flatnonzero(confidence >= self.cascade_threshold):
+                sentiment_results[index] = self._label_sentiment(cheap_scores[index])
+                # The prior over the whole text re-scores to the same cheap score
+                raw_results[index] = self._raw_result([list(CASCADE_NEUTRAL_PRIOR)],
+                                                      [[0, len(preprocessed[index]["processed_text"])]], [1.0])
+                tiers[index] = "cascade"
+
+        uncertain = [index for index, sentiment in enumerate(sentiment_results) if sentiment is None]
+        model_results, model_raw = self.sentiment_analysis_batch_raw(
+            [preprocessed[index]["processed_text"] for index in uncertain], batch_size
+        )
+        for index, sentiment, raw in zip(uncertain, model_results, model_raw):
+            sentiment_results[index] = sentiment
+            raw_results[index] = raw
+        return sentiment_results, raw_results, tiers
+
+    def cascade_scores(self, preprocessed):
+        """
+        Cheap sentiment from the keyword lexicon, the agricultural Matcher hits and post length
+        Args:
+            preprocessed (list): Results of preprocessing, as from preprocess_batch
+        Returns:
+            tuple: (refined scores [negative, neutral, positive] per post, confidence in 0-1 per post)
+        """
+        processed_texts = [item["processed_text"] for item in preprocessed]
+        prior = np.tile(CASCADE_NEUTRAL_PRIOR, (len(preprocessed), 1))
+        scores = self.sentiment_score_refinement_batch(processed_texts, prior)
+
+        # Sentiment keywords and disease/symptom mentions are evidence the post is not neutral
+        keyword_evidence = self.lexicon.hit_matrix(processed_texts) @ np.abs(self.lexicon.weights)
+        term_evidence = CASCADE_TERM_WEIGHT * np.array([
+            sum(term["label"] in CASCADE_EVIDENCE_LABELS for term in item["agricultural_terms"])
+            for item in preprocessed
+        ], dtype=np.float64)
+        # Longer posts have more room for sentiment the lexicon does not know about
+        lengths = np.array([len(item["tokens"]) for item in preprocessed], dtype=np.float64)
+        length_confidence = np.clip(1.0 - lengths / CASCADE_MAX_TOKENS, 0.0, 1.0)
+
+        confidence = length_confidence * (1.0 - np.clip(keyword_evidence + term_evidence, 0.0, 1.0))
+        return scores, confidence
+
+    def evaluate_cascade(self, texts, thresholds=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95), batch_size=None):
+        """
+        Compare the cascade fast path against the full model to tune the threshold
+        Args:
+            texts (list): Sample texts
+            thresholds (tuple): Confidence thresholds to report on
+            batch_size (int): Maximum number of texts per forward pass
+        Returns:
+            dict: Per threshold, the share of posts skipping RoBERTa and their agreement with it
+        """
+        cleaned_texts = [self.clean_text(text) for text in texts]
+        preprocessed = self._preprocess_cleaned_batch(cleaned_texts, range(len(cleaned_texts)))
+
+        start_time = datetime.datetime.now()
+        cheap_scores, confidence = self.cascade_scores(preprocessed)
+        cheap_results = [self._label_sentiment(score) for score in cheap_scores]
+        cheap_seconds = (datetime.datetime.now() - start_time).total_seconds()
+
+        start_time = datetime.datetime.now()
+        model_results = self.sentiment_analysis_batch([item["processed_text"] for item in preprocessed], batch_size)
+        model_seconds = (datetime.datetime.now() - start_time).total_seconds()
+
+        agreement = np.array([cheap["sentiment"] == full["sentiment"] for cheap, full in zip(cheap_results, model_results)])
+        compound_drift = np.abs([cheap["compound"] - full["compound"] for cheap, full in zip(cheap_results, model_results)])
+        sample_count = len(texts)
+
+        report = {
+            "samples": sample_count,
+            "cheap_posts_per_second": round(sample_count / cheap_seconds, 2) if cheap_seconds else None,
+            "model_posts_per_second": round(sample_count / model_seconds, 2) if model_seconds else None,
+            "thresholds": []
         }
+        for threshold in thresholds:
+            skipped = confidence >= threshold
+            skipped_count = int(skipped.sum())
+            report["thresholds"].append({
+                "threshold": threshold,
+                "skipped_share": round(skipped_count / sample_count, 5) if sample_count else None,
+                # Agreement on the posts the cascade would answer, and over every post once the rest go to RoBERTa
+                "skipped_label_agreement": round(float(agreement[skipped].mean()), 5) if skipped_count else None,
+                "overall_label_agreement": round(1 - int((~agreement & skipped).sum()) / sample_count, 5) if sample_count else None,
+                "skipped_mean_compound_drift": round(float(compound_drift[skipped].mean()), 5) if skipped_count else None
+            })
+        return report
 
     def extract_entities(self, text):
         """Extract entities and return JSON-serializable results"""
-        # Preprocess text to get the doc and agricultural terms
-        preprocessed = self.preprocess_text(text)
-        doc = preprocessed["doc"]
-        entities = []
-        
-        if doc is not None:
-            # Extract named entities
-            for ent in doc.ents:
-                entities.append({
-                    "text": ent.text,
-                    "label": ent.label_,
-                    "start": ent.start_char,
-                    "end": ent.end_char
-                })
-        
-        # Add agricultural terms from the matcher
-        entities.extend(preprocessed["agricultural_terms"])
-        
-        return entities
+        return self.preprocess_text(text)["entities"]
 
     def sentiment_analysis(self, text):
         """
-        Perform Sentiment Analysis using RoBERTa model with chunk processing for long texts
+        Perform Sentiment Analysis using RoBERTa model with sliding windows for long texts
         Args:
             text (str): The input text to analyze
         Returns:
             dict: formatted sentiment score
         """
-        # Check if text is long enough to require chunking
-        # A good estimate for the token limit based on your error message (514 tokens)
-        # Since tokens are typically shorter than words, this is a conservative estimate
-        if len(text.split()) < 400:  # Safe margin for token limit
-            return self._analyze_single_chunk(text)
-        else:
-            return self._analyze_multiple_chunks(text)
+        return self.sentiment_analysis_batch([text])[0]
     
-    def _analyze_single_chunk(self, text):
-        """Process a single text chunk that fits within model limits"""
-        # Tokenize the text with truncation
-        input = self.roberta_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        
-        with torch.no_grad():
-            # Perform forward pass
-            output = self.roberta_model(**input)
+    def sentiment_analysis_batch(self, texts, batch_size=None):
+        """
+        Perform Sentiment Analysis on a list of texts. Texts longer than the model limit are
+        split into overlapping token windows, windows of all texts are scored in padded
+        micro-batches and each text's refined window scores are combined by window length
+        Args:
+            texts (list): The input texts to analyze
+            batch_size (int): Maximum number of windows per forward pass
+        Returns:
+            list: formatted sentiment scores, in the same order as texts
+        """
+        return self.sentiment_analysis_batch_raw(texts, batch_size)[0]
 
-        # Get the predicted sentiment
-        sentiment = torch.softmax(output.logits, dim=-1)
-        score = sentiment[0].tolist()
+    def sentiment_analysis_batch_raw(self, texts, batch_size=None):
+        """
+        sentiment_analysis_batch that also returns what is needed to re-score each text later
+        Returns:
+            tuple: (formatted sentiment scores, raw scores per text: the unrefined window
+                "probabilities", their character "spans" in the text and their "weights")
+        """
+        if not texts:
+            return [], []
+        windows = self._score_windows(texts, batch_size)
+        refined_scores = self.sentiment_score_refinement_batch(windows["texts"], windows["probabilities"])
+        combined_scores = self._combine_windows(refined_scores, windows["weights"], windows["doc_index"], len(texts))
+
+        window_groups = [[] for _ in texts]
+        for window, doc in enumerate(windows["doc_index"]):
+            window_groups[doc].append(window)
+        raw_results = [
+            self._raw_result(
+                windows["probabilities"][group].tolist(),
+                [list(windows["spans"][window]) for window in group],
+                windows["weights"][group].tolist()
+            )
+            for group in window_groups
+        ]
+        return [self._label_sentiment(score) for score in combined_scores], raw_results
+
+    def _raw_result(self, probabilities, spans, weights):
+        """Raw scores of one text, tagged with the model and lexicon that produced its refined result"""
+        return {
+            "probabilities": probabilities,
+            "spans": spans,
+            "weights": weights,
+            "model_id": self.model_id,
+            "precision": self.precision,
+            "keywords_version": self.keywords_version
+        }
+
+    def rescore_sentiment(self, processed_texts, raw_results):
+        """
+        Re-apply keyword refinement, window combination and labelling to stored raw scores,
+        so a lexicon change does not need the model
+        Args:
+            processed_texts (list): The processed_text of each result
+            raw_results (list): The matching sentiment_raw values
+        Returns:
+            list: formatted sentiment scores, as sentiment_analysis_batch would give under the current lexicon
+        """
+        if not processed_texts:
+            return []
+        window_texts = []
+        probabilities = []
+        weights = []
+        doc_index = []
+        for doc, (text, raw) in enumerate(zip(processed_texts, raw_results)):
+            for (start, end), window_probabilities, weight in zip(raw["spans"], raw["probabilities"], raw["weights"]):
+                window_texts.append(text[start:end])
+                probabilities.append(window_probabilities)
+                weights.append(weight)
+                doc_index.append(doc)
 
+        refined_scores = self.sentiment_score_refinement_batch(window_texts, np.asarray(probabilities, dtype=np.float64))
+        combined_scores = self._combine_windows(refined_scores, np.asarray(weights, dtype=np.float64),
+                                                np.asarray(doc_index, dtype=np.int64), len(processed_texts))
+        return [self._label_sentiment(score) for score in combined_scores]
+
+    def _score_windows(self, texts, batch_size=None):
+        """
+        Split texts into token windows and run the model over every window
+        Args:
+            texts (list): The input texts
+            batch_size (int): Maximum number of windows per forward pass
+        Returns:
+            dict: Per-window "texts", their character "spans" in the text, "probabilities"
+                [negative, neutral, positive], "weights" (tokens the window adds) and
+                "doc_index" (which text it belongs to)
+        """
+        batch_size = batch_size or self.batch_size
+        texts = list(texts)
+
+        # The fast tokenizer gives exact token counts, overlapping windows and character offsets
+        encoded = self.roberta_tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.max_window_tokens,
+            stride=self.window_stride,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True
+        )
+        doc_index = np.asarray(encoded["overflow_to_sample_mapping"], dtype=np.int64)
+
+        window_texts = []
+        window_spans = []
+        weights = []
+        previous_doc = -1
+        for window, offsets in enumerate(encoded["offset_mapping"]):
+            doc = doc_index[window]
+            # Special tokens have empty (0, 0) offsets
+            spans = [(start, end) for start, end in offsets if end > start]
+            start = spans[0][0] if spans else 0
+            end = spans[-1][1] if spans else 0
+            window_texts.append(texts[doc][start:end])
+            window_spans.append((start, end))
+
+            # Weight by the tokens this window adds beyond its overlap with the previous one
+            token_count = len(spans)
+            if doc == previous_doc:
+                token_count -= self.window_stride
+            weights.append(max(token_count, 1))
+            previous_doc = doc
+
+        # Sort by length so each micro-batch pads to a similar length
+        input_ids = encoded["input_ids"]
+        order = sorted(range(len(input_ids)), key=lambda window: len(input_ids[window]))
+        probabilities = np.zeros((len(input_ids), 3), dtype=np.float64)
+        for start in range(0, len(order), batch_size):
+            batch_windows = order[start:start + batch_size]
+            probabilities[batch_windows] = self._predict_encoded([input_ids[window] for window in batch_windows])
+
+        return {
+            "texts": window_texts,
+            "spans": window_spans,
+            "probabilities": probabilities,
+            "weights": np.asarray(weights, dtype=np.float64),
+            "doc_index": doc_index
+        }
+
+    def _combine_windows(self, window_scores, weights, doc_index, doc_count):
+        """
+        Length-weighted average of window scores per text
+        Args:
+            window_scores (np.ndarray): Scores [negative, neutral, positive] per window
+            weights (np.ndarray): Weight per window
+            doc_index (np.ndarray): Text each window belongs to
+            doc_count (int): Number of texts
+        Returns:
+            np.ndarray: Combined scores per text, each row summing to 1
+        """
+        combined = np.zeros((doc_count, 3), dtype=np.float64)
+        np.add.at(combined, doc_index, window_scores * weights[:, None])
+        # Ensure they sum to 1
+        return combined / combined.sum(axis=1, keepdims=True)
+
+    def _predict_probabilities(self, texts, model=None, precision=None):
+        """
+        Run one RoBERTa forward pass over a list of texts, truncated to the model limit
+        Args:
+            texts (list): The input texts, padded to the longest item
+            model: Model to run instead of the analyzer's own (used for precision comparisons)
+            precision (str): Precision mode of that model
+        Returns:
+            np.ndarray: Softmax scores [negative, neutral, positive] for each text
+        """
+        input_ids = self.roberta_tokenizer(list(texts), truncation=True, max_length=self.max_window_tokens)["input_ids"]
+        return self._predict_encoded(input_ids, model, precision)
+
+    def _predict_encoded(self, input_ids, model=None, precision=None):
+        """
+        Pad token ID lists to the longest one and run one forward pass
+        Args:
+            input_ids (list): Token ID lists
+            model: Model to run instead of the analyzer's own
+            precision (str): Precision mode of that model
+        Returns:
+            np.ndarray: Softmax scores [negative, neutral, positive] for each list
+        """
+        if model is None and self.onnx_backend is not None:
+            inputs = self.roberta_tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="np")
+            logits = self.onnx_backend.predict_logits(inputs["input_ids"], inputs["attention_mask"])
+            # Softmax over the label axis, shifted for numerical stability
+            exp_logits = np.exp(logits - logits.max(axis=-1, keepdims=True))
+            return (exp_logits / exp_logits.sum(axis=-1, keepdims=True)).astype(np.float64)
+
+        model = model or self.roberta_model
+        precision = precision or self.precision
+        inputs = self.roberta_tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="pt")
+
+        with torch.no_grad(), self._precision_context(precision):
+            output = model(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+
+        return torch.softmax(output.logits.float(), dim=-1).numpy().astype(np.float64)
+
+    def _analyze_single_chunk(self, text):
+        """Score a text with a single forward pass, truncating it to the model limit"""
+        return self._format_sentiment(text, self._predict_probabilities([text])[0])
+
+    def _format_sentiment(self, text, score):
+        """
+        Refine raw model scores and format them into the sentiment result
+        Args:
+            text (str): The text the scores were computed for
+            score (list): Softmax scores [negative, neutral, positive]
+        Returns:
+            dict: formatted sentiment score
+        """
         # Get the enhanced sentiment score
-        new_score = self.sentiment_score_refinement(text, score)
-        new_score = [round(score, 5) for score in new_score]
+        return self._label_sentiment(self.sentiment_score_refinement(text, score))
+
+    def _label_sentiment(self, refined_score):
+        """
+        Round refined scores and derive the compound score, label and leaning
+        Args:
+            refined_score (list): Refined scores [negative, neutral, positive]
+        Returns:
+            dict: formatted sentiment score
+        """
+        new_score = [round(float(score), 5) for score in refined_score]
 
         # Get the sentiment score
         negative_score = new_score[0]
@@ -394,262 +1017,6 @@ class CombinedAnalyzer:
 
         return formatted_score
 
-    def _analyze_multiple_chunks(self, text):
-        """Process a long text by splitting into chunks and combining the results"""
-        # Split the text into chunks
-        chunks = self._split_text_into_chunks(text)
-        
-        # Initialize aggregate scores
-        chunk_scores = []
-        total_words = sum(len(chunk.split()) for chunk in chunks)
-        
-        # Analyze each chunk
-        for chunk in chunks:
-            if not chunk.strip():
-                continue
-                
-            # Get sentiment for this chunk
-            chunk_result = self._analyze_single_chunk(chunk)
-            
-            # Weight by chunk size (number of words)
-            chunk_weight = len(chunk.split()) / total_words
-            
-            chunk_scores.append({
-                "score": chunk_result,
-                "weight": chunk_weight
-            })
-        
-        # Combine weighted scores
-        combined_positive = sum(item["score"]["positive"] * item["weight"] for item in chunk_scores)
-        combined_negative = sum(item["score"]["negative"] * item["weight"] for item in chunk_scores)
-        combined_neutral = sum(item["score"]["neutral"] * item["weight"] for item in chunk_scores)
-        
-        # Ensure they sum to 1
-        total = combined_positive + combined_negative + combined_neutral
-        if total != 1.0 and total > 0:
-            combined_positive /= total
-            combined_negative /= total
-            combined_neutral /= total
-        
-        # Calculate compound score
-        compound = combined_positive - combined_negative
-        
-        # Determine overall sentiment based on combined scores
-        if compound > 0.50:
-            sentiment_label = "Positive"
-        elif 0.10 < compound < 0.50:
-            sentiment_label = "Slightly Positive"
-        elif -0.10 < compound < 0.10:
-            sentiment_label = "Neutral"
-        elif -0.50 < compound < -0.10:
-            sentiment_label = "Slightly Negative"
-        else: 
-            sentiment_label = "Negative"
-        
-        # Calculate leaning
-        if compound > 0:
-            lean_percentage = round((compound / 1) * 100)
-            lean_result = {
-                "direction": "Positive",
-                "percentage": lean_percentage
-            }
-        elif compound < 0:
-            lean_percentage = round((abs(compound) / 1) * 100)
-            lean_result = {
-                "direction": "Negative",
-                "percentage": lean_percentage
-            }
-        else:
-            lean_result = {
-                "direction": "Balanced",
-                "percentage": 0
-            }
-        
-        # Format the results
-        formatted_score = {
-            "positive": round(combined_positive, 5),
-            "negative": round(combined_negative, 5),
-            "neutral": round(combined_neutral, 5),
-            "compound": round(compound, 5),
-            "sentiment": sentiment_label,
-            "neutral_leaning": lean_result
-        }
-        
-        return formatted_score
-
-    def _analyze_multiple_chunks(self, text):
-        """
-        Process a long text by splitting into chunks and combining the results.
-        This version properly handles each chunk independently to avoid tensor size mismatches.
-        
-        Args:
-            text (str): The text to analyze
-            
-        Returns:
-            dict: Formatted sentiment scores
-        """
-        # Split the text into chunks
-        chunks = self._split_text_into_chunks(text, max_words_per_chunk=300)
-        
-        # Initialize aggregate scores for weighted averaging
-        chunk_scores = []
-        total_words = sum(len(chunk.split()) for chunk in chunks)
-        
-        # Process each chunk individually
-        for chunk in chunks:
-            if not chunk.strip():
-                continue
-                
-            try:
-                # Get sentiment for this chunk (each chunk is processed independently)
-                chunk_result = self._analyze_single_chunk(chunk)
-                
-                # Weight by chunk size (number of words)
-                chunk_weight = len(chunk.split()) / total_words
-                
-                chunk_scores.append({
-                    "score": chunk_result,
-                    "weight": chunk_weight
-                })
-            except Exception as e:
-                self.logger.warning(f"Error processing chunk: {str(e)}")
-                # Skip problematic chunks
-                continue
-        
-        # Handle case where all chunks failed
-        if not chunk_scores:
-            self.logger.warning("All chunks failed to process, falling back to simple analysis")
-            # Try a simple approach with heavy truncation as fallback
-            try:
-                # Get the first 250 words only for fallback analysis
-                fallback_text = " ".join(text.split()[:250])
-                return self._analyze_single_chunk(fallback_text)
-            except Exception as e:
-                self.logger.error(f"Fallback analysis also failed: {str(e)}")
-                # Return a neutral sentiment if everything fails
-                return {
-                    "positive": 0.33,
-                    "negative": 0.33,
-                    "neutral": 0.34,
-                    "compound": 0.0,
-                    "sentiment": "Neutral",
-                    "neutral_leaning": {"direction": "Balanced", "percentage": 0}
-                }
-        
-        # Combine weighted scores
-        combined_positive = sum(item["score"]["positive"] * item["weight"] for item in chunk_scores)
-        combined_negative = sum(item["score"]["negative"] * item["weight"] for item in chunk_scores)
-        combined_neutral = sum(item["score"]["neutral"] * item["weight"] for item in chunk_scores)
-        
-        # Ensure they sum to 1
-        total = combined_positive + combined_negative + combined_neutral
-        if total != 1.0 and total > 0:
-            combined_positive /= total
-            combined_negative /= total
-            combined_neutral /= total
-        
-        # Calculate compound score
-        compound = combined_positive - combined_negative
-        
-        # Determine overall sentiment based on combined scores
-        if compound > 0.50:
-            sentiment_label = "Positive"
-        elif 0.10 < compound < 0.50:
-            sentiment_label = "Slightly Positive"
-        elif -0.10 < compound < 0.10:
-            sentiment_label = "Neutral"
-        elif -0.50 < compound < -0.10:
-            sentiment_label = "Slightly Negative"
-        else: 
-            sentiment_label = "Negative"
-        
-        # Calculate leaning
-        if compound > 0:
-            lean_percentage = round((compound / 1) * 100)
-            lean_result = {
-                "direction": "Positive",
-                "percentage": lean_percentage
-            }
-        elif compound < 0:
-            lean_percentage = round((abs(compound) / 1) * 100)
-            lean_result = {
-                "direction": "Negative",
-                "percentage": lean_percentage
-            }
-        else:
-            lean_result = {
-                "direction": "Balanced",
-                "percentage": 0
-            }
-        
-        # Format the results
-        formatted_score = {
-            "positive": round(combined_positive, 5),
-            "negative": round(combined_negative, 5),
-            "neutral": round(combined_neutral, 5),
-            "compound": round(compound, 5),
-            "sentiment": sentiment_label,
-            "neutral_leaning": lean_result
-        }
-        
-        return formatted_score
-
-
-    def _split_text_into_chunks(self, text, max_words_per_chunk=300):
-        """
-        Split text into chunks of approximately max_words_per_chunk words.
-        This improved version ensures chunks don't exceed token limits.
-        
-        Args:
-            text (str): The text to split
-            max_words_per_chunk (int): Maximum number of words per chunk
-        
-        Returns:
-            list: List of text chunks
-        """
-        # Split text into sentences
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        
-        chunks = []
-        current_chunk = []
-        current_word_count = 0
-        
-        for sentence in sentences:
-            # Count words in this sentence
-            sentence_word_count = len(sentence.split())
-            
-            # If this single sentence is too long, split it further
-            if sentence_word_count > max_words_per_chunk:
-                # If we have a current chunk, add it to chunks
-                if current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                    current_chunk = []
-                    current_word_count = 0
-                
-                # Split long sentence into smaller parts (by words)
-                words = sentence.split()
-                for i in range(0, len(words), max_words_per_chunk):
-                    sentence_part = ' '.join(words[i:i + max_words_per_chunk])
-                    chunks.append(sentence_part)
-            
-            # If adding this sentence would exceed the chunk size, start a new chunk
-            elif current_word_count + sentence_word_count > max_words_per_chunk and current_chunk:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [sentence]
-                current_word_count = sentence_word_count
-            else:
-                current_chunk.append(sentence)
-                current_word_count += sentence_word_count
-        
-        # Add the last chunk if there is one
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        # Log the chunking process
-        self.logger.info(f"Split text into {len(chunks)} chunks (original length: {len(text.split())} words)")
-        
-        return chunks
-
     def sentiment_score_refinement(self, text, sentiment_score):
         """
         Refine the score using predefined keywords 
@@ -659,44 +1026,40 @@ class CombinedAnalyzer:
         Returns:
             list: Refined sentiment scores [negative, neutral, positive]
         """
-        tune_score = 0
-        newText = text.lower()
-
-        ori_negetive = sentiment_score[0]
-        ori_neutral = sentiment_score[1]
-        ori_positive = sentiment_score[2]
+        return self.sentiment_score_refinement_batch([text], [sentiment_score])[0].tolist()
 
-        # Check for positive keywords
-        for keyword, adjustment in self.positive_keywords.items():
-            if keyword in newText:
-                tune_score += adjustment
+    def sentiment_score_refinement_batch(self, texts, sentiment_scores):
+        """
+        Refine a batch of scores using predefined keywords, with the keyword hits of
+        all texts gathered in one sparse matrix
+        Args:
+            texts (list): The input texts to analyze
+            sentiment_scores (list): Original scores [negative, neutral, positive] per text
+        Returns:
+            np.ndarray: Refined sentiment scores [negative, neutral, positive] per text
+        """
+        scores = np.asarray(sentiment_scores, dtype=np.float64).reshape(-1, 3)
+        ori_negative = scores[:, 0]
+        ori_positive = scores[:, 2]
 
-        # Check for negative keywords
-        for keyword, adjustment in self.negative_keywords.items():
-            if keyword in newText:
-                tune_score -= abs(adjustment)
+        # Keyword hits for the whole batch in one matrix-vector product
+        tune_score = self.lexicon.adjustments(texts)
 
         # Update the sentiment score
         # Apply positive adjustments
-        refined_positive = min(1.0, max(0.0, ori_positive + tune_score)) #to ensure the score is between 0 and 1
+        refined_positive = np.clip(ori_positive + tune_score, 0.0, 1.0) #to ensure the score is between 0 and 1
         # Apply negative adjustments
-        refined_negative = min(1.0, max(0.0, ori_negetive - tune_score)) 
+        refined_negative = np.clip(ori_negative - tune_score, 0.0, 1.0)
 
         # Get the changes from the original score
         changes_positive = refined_positive - ori_positive
-        changes_negative = refined_negative - ori_negetive
+        changes_negative = refined_negative - ori_negative
 
         # Update the neutral score
         refined_neutral = 1.0 - changes_positive - changes_negative
         
-        # Normalize the scores if the sum of positive, negative, and neutral is not equal to 1
+        # Normalize the scores so positive, negative, and neutral sum to 1
         total = refined_positive + refined_negative + refined_neutral
-        if total != 1.0:
-            normalised_positive = refined_positive / total
-            normalised_negative = refined_negative / total
-            normalised_neutral = refined_neutral / total
 
         # Return the refined scores
-        sentiment_score = [normalised_negative, normalised_neutral, normalised_positive]
-        
-        return sentiment_score
\ No newline at end of file
+        return np.stack([refined_negative, refined_neutral, refined_positive], axis=1) / total[:, None]
\ No newline at end of file
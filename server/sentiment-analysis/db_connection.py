@@ -1,11 +1,70 @@
 import logging
 import os
-from datetime import datetime
-from pymongo import MongoClient
+import re
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Posts still waiting for analysis: sentiment exactly null and never marked as failed or skipped.
+# Every write-back sets sentiment_updated_at, so posts that were partially processed are excluded too
+UNANALYSED_QUERY = {
+    "$and": [
+        {"sentiment": None},  # Must be exactly null (not undefined, not false, not empty string)
+        {"sentiment_analysis_failed": {"$ne": True}},
+        {"sentiment_analysis_skipped": {"$ne": True}},
+        {"sentiment_updated_at": {"$exists": False}}
+    ]
+}
+
+# Index names created by ensure_indexes
+POST_ID_INDEX = "post_id_unique"
+UNANALYSED_INDEX = "unanalysed_queue"
+CLAIM_INDEX = "in_flight_claims"
+LEASE_INDEX = "in_flight_leases"
+
+# Collection names by source, and the spellings of each source seen in posts and requests
+SOURCES = ("Twitter", "Reddit", "Bluesky")
+SOURCE_ALIASES = {
+    "twitter": "Twitter", "tweets": "Twitter", "x": "Twitter",
+    "reddit": "Reddit", "reddit_posts": "Reddit",
+    "bluesky": "Bluesky", "bluesky_posts": "Bluesky"
+}
+
+# What each platform's post IDs look like: Bluesky CIDs, Twitter snowflakes, Reddit base36 IDs.
+# Only a first guess, a post not found where its ID points is looked for in the other collections
+POST_ID_SHAPES = (
+    ("Bluesky", re.compile(r'baf[a-z2-7]{50,}')),
+    ("Twitter", re.compile(r'\d{15,20}')),
+    ("Reddit", re.compile(r'[0-9a-z]{1,12}'))
+)
+DEFAULT_ROUTE_CACHE_SIZE = 100000
+
+# Backlog counters: one document in analysis_stats holding the unanalysed count per source. Scrapers
+# increment it on insert, write-backs decrement it, and it is recounted every reconcile interval
+STATS_COLLECTION = "analysis_stats"
+BACKLOG_STATS_ID = "unanalysed_backlog"
+BACKLOG_FIELDS = ("twitter", "reddit", "bluesky")
+DEFAULT_BACKLOG_TTL = 5
+DEFAULT_BACKLOG_RECONCILE_SECONDS = 600
+
+# Posts claimed by a worker are "in_progress" until written back or their lease runs out
+IN_PROGRESS = "in_progress"
+DEFAULT_LEASE_SECONDS = 300
+
+# The fields UNANALYSED_QUERY reads
+UNANALYSED_FIELDS = {"sentiment": 1, "sentiment_analysis_failed": 1, "sentiment_analysis_skipped": 1,
+                     "sentiment_updated_at": 1, "_id": 0}
+
+# Claim fields removed when a post is written back, and the ones removed when it goes back to the queue
+CLAIM_FIELDS = {"sentiment_claimed_by": "", "sentiment_claim_id": "", "sentiment_lease_expires_at": ""}
+RELEASE_FIELDS = dict(CLAIM_FIELDS, sentiment_status="")
+
 class db_connection:
     """Class to handle MongoDB connection."""
     def __init__(self):
@@ -16,6 +75,19 @@ class db_connection:
         self.tweet_posts_collection = None
         self.reddit_posts_collection = None
         self.bluesky_posts_collection = None  # Added collection for Bluesky posts
+        self.analysis_stats_collection = None
+        # How long a claimed post stays reserved for its worker without a renewal
+        self.lease_seconds = int(os.environ.get("SENTIMENT_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+        # post_id -> source of posts seen recently, so by-ID operations query one collection
+        self._routes = OrderedDict()
+        self.route_cache_size = int(os.environ.get("SENTIMENT_ROUTE_CACHE_SIZE", DEFAULT_ROUTE_CACHE_SIZE))
+        # Backlog counts are served from memory for backlog_ttl seconds and recounted from the
+        # collections when the stored counters are older than backlog_reconcile_seconds
+        self.backlog_ttl = float(os.environ.get("SENTIMENT_BACKLOG_TTL", DEFAULT_BACKLOG_TTL))
+        self.backlog_reconcile_seconds = float(os.environ.get("SENTIMENT_BACKLOG_RECONCILE_SECONDS",
+                                                              DEFAULT_BACKLOG_RECONCILE_SECONDS))
+        self._backlog = None
+        self._backlog_expires = 0.0
         self.start_db_connection()
 
     def start_db_connection(self):
@@ -26,32 +98,186 @@ class db_connection:
             self.tweet_posts_collection = self.db.tweets
             self.reddit_posts_collection = self.db.reddit_posts
             self.bluesky_posts_collection = self.db.bluesky_posts  # Initialise Bluesky collection
+            self.analysis_stats_collection = self.db[STATS_COLLECTION]
             logger.info(f"Connected to MongoDB Atlas: {self.db_name}")
             return True
         except Exception as e:
             logger.error(f"MongoDB connection error: {e}")
             return False
         
+    def ensure_indexes(self):
+        """
+        Create the indexes the hot queries need and check with explain() that they are used.
+        Safe to run on every startup: existing indexes are left as they are
+        
+        Returns:
+            dict: Per collection, the index names and whether the work-queue query and
+                post_id lookups are served by them
+        """
+        if (self.tweet_posts_collection is None or 
+            self.reddit_posts_collection is None or 
+            self.bluesky_posts_collection is None):
+            if not self.start_db_connection():
+                logger.error("MongoDB connection not established.")
+                return {}
+        
+        report = {}
+        for collection in (self.tweet_posts_collection, self.reddit_posts_collection, self.bluesky_posts_collection):
+            try:
+                post_id_index = self._ensure_post_id_index(collection)
+                # Partial indexes only accept positive filters, so the $ne and $exists: false terms of
+                # UNANALYSED_QUERY cannot be one. Missing fields are indexed as null instead, so the
+                # null range of this index holds exactly the posts never written back
+                queue_index = collection.create_index([("sentiment_updated_at", ASCENDING)], name=UNANALYSED_INDEX)
+                # Small partial indexes over in-flight posts only, for lease renewal and the reaper
+                for field, name in (("sentiment_claim_id", CLAIM_INDEX), ("sentiment_lease_expires_at", LEASE_INDEX)):
+                    collection.create_index([(field, ASCENDING)], name=name,
+                                            partialFilterExpression={"sentiment_status": IN_PROGRESS})
+                report[collection.name] = {
+                    "post_id_index": post_id_index,
+                    "queue_index": queue_index,
+                    "post_id_lookup_indexed": self._query_uses_index(collection, {"post_id": ""}, post_id_index),
+                    "queue_query_indexed": self._query_uses_index(collection, UNANALYSED_QUERY, queue_index)
+                }
+            except Exception as e:
+                logger.error(f"Error ensuring indexes on {collection.name}: {e}")
+                report[collection.name] = {"error": str(e)}
+                continue
+            
+            for query_name in ("post_id_lookup_indexed", "queue_query_indexed"):
+                if not report[collection.name][query_name]:
+                    logger.warning(f"{collection.name}: {query_name.replace('_indexed', '')} query does not use its index")
+        logger.info(f"Index check: {report}")
+        return report
+
+    def _ensure_post_id_index(self, collection):
+        """
+        Make sure post_id lookups are indexed, uniquely where the data allows it
+        
+        Returns:
+            str: Name of the post_id index
+        """
+        for name, info in collection.index_information().items():
+            if info["key"] == [("post_id", ASCENDING)]:
+                if not info.get("unique"):
+                    logger.warning(f"{collection.name} post_id index {name} is not unique")
+                return name
+        try:
+            return collection.create_index([("post_id", ASCENDING)], name=POST_ID_INDEX, unique=True)
+        except OperationFailure as e:
+            if e.code != 11000:
+                raise
+            # Duplicates already stored would have to be removed first; index the lookups anyway
+            logger.error(f"{collection.name} holds duplicate post_ids, creating a non-unique post_id index: {e}")
+            return collection.create_index([("post_id", ASCENDING)], name="post_id")
+
+    def _query_uses_index(self, collection, query, index_name):
+        """Whether the winning plan for a query scans the named index"""
+        plan = collection.find(query).limit(1).explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = [plan]
+        while stages:
+            stage = stages.pop()
+            if isinstance(stage, dict):
+                # Single-document lookups on a unique index run as EXPRESS_IXSCAN on MongoDB 8
+                if stage.get("stage") in ("IXSCAN", "EXPRESS_IXSCAN") and stage.get("indexName") == index_name:
+                    return True
+                stages.extend(stage.values())
+            elif isinstance(stage, list):
+                stages.extend(stage)
+        return False
+
+    def normalise_source(self, source):
+        """
+        Canonical source name for any spelling of a platform or collection
+        
+        Args:
+            source (str): e.g. 'reddit', 'Reddit' or 'reddit_posts'
+            
+        Returns:
+            str: 'Twitter', 'Reddit' or 'Bluesky', or None if the source is not recognised
+        """
+        if not source:
+            return None
+        return SOURCE_ALIASES.get(str(source).strip().lower())
+
     def get_collection_for_source(self, source):
         """
         Get the appropriate collection based on source
         
         Args:
-            source (str): 'twitter', 'reddit', or 'bluesky'
+            source (str): 'twitter', 'reddit', or 'bluesky', in any case
             
         Returns:
             Collection: MongoDB collection
         """
-        if source == 'Twitter':
+        source_name = self.normalise_source(source)
+        if source_name == 'Twitter':
             return self.tweet_posts_collection
-        elif source == 'Reddit':
+        elif source_name == 'Reddit':
             return self.reddit_posts_collection
-        elif source == 'Bluesky':
+        elif source_name == 'Bluesky':
             return self.bluesky_posts_collection
         else:
             logger.warning(f"Unknown source: {source}, defaulting to reddit_posts")
             return self.reddit_posts_collection
-    
+
+    def remember_route(self, post_id, source):
+        """Record which collection holds a post, evicting the least recently used routes"""
+        source_name = self.normalise_source(source)
+        if not post_id or source_name is None or not self.route_cache_size:
+            return
+        self._routes[post_id] = source_name
+        self._routes.move_to_end(post_id)
+        while len(self._routes) > self.route_cache_size:
+            self._routes.popitem(last=False)
+
+    def route_post(self, post_id, source=None):
+        """
+        Order the sources to look for a post in, most likely first: the given source, then the
+        routing cache, then the shape of the ID
+        
+        Returns:
+            list: Source names; the first is queried alone and the rest only if the post is not there
+        """
+        source_name = self.normalise_source(source)
+        if source_name is None and post_id in self._routes:
+            source_name = self._routes[post_id]
+            self._routes.move_to_end(post_id)
+        if source_name is None:
+            post_id_text = str(post_id)
+            source_name = next((name for name, shape in POST_ID_SHAPES if shape.fullmatch(post_id_text)), SOURCES[0])
+        return [source_name] + [name for name in SOURCES if name != source_name]
+
+    def _update_routed(self, post_id, update_doc, source=None):
+        """
+        Update the post in the collection holding it, trying the other collections only on a miss
+        
+        Returns:
+            str: The source the post was updated in, or None if no collection holds it
+        """
+        candidates = self.route_post(post_id, source)
+        if self.normalise_source(source):
+            # An explicit source is trusted, as before
+            candidates = candidates[:1]
+        for source_name in candidates:
+            # The document as it was before the update tells whether the post leaves the backlog
+            before = self.get_collection_for_source(source_name).find_one_and_update(
+                {"post_id": post_id}, update_doc, projection=UNANALYSED_FIELDS
+            )
+            if before is not None:
+                self.remember_route(post_id, source_name)
+                if self._is_unanalysed(before):
+                    self._adjust_backlog({source_name.lower(): -1})
+                return source_name
+        return None
+
+    def _is_unanalysed(self, post):
+        """Whether a post document matches UNANALYSED_QUERY"""
+        return (post.get("sentiment") is None
+                and post.get("sentiment_analysis_failed") is not True
+                and post.get("sentiment_analysis_skipped") is not True
+                and "sentiment_updated_at" not in post)
+
     def get_unanalysed_posts(self, limit=50, source=None):
         """
         Get unanalysed posts from the database.
@@ -75,23 +301,13 @@ class db_connection:
             
             results = []
             
-            # Updated query to strictly ensure we only get posts where sentiment is exactly null
-            # and haven't been marked as failed or skipped
-            query = {
-                "$and": [
-                    {"sentiment": None},  # Must be exactly null (not undefined, not false, not empty string)
-                    {"sentiment_analysis_failed": {"$ne": True}},
-                    {"sentiment_analysis_skipped": {"$ne": True}},
-                    # Add a check for sentiment_updated_at to ensure we don't process posts that might have been
-                    # partially processed but not marked properly
-                    {"sentiment_updated_at": {"$exists": False}}
-                ]
-            }
+            query = UNANALYSED_QUERY
             
             projection = {
                 "post_id": 1,
                 "content_text": 1,
-                "platform": 1
+                "platform": 1,
+                "language": 1
             }
             
             # If source is specified, only query that collection
@@ -99,6 +315,8 @@ class db_connection:
                 collection = self.get_collection_for_source(source)
                 cursor = collection.find(query, projection).limit(limit)
                 results = list(cursor)
+                for post in results:
+                    self.remember_route(post.get("post_id"), source)
             else:
                # First try Reddit with highest priority
                 reddit_limit = int(limit * 0.6)  # 60% of the limit for Reddit
@@ -118,8 +336,11 @@ class db_connection:
                 # Combine results
                 results = reddit_results + bluesky_results + twitter_results
                 
-                # Combine results
-                results = reddit_results + bluesky_results + twitter_results
+                # Later writes for these posts go straight to their collection
+                for source_name, source_results in (("Reddit", reddit_results), ("Bluesky", bluesky_results),
+                                                    ("Twitter", twitter_results)):
+                    for post in source_results:
+                        self.remember_route(post.get("post_id"), source_name)
 
             # Log the post IDs we're about to process to help with debugging
             post_ids = [post.get('post_id') for post in results]
@@ -130,6 +351,152 @@ class db_connection:
             logger.error(f"Error fetching unanalysed posts: {e}")
             return []
         
+    def _claimable_query(self, now):
+        """Unanalysed posts that no worker holds an unexpired lease on"""
+        return {"$and": UNANALYSED_QUERY["$and"] + [{"sentiment_lease_expires_at": {"$not": {"$gt": now}}}]}
+
+    def claim_posts(self, worker_id, limit=50, source=None, lease_seconds=None):
+        """
+        Atomically reserve unanalysed posts for one worker, so concurrent workers never get the same post.
+        Claimed posts are "in_progress" until they are written back, their claim is released, or
+        their lease expires and release_expired_leases returns them to the queue.
+        
+        Args:
+            worker_id (str): Identifies the claiming worker, e.g. host and process ID
+            limit (int): The maximum number of posts to claim. Default is 50.
+            source (str): Optional source filter ('Twitter', 'Reddit' or 'Bluesky')
+            lease_seconds (int): Lease length, defaults to SENTIMENT_LEASE_SECONDS, then 300
+            
+        Returns:
+            tuple: (claim_id, claimed posts with the fields get_unanalysed_posts returns)
+        """
+        claim_id = uuid.uuid4().hex
+        try:
+            if (self.tweet_posts_collection is None or 
+                self.reddit_posts_collection is None or 
+                self.bluesky_posts_collection is None):
+                if not self.start_db_connection():
+                    logger.error("MongoDB connection not established.")
+                    return claim_id, []
+            
+            now = datetime.utcnow()
+            lease = {
+                "sentiment_status": IN_PROGRESS,
+                "sentiment_claimed_by": worker_id,
+                "sentiment_claim_id": claim_id,
+                "sentiment_lease_expires_at": now + timedelta(seconds=lease_seconds or self.lease_seconds)
+            }
+            
+            if source:
+                results = self._claim_from(self.normalise_source(source) or source, limit, lease, now)
+            else:
+                # Same source priorities as get_unanalysed_posts
+                reddit_results = self._claim_from("Reddit", int(limit * 0.6), lease, now)
+                bluesky_results = self._claim_from("Bluesky", int((limit - len(reddit_results)) * 0.7), lease, now)
+                twitter_results = self._claim_from("Twitter", limit - len(reddit_results) - len(bluesky_results), lease, now)
+                results = reddit_results + bluesky_results + twitter_results
+            
+            logger.info(f"Worker {worker_id} claimed {len(results)} posts (claim {claim_id})")
+            return claim_id, results
+        except Exception as e:
+            logger.error(f"Error claiming posts: {e}")
+            # Give back anything claimed before the error
+            self.release_claims([claim_id])
+            return claim_id, []
+
+    def _claim_from(self, source, limit, lease, now):
+        """
+        Claim up to limit posts from one source's collection. Candidates are read first, then leased with one
+        update_many that re-checks the claimable filter on each document, so a post taken by another
+        worker in between is skipped. The posts this claim won are read back by claim ID
+        """
+        if limit <= 0:
+            return []
+        collection = self.get_collection_for_source(source)
+        candidates = [post["_id"] for post in collection.find(self._claimable_query(now), {"_id": 1}).limit(limit)]
+        if not candidates:
+            return []
+        claimable = self._claimable_query(now)
+        claimable["$and"].append({"_id": {"$in": candidates}})
+        collection.update_many(claimable, {"$set": lease})
+        projection = {
+            "post_id": 1,
+            "content_text": 1,
+            "platform": 1,
+            "language": 1
+        }
+        claimed = list(collection.find({"_id": {"$in": candidates}, "sentiment_claim_id": lease["sentiment_claim_id"]}, projection))
+        for post in claimed:
+            self.remember_route(post.get("post_id"), source)
+        return claimed
+
+    def renew_leases(self, claim_ids, lease_seconds=None):
+        """
+        Extend the leases of posts still in flight under the given claims
+        
+        Args:
+            claim_ids (list): Claim IDs returned by claim_posts
+            lease_seconds (int): New lease length from now, defaults to SENTIMENT_LEASE_SECONDS
+            
+        Returns:
+            int: Number of posts whose lease was extended
+        """
+        if not claim_ids:
+            return 0
+        expires_at = datetime.utcnow() + timedelta(seconds=lease_seconds or self.lease_seconds)
+        return self._update_in_flight(
+            {"sentiment_claim_id": {"$in": list(claim_ids)}},
+            {"$set": {"sentiment_lease_expires_at": expires_at}},
+            "renewing leases"
+        )
+
+    def release_claims(self, claim_ids):
+        """
+        Return posts of finished claims that were never written back to the queue
+        
+        Args:
+            claim_ids (list): Claim IDs returned by claim_posts
+            
+        Returns:
+            int: Number of posts returned to the queue
+        """
+        if not claim_ids:
+            return 0
+        return self._update_in_flight(
+            {"sentiment_claim_id": {"$in": list(claim_ids)}}, {"$unset": RELEASE_FIELDS}, "releasing claims"
+        )
+
+    def release_expired_leases(self):
+        """
+        Return posts whose lease ran out, e.g. because their worker died, to the queue
+        
+        Returns:
+            int: Number of posts returned to the queue
+        """
+        released = self._update_in_flight(
+            {"sentiment_lease_expires_at": {"$lte": datetime.utcnow()}}, {"$unset": RELEASE_FIELDS}, "releasing expired leases"
+        )
+        if released:
+            logger.warning(f"Returned {released} posts with expired leases to the queue")
+        return released
+
+    def _update_in_flight(self, query, update, action):
+        """Apply an update to in-flight posts in every collection and count the posts changed"""
+        if (self.tweet_posts_collection is None or 
+            self.reddit_posts_collection is None or 
+            self.bluesky_posts_collection is None):
+            if not self.start_db_connection():
+                logger.error("MongoDB connection not established.")
+                return 0
+        
+        modified = 0
+        for collection in (self.tweet_posts_collection, self.reddit_posts_collection, self.bluesky_posts_collection):
+            try:
+                modified += collection.update_many(dict(query, sentiment_status=IN_PROGRESS), update).modified_count
+            except Exception as e:
+                logger.error(f"Error {action} in {collection.name}: {e}")
+        return modified
+
     def update_post_sentiment(self, post_id, sentiment, source=None):
         """
         Update the sentiment of a post in the database.
@@ -150,73 +517,366 @@ class db_connection:
                     logger.error("MongoDB connection not established.")
                     return False
             
-            # Build the update document with all necessary fields
-            update_doc = {
-                "$set": {
-                    "sentiment": sentiment.get("sentiment"),
-                    "entities": sentiment.get("entities"),
-                    "processed_text": sentiment.get("processed_text"),
-                    "sentiment_updated_at": datetime.utcnow(),
-                    # Add a status field to explicitly track that this post has been processed
-                    "sentiment_status": "processed"
-                }
-            }
-            
-            # If source is provided, only update that collection
-            if source:
-                collection = self.get_collection_for_source(source)
-                result = collection.update_one(
-                    {"post_id": post_id},
-                    update_doc
-                )
-                
-                if result.modified_count > 0:
-                    logger.info(f"{source.capitalize()} post {post_id} sentiment updated successfully.")
-                    return True
-                else:
-                    logger.warning(f"No changes made to {source} post {post_id}. Document might not exist or already has the same values.")
-            else:
-                # Try to update in all collections
-                twitter_result = self.tweet_posts_collection.update_one(
-                    {"post_id": post_id},
-                    update_doc
-                )
-                
-                reddit_result = self.reddit_posts_collection.update_one(
-                    {"post_id": post_id},
-                    update_doc
-                )
-                
-                bluesky_result = self.bluesky_posts_collection.update_one(
-                    {"post_id": post_id},
-                    update_doc
-                )
-                
-                if twitter_result.modified_count > 0:
-                    logger.info(f"Twitter post {post_id} sentiment updated successfully.")
-                    return True
-                elif reddit_result.modified_count > 0:
-                    logger.info(f"Reddit post {post_id} sentiment updated successfully.")
-                    return True
-                elif bluesky_result.modified_count > 0:
-                    logger.info(f"Bluesky post {post_id} sentiment updated successfully.")
-                    return True
-                else:
-                    logger.warning(f"No changes made to post {post_id}. Document might not exist or already has the same values.")
+            update_doc = self._sentiment_update_doc(sentiment, datetime.utcnow())
             
+            # Only the collection holding the post is written to
+            updated_source = self._update_routed(post_id, update_doc, source)
+            if updated_source:
+                logger.info(f"{updated_source} post {post_id} sentiment updated successfully.")
+                return True
+            logger.warning(f"No changes made to post {post_id}. Document might not exist or already has the same values.")
             return False
                 
         except Exception as e:
             logger.error(f"Error updating post sentiment: {e}")
             return False
         
-    def get_unanalysed_count(self):
+    def _sentiment_update_doc(self, sentiment, updated_at):
+        """Build the update document that stores an analysis result on a post"""
+        update_doc = {
+            "$set": {
+                "sentiment": sentiment.get("sentiment"),
+                # Unrefined model scores, so a lexicon change can be re-scored without the model
+                "sentiment_raw": sentiment.get("sentiment_raw"),
+                "entities": sentiment.get("entities"),
+                "processed_text": sentiment.get("processed_text"),
+                # Which tier scored the post: the cascade fast path or the model
+                "sentiment_tier": sentiment.get("tier", "model"),
+                "sentiment_updated_at": updated_at,
+                # Add a status field to explicitly track that this post has been processed
+                "sentiment_status": "processed"
+            }
+        }
+        # Remember the detected language so it is never identified again
+        if sentiment.get("language"):
+            update_doc["$set"]["language"] = sentiment["language"]
+        # Writing the result ends the worker's claim on the post
+        update_doc["$unset"] = CLAIM_FIELDS
+        return update_doc
+
+    def _bulk_update_posts(self, updates, updated_at, claim_id=None):
+        """
+        Apply per-post updates with one unordered bulk write per collection. Posts that were
+        still in the work queue are taken off the backlog counters
+        
+        Args:
+            updates (list): (post_id, update_doc, source) triples. Without a recognised source a
+                post is routed like the single-post methods do, and only posts missing from the
+                collection it was routed to are sent on to the others, in a further round
+            updated_at (datetime): The sentiment_updated_at every update document sets, used
+                to read back which posts were written when not all of them were
+            claim_id (str): The claim the posts were analysed under. Only posts still held by it
+                are written, so a worker whose lease ran out cannot overwrite the result or the
+                claim of a worker that has since claimed the post
+            
+        Returns:
+            dict: post_id -> True if the post was updated, False if the write failed, and
+                None if claim_id no longer holds the post (its lease was lost)
+        """
+        if (self.tweet_posts_collection is None or 
+            self.reddit_posts_collection is None or 
+            self.bluesky_posts_collection is None):
+            if not self.start_db_connection():
+                logger.error("MongoDB connection not established.")
+                return {post_id: False for post_id, _, _ in updates}
+        
+        pending = []
+        for post_id, update_doc, source in updates:
+            candidates = self.route_post(post_id, source)
+            if self.normalise_source(source) or claim_id is not None:
+                # An explicit source is trusted, as before. Claimed posts were routed when they were
+                # claimed, and missing from there means the claim was lost, not a wrong guess
+                candidates = candidates[:1]
+            pending.append((post_id, update_doc, candidates))
+        
+        status = {post_id: False for post_id, _, _ in updates}
+        failed = set()
+        backlog_deltas = dict.fromkeys(BACKLOG_FIELDS, 0)
+        while pending:
+            batches = {}
+            for post_id, update_doc, candidates in pending:
+                batches.setdefault(candidates[0], []).append((post_id, update_doc))
+            for source_name, batch in batches.items():
+                written, write_failed, dequeued = self._write_batch(
+                    self.get_collection_for_source(source_name), batch, updated_at, claim_id
+                )
+                failed |= write_failed
+                for post_id in written:
+                    status[post_id] = True
+                    self.remember_route(post_id, source_name)
+                backlog_deltas[source_name.lower()] -= dequeued
+            pending = [(post_id, update_doc, candidates[1:]) for post_id, update_doc, candidates in pending
+                       if not status[post_id] and post_id not in failed and len(candidates) > 1]
+        self._adjust_backlog(backlog_deltas)
+        
+        if claim_id is not None:
+            lost = [post_id for post_id, written in status.items() if not written and post_id not in failed]
+            for post_id in lost:
+                status[post_id] = None
+            if lost:
+                logger.warning(f"Claim {claim_id} lost its lease on {len(lost)} posts, their results were not written")
+        return status
+
+    def _write_batch(self, collection, updates, updated_at, claim_id=None):
+        """
+        Write (post_id, update_doc) pairs to one collection. The first bulk write only matches posts
+        still in the work queue, so its modified count is exactly the number of posts leaving the
+        backlog. Posts that were not queued, e.g. ones analysed again, get a second bulk write,
+        which a batch taken from the queue never needs
+        
+        Returns:
+            tuple: (post IDs that were updated, post IDs whose update failed, posts taken off the backlog)
+        """
+        written, failed, dequeued = self._bulk_write(collection, [
+            UpdateOne(self._post_filter(post_id, claim_id, queued=True), update_doc) for post_id, update_doc in updates
+        ], [post_id for post_id, _ in updates], updated_at)
+        
+        remaining = [(post_id, update_doc) for post_id, update_doc in updates
+                     if post_id not in written and post_id not in failed]
+        if remaining:
+            rewritten, refailed, _ = self._bulk_write(collection, [
+                UpdateOne(self._post_filter(post_id, claim_id), update_doc) for post_id, update_doc in remaining
+            ], [post_id for post_id, _ in remaining], updated_at)
+            written |= rewritten
+            failed |= refailed
+        return written, failed, dequeued
+
+    def _post_filter(self, post_id, claim_id=None, queued=False):
+        """Match a post, optionally only while claim_id holds it or while it is in the work queue"""
+        post_filter = {"post_id": post_id}
+        if claim_id is not None:
+            post_filter["sentiment_claim_id"] = claim_id
+        if queued:
+            post_filter["$and"] = UNANALYSED_QUERY["$and"]
+        return post_filter
+
+    def _bulk_write(self, collection, operations, post_ids, updated_at):
+        """
+        Send one unordered bulk write to a collection
+        
+        Returns:
+            tuple: (post IDs that were updated, post IDs whose update failed, modified count).
+                Posts in neither matched no document
+        """
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            if result.modified_count == len(operations):
+                return set(post_ids), set(), result.modified_count
+            if result.modified_count == 0:
+                return set(), set(), 0
+            failed, modified = set(), result.modified_count
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            logger.warning(f"{len(write_errors)} of {len(operations)} updates to {collection.name} failed")
+            failed, modified = {post_ids[error["index"]] for error in write_errors}, e.details.get("nModified", 0)
+        except Exception as e:
+            logger.error(f"Bulk update of {collection.name} failed: {e}")
+            return set(), set(post_ids), 0
+        
+        # Some updates matched nothing or failed, read back which posts this write reached
+        try:
+            written = collection.find(
+                {"post_id": {"$in": post_ids}, "sentiment_updated_at": updated_at},
+                {"post_id": 1, "_id": 0}
+            )
+            return {post["post_id"] for post in written}, failed, modified
+        except Exception as e:
+            logger.error(f"Error reading back bulk update of {collection.name}: {e}")
+            return set(), set(post_ids), modified
+
+    def _bulk_timestamp(self):
+        """The current time truncated to the millisecond precision MongoDB stores, so it can be matched on"""
+        now = datetime.utcnow()
+        return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    def update_posts_sentiment_bulk(self, results, claim_id=None):
+        """
+        Update the sentiment of many posts with one round trip per collection.
+        
+        Args:
+            results (list): (post_id, sentiment, source) triples, with sentiment as for
+                update_post_sentiment and an optional source ('Twitter', 'Reddit' or 'Bluesky')
+            claim_id (str): The claim the posts came from, see _bulk_update_posts
+            
+        Returns:
+            dict: post_id -> True if the post was updated, False if the write failed, and
+                None if the claim lost its lease on the post
+        """
+        if not results:
+            return {}
+        updated_at = self._bulk_timestamp()
+        status = self._bulk_update_posts(
+            [(post_id, self._sentiment_update_doc(sentiment, updated_at), source) for post_id, sentiment, source in results],
+            updated_at,
+            claim_id
+        )
+        written = sum(1 for post_written in status.values() if post_written)
+        logger.info(f"Bulk updated sentiment of {written} of {len(status)} posts")
+        return status
+
+    def mark_posts_analysis_failed(self, failures, claim_id=None):
+        """
+        Mark many posts as failed analysis with one round trip per collection
+        
+        Args:
+            failures (list): (post_id, error_message, source) triples, source optional
+            claim_id (str): The claim the posts came from, see _bulk_update_posts
+            
+        Returns:
+            dict: post_id -> True if the post was marked, False if the write failed, and
+                None if the claim lost its lease on the post
+        """
+        if not failures:
+            return {}
+        updated_at = self._bulk_timestamp()
+        return self._bulk_update_posts([
+            (post_id, {"$set": {
+                "sentiment_analysis_failed": True,
+                "sentiment_error": error_message,
+                "sentiment_updated_at": updated_at
+            }, "$unset": RELEASE_FIELDS}, source)
+            for post_id, error_message, source in failures
+        ], updated_at, claim_id)
+
+    def mark_posts_analysis_skipped(self, skips, claim_id=None):
+        """
+        Mark many posts as skipped with one round trip per collection
+        
+        Args:
+            skips (list): (post_id, reason, language, source) tuples; language and source may be None
+            claim_id (str): The claim the posts came from, see _bulk_update_posts
+            
+        Returns:
+            dict: post_id -> True if the post was marked, False if the write failed, and
+                None if the claim lost its lease on the post
+        """
+        if not skips:
+            return {}
+        updated_at = self._bulk_timestamp()
+        updates = []
+        for post_id, reason, language, source in skips:
+            update_fields = {
+                "sentiment_analysis_skipped": True,
+                "sentiment_skip_reason": reason,
+                "sentiment_updated_at": updated_at
+            }
+            if language:
+                update_fields["language"] = language
+            updates.append((post_id, {"$set": update_fields, "$unset": RELEASE_FIELDS}, source))
+        return self._bulk_update_posts(updates, updated_at, claim_id)
+
+    def get_post_texts(self, limit=1000):
+        """
+        Export post texts, analysed or not, e.g. as unlabeled data for model distillation.
+        
+        Args:
+            limit (int): The maximum number of texts to fetch from each source.
+            
+        Returns:
+            list: Non-empty content_text values from all sources.
+        """
+        try:
+            if (self.tweet_posts_collection is None or 
+                self.reddit_posts_collection is None or 
+                self.bluesky_posts_collection is None):
+                if not self.start_db_connection():
+                    logger.error("MongoDB connection not established.")
+                    return []
+            
+            query = {"content_text": {"$nin": [None, ""]}}
+            projection = {"content_text": 1, "_id": 0}
+            texts = []
+            for collection in (self.tweet_posts_collection, self.reddit_posts_collection, self.bluesky_posts_collection):
+                texts.extend(post["content_text"] for post in collection.find(query, projection).limit(limit))
+            
+            logger.info(f"Exported {len(texts)} post texts")
+            return texts
+        except Exception as e:
+            logger.error(f"Error exporting post texts: {e}")
+            return []
+        
+    def iter_posts_to_rescore(self, keywords_version, batch_size=1000, source=None):
+        """
+        Iterate over analysed posts whose stored raw scores were refined with a different lexicon.
+        
+        Args:
+            keywords_version (str): Version of the current keyword lexicon.
+            batch_size (int): Number of posts per yielded batch.
+            source (str): Optional source filter ('Twitter', 'Reddit' or 'Bluesky')
+            
+        Yields:
+            tuple: (source, list of posts with _id, processed_text and sentiment_raw)
+        """
+        if (self.tweet_posts_collection is None or 
+            self.reddit_posts_collection is None or 
+            self.bluesky_posts_collection is None):
+            if not self.start_db_connection():
+                logger.error("MongoDB connection not established.")
+                return
+        
+        query = {
+            "sentiment_raw": {"$ne": None},
+            "sentiment_raw.keywords_version": {"$ne": keywords_version}
+        }
+        projection = {"processed_text": 1, "sentiment_raw": 1}
+        for post_source in ([source] if source else ['Twitter', 'Reddit', 'Bluesky']):
+            collection = self.get_collection_for_source(post_source)
+            batch = []
+            for post in collection.find(query, projection).batch_size(batch_size):
+                batch.append(post)
+                if len(batch) >= batch_size:
+                    yield post_source, batch
+                    batch = []
+            if batch:
+                yield post_source, batch
+
+    def update_rescored_sentiment(self, source, updates, keywords_version):
+        """
+        Write re-scored sentiment back in one unordered bulk write.
+        
+        Args:
+            source (str): 'Twitter', 'Reddit' or 'Bluesky'
+            updates (list): (_id, sentiment) pairs
+            keywords_version (str): Version of the lexicon the sentiment was refined with
+            
+        Returns:
+            int: Number of posts modified
+        """
+        if not updates:
+            return 0
+        try:
+            rescored_at = datetime.utcnow()
+            operations = [
+                UpdateOne({"_id": post_id}, {"$set": {
+                    "sentiment": sentiment,
+                    "sentiment_raw.keywords_version": keywords_version,
+                    "sentiment_rescored_at": rescored_at
+                }})
+                for post_id, sentiment in updates
+            ]
+            result = self.get_collection_for_source(source).bulk_write(operations, ordered=False)
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error writing re-scored sentiment for {source} posts: {e}")
+            return 0
+        
+    def get_unanalysed_count(self, refresh=False):
         """
         Get the count of unanalysed posts in the database.
         
+        Counts come from the backlog counters in analysis_stats, cached in memory for backlog_ttl
+        seconds, so reading them costs at most one find_one. The collections are only counted
+        when the counters are missing, older than backlog_reconcile_seconds or refresh is set.
+        
+        Args:
+            refresh (bool): Recount the collections now instead of reading the counters
+            
         Returns:
             dict: Counts of unanalysed posts by source
         """
+        now = time.monotonic()
+        if not refresh and self._backlog is not None and now < self._backlog_expires:
+            return dict(self._backlog)
         try:
             if (self.tweet_posts_collection is None or 
                 self.reddit_posts_collection is None or 
@@ -225,58 +885,83 @@ class db_connection:
                     logger.error("MongoDB connection not established.")
                     return {"total": 0, "twitter": 0, "reddit": 0, "bluesky": 0}
             
-            # Use the same query as get_unanalysed_posts for consistency
-            query = {
-                "$and": [
-                    {"sentiment": None},
-                    {"sentiment_analysis_failed": {"$ne": True}},
-                    {"sentiment_analysis_skipped": {"$ne": True}},
-                    {"sentiment_updated_at": {"$exists": False}}
-                ]
-            }
+            stats = None if refresh else self.analysis_stats_collection.find_one({"_id": BACKLOG_STATS_ID})
+            reconciled_at = stats.get("reconciled_at") if stats else None
+            if reconciled_at is None or datetime.utcnow() - reconciled_at > timedelta(seconds=self.backlog_reconcile_seconds):
+                counts = self.reconcile_unanalysed_count()
+            else:
+                # Concurrent decrements can briefly take a counter below zero before a reconcile
+                counts = {field: max(0, int(stats.get(field, 0))) for field in BACKLOG_FIELDS}
             
-            # Count unanalysed posts using the consistent query
-            twitter_count = self.tweet_posts_collection.count_documents(query)
-            reddit_count = self.reddit_posts_collection.count_documents(query)
-            bluesky_count = self.bluesky_posts_collection.count_documents(query)
-            total_count = twitter_count + reddit_count + bluesky_count
-            
-            logger.info(f"Unanalysed posts count - Total: {total_count}, Twitter: {twitter_count}, Reddit: {reddit_count}, Bluesky: {bluesky_count}")
-            return {
-                "total": total_count,
-                "twitter": twitter_count,
-                "reddit": reddit_count,
-                "bluesky": bluesky_count
-            }
+            counts = {"total": sum(counts.values()), **counts}
+            self._backlog = counts
+            self._backlog_expires = now + self.backlog_ttl
+            return dict(counts)
         except Exception as e:
             logger.error(f"Error fetching unanalysed posts count: {e}")
             return {"total": 0, "twitter": 0, "reddit": 0, "bluesky": 0}
     
-    def find_post_by_id(self, post_id):
+    def reconcile_unanalysed_count(self):
         """
-        Find a post by its ID in any collection
+        Count the unanalysed posts in every collection and store the result as the backlog counters.
+        Inserts and write-backs landing between the count and the write are off by one until the next
+        reconcile, which is why it runs periodically rather than once
+        
+        Returns:
+            dict: Counts of unanalysed posts by source, without the total
+        """
+        # Use the same query as get_unanalysed_posts for consistency
+        counts = {
+            "twitter": self.tweet_posts_collection.count_documents(UNANALYSED_QUERY),
+            "reddit": self.reddit_posts_collection.count_documents(UNANALYSED_QUERY),
+            "bluesky": self.bluesky_posts_collection.count_documents(UNANALYSED_QUERY)
+        }
+        self.analysis_stats_collection.update_one(
+            {"_id": BACKLOG_STATS_ID},
+            {"$set": dict(counts, reconciled_at=datetime.utcnow())},
+            upsert=True
+        )
+        logger.info(f"Reconciled unanalysed posts count - Total: {sum(counts.values())}, Twitter: {counts['twitter']}, "
+                    f"Reddit: {counts['reddit']}, Bluesky: {counts['bluesky']}")
+        return counts
+    
+    def _adjust_backlog(self, deltas):
+        """
+        Apply per-source changes to the stored backlog counters and the in-memory copy
+        
+        Args:
+            deltas (dict): 'twitter', 'reddit' or 'bluesky' -> change in unanalysed posts
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        if self._backlog is not None:
+            backlog = {field: max(0, self._backlog[field] + deltas.get(field, 0)) for field in BACKLOG_FIELDS}
+            self._backlog = {"total": sum(backlog.values()), **backlog}
+        try:
+            # Without a counters document there is nothing to adjust, the next read reconciles
+            self.analysis_stats_collection.update_one({"_id": BACKLOG_STATS_ID}, {"$inc": deltas})
+        except Exception as e:
+            # Drift is corrected by the next reconcile
+            logger.error(f"Error updating backlog counters: {e}")
+
+    def find_post_by_id(self, post_id, source=None):
+        """
+        Find a post by its ID, querying the collection it most likely lives in first
         
         Args:
             post_id (str): The ID of the post to find
+            source (str): Optional source hint ('twitter', 'reddit' or 'bluesky')
             
         Returns:
-            dict: The post document if found, None otherwise
+            tuple: (post document, 'twitter', 'reddit' or 'bluesky') if found, (None, None) otherwise
         """
         try:
-            # Try Twitter first
-            twitter_post = self.tweet_posts_collection.find_one({"post_id": post_id})
-            if twitter_post:
-                return twitter_post, "twitter"
-            
-            # Then try Reddit
-            reddit_post = self.reddit_posts_collection.find_one({"post_id": post_id})
-            if reddit_post:
-                return reddit_post, "reddit"
-            
-            # Then try Bluesky
-            bluesky_post = self.bluesky_posts_collection.find_one({"post_id": post_id})
-            if bluesky_post:
-                return bluesky_post, "bluesky"
+            for source_name in self.route_post(post_id, source):
+                post = self.get_collection_for_source(source_name).find_one({"post_id": post_id})
+                if post:
+                    self.remember_route(post_id, source_name)
+                    return post, source_name.lower()
             
             # Not found in any collection
             return None, None
@@ -284,57 +969,27 @@ class db_connection:
             logger.error(f"Error finding post {post_id}: {e}")
             return None, None
         
-    def mark_post_analysis_failed(self, post_id, error_message):
+    def mark_post_analysis_failed(self, post_id, error_message, source=None):
         """
         Mark a post as failed analysis to prevent it from being retried endlessly
         
         Args:
             post_id (str): The ID of the post
             error_message (str): The error message
+            source (str): Optional source of the post, otherwise it is routed by ID
         """
         try:
-            # Try to update in all collections
-            twitter_result = self.tweet_posts_collection.update_one(
-                {"post_id": post_id},
-                {
-                    "$set": {
-                        "sentiment_analysis_failed": True,
-                        "sentiment_error": error_message,
-                        "sentiment_updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            
-            reddit_result = self.reddit_posts_collection.update_one(
-                {"post_id": post_id},
-                {
-                    "$set": {
-                        "sentiment_analysis_failed": True,
-                        "sentiment_error": error_message,
-                        "sentiment_updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            
-            bluesky_result = self.bluesky_posts_collection.update_one(
-                {"post_id": post_id},
-                {
-                    "$set": {
-                        "sentiment_analysis_failed": True,
-                        "sentiment_error": error_message,
-                        "sentiment_updated_at": datetime.utcnow()
-                    }
-                }
-            )
+            updated_source = self._update_routed(post_id, {
+                "$set": {
+                    "sentiment_analysis_failed": True,
+                    "sentiment_error": error_message,
+                    "sentiment_updated_at": datetime.utcnow()
+                },
+                "$unset": RELEASE_FIELDS
+            }, source)
             
-            if twitter_result.modified_count > 0:
-                logger.info(f"Marked Twitter post {post_id} as failed analysis")
-                return True
-            elif reddit_result.modified_count > 0:
-                logger.info(f"Marked Reddit post {post_id} as failed analysis")
-                return True
-            elif bluesky_result.modified_count > 0:
-                logger.info(f"Marked Bluesky post {post_id} as failed analysis")
+            if updated_source:
+                logger.info(f"Marked {updated_source} post {post_id} as failed analysis")
                 return True
             
             logger.info(f"No post found with ID {post_id} to mark as failed")
@@ -343,61 +998,33 @@ class db_connection:
             logger.error(f"Error marking post as failed: {e}")
             return False
 
-    def mark_post_analysis_skipped(self, post_id, reason):
+    def mark_post_analysis_skipped(self, post_id, reason, language=None, source=None):
         """
         Mark a post as skipped (not to be analysed)
         
         Args:
             post_id (str): The ID of the post
             reason (str): The reason for skipping
+            language (str): Detected language of the post, stored so it is not identified again
+            source (str): Optional source of the post, otherwise it is routed by ID
         """
         try:
-            # Try to update in all collections
-            twitter_result = self.tweet_posts_collection.update_one(
-                {"post_id": post_id},
-                {
-                    "$set": {
-                        "sentiment_analysis_skipped": True,
-                        "sentiment_skip_reason": reason,
-                        "sentiment_updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            
-            reddit_result = self.reddit_posts_collection.update_one(
-                {"post_id": post_id},
-                {
-                    "$set": {
-                        "sentiment_analysis_skipped": True,
-                        "sentiment_skip_reason": reason,
-                        "sentiment_updated_at": datetime.utcnow()
-                    }
-                }
-            )
+            update_fields = {
+                "sentiment_analysis_skipped": True,
+                "sentiment_skip_reason": reason,
+                "sentiment_updated_at": datetime.utcnow()
+            }
+            if language:
+                update_fields["language"] = language
             
-            bluesky_result = self.bluesky_posts_collection.update_one(
-                {"post_id": post_id},
-                {
-                    "$set": {
-                        "sentiment_analysis_skipped": True,
-                        "sentiment_skip_reason": reason,
-                        "sentiment_updated_at": datetime.utcnow()
-                    }
-                }
-            )
+            updated_source = self._update_routed(post_id, {"$set": update_fields, "$unset": RELEASE_FIELDS}, source)
             
-            if twitter_result.modified_count > 0:
-                logger.info(f"Marked Twitter post {post_id} as skipped analysis: {reason}")
-                return True
-            elif reddit_result.modified_count > 0:
-                logger.info(f"Marked Reddit post {post_id} as skipped analysis: {reason}")
-                return True
-            elif bluesky_result.modified_count > 0:
-                logger.info(f"Marked Bluesky post {post_id} as skipped analysis: {reason}")
+            if updated_source:
+                logger.info(f"Marked {updated_source} post {post_id} as skipped analysis: {reason}")
                 return True
             
             logger.info(f"No post found with ID {post_id} to mark as skipped")
             return False
         except Exception as e:
             logger.error(f"Error marking post as skipped: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -1,10 +1,14 @@
 import logging
-import time
+from autotune import autotune_on_startup
 from combined_analyzer import CombinedAnalyzer
 from db_connection import db_connection
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from inference_pool import InferencePool
 from json_writer import AnalysisJSONWriter
+from language_filter import LanguageFilter
+from lease_keeper import LeaseKeeper
+from request_batcher import RequestBatcher
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -17,12 +21,31 @@ CORS(app)
 # Initialise the text analyzer
 text_analyzer = CombinedAnalyzer()
 
+# With SENTIMENT_AUTOTUNE on, tune an untuned host before serving. The sweep runs in a subprocess,
+# so this process has run no inference when it forks the workers below
+autotune_on_startup(text_analyzer)
+
+# Fork the inference workers straight after the model load so they share its memory
+inference_pool = InferencePool.from_env(text_analyzer)
+
+# Coalesce concurrent /analyse requests into batched model calls
+request_batcher = RequestBatcher(text_analyzer)
+
+# Keep non-English posts away from the English models
+language_filter = LanguageFilter()
+
 # Initialise JSON writer
 json_writer = AnalysisJSONWriter()
 
 # Initialise MongoDB connection
 db = db_connection()
 
+# Index the work-queue query and post_id lookups before serving
+db.ensure_indexes()
+
+# Posts are claimed with a lease before analysis, so several servers can drain the queue in parallel
+lease_keeper = LeaseKeeper(db)
+
 @app.route('/')
 def home():
     return jsonify({"status": "running", "service": "sentiment-analysis"})
@@ -33,7 +56,21 @@ def health_check():
         # Check if the model is loaded and ready
         if text_analyzer is not None:
             db_status = "connected" if db.start_db_connection() else "not connected"
-            return jsonify({"status": "healthy", "model": "loaded", "db": db_status})
+            return jsonify({
+                "status": "healthy",
+                "model": "loaded",
+                "db": db_status,
+                "model_id": text_analyzer.model_id,
+                "artifact_dir": text_analyzer.artifact_dir,
+                "startup_seconds": text_analyzer.startup_timings,
+                "tuning": {
+                    "precision": text_analyzer.precision,
+                    "batch_size": text_analyzer.batch_size,
+                    "tuned_at": text_analyzer.tuning["created_at"] if text_analyzer.tuning else None
+                },
+                "inference_pool": inference_pool.stats() if inference_pool is not None else None,
+                "leases": lease_keeper.stats()
+            })
         return jsonify({"status": "unhealthy", "model": "not loaded"})
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
@@ -49,8 +86,8 @@ def analyse_text():
         text = data['text']
         logger.info(f"Analyzing text: {text[:100]}...")
 
-        # Perform analysis
-        analysis_result = text_analyzer.analyze_text(text)
+        # Perform analysis, batched with other in-flight requests
+        analysis_result = request_batcher.analyze_text(text)
         
         # Save to JSON
         json_writer.save_analysis(text, analysis_result)
@@ -68,13 +105,14 @@ def analyse_text():
 
 @app.route('/analyse/batch', methods=['POST'])
 def analyse_batch():
+    claim_id = None
     try:
         data = request.get_json()
         batch_size = data.get('batch_size', 50) if data else 50
         source = data.get('source', None)  # Optional source filter (twitter, reddit, bluesky)
         
-        # Fetch unanalysed posts
-        unanalysed_posts = db.get_unanalysed_posts(batch_size, source)
+        # Claim unanalysed posts so no other worker analyses them at the same time
+        claim_id, unanalysed_posts = lease_keeper.claim(batch_size, source)
         
         if not unanalysed_posts:
             return jsonify({
@@ -85,48 +123,81 @@ def analyse_batch():
         
         analysed_count = 0
         error_count = 0
+        language_skipped_count = 0
+        lease_lost_count = 0
         processed_ids = []  # Track which posts we've processed
+        pending_posts = []  # Posts with content, analysed together below
+        # Write-backs collected here and sent to MongoDB in one bulk write per collection
+        sentiment_updates = []
+        failed_posts = []
+        skipped_posts = []
         
         for post in unanalysed_posts:
-            try:
-                post_id = post.get('post_id')
-                if not post_id:
-                    logger.warning(f"Post {post.get('_id', 'unknown')} has no post_id.")
-                    continue
-                    
-                post_source = post.get('platform')
-                content = post.get('content_text', '')
-                
-                if not content:
-                    logger.warning(f"Post {post_id} has no content to analyse.")
-                    # Mark post as processed but with a warning
-                    db.mark_post_analysis_skipped(post_id, "No content to analyse")
-                    continue
-                
-                # Analyse the content
-                result = text_analyzer.analyze_text(content)
-                
-                # Update post with sentiment analysis results
-                status = db.update_post_sentiment(post_id, result, post_source)
+            post_id = post.get('post_id')
+            if not post_id:
+                logger.warning(f"Post {post.get('_id', 'unknown')} has no post_id.")
+                continue
                 
-                if status:
-                    analysed_count += 1
-                    processed_ids.append(post_id)
+            content = post.get('content_text', '')
+            
+            if not content:
+                logger.warning(f"Post {post_id} has no content to analyse.")
+                # Mark post as processed but with a warning
+                skipped_posts.append((post_id, "No content to analyse", None, post.get('platform')))
+                continue
+            
+            # Identify the language once; later runs reuse the stored value
+            language = post.get('language') or language_filter.detect(content)
+            if not language_filter.should_analyse(language):
+                skipped_posts.append((post_id, f"Unsupported language: {language}", language, post.get('platform')))
+                language_skipped_count += 1
+                continue
+            
+            pending_posts.append((post_id, post.get('platform'), content, language))
+        
+        # Analyse all contents with one model call per micro-batch, spread over the worker pool if there is one
+        try:
+            analyzer = inference_pool if inference_pool is not None else text_analyzer
+            batch_results = analyzer.analyze_batch([content for _, _, content, _ in pending_posts])
+        except Exception as e:
+            logger.error(f"Batch inference failed, analysing posts individually: {str(e)}")
+            batch_results = None
+        
+        for index, (post_id, post_source, content, language) in enumerate(pending_posts):
+            try:
+                if batch_results is not None:
+                    result = batch_results[index]
                 else:
-                    error_count += 1
-                
-                # Small delay to avoid overloading
-                time.sleep(0.1)
+                    result = text_analyzer.analyze_text(content)
+                result["language"] = language
+                sentiment_updates.append((post_id, result, post_source))
                 
             except Exception as e:
                 error_count += 1
-                logger.error(f"Error processing post {post.get('post_id', 'unknown')}: {str(e)}")
+                logger.error(f"Error processing post {post_id}: {str(e)}")
                 
                 # Mark the post as having failed analysis to prevent endless retries
-                try:
-                    db.mark_post_analysis_failed(post.get('post_id', 'unknown'), str(e))
-                except Exception as mark_error:
-                    logger.error(f"Error marking post as failed: {str(mark_error)}")
+                failed_posts.append((post_id, str(e), post_source))
+        
+        # Update posts with sentiment analysis results. Writes are scoped to the claim, so posts whose
+        # lease ran out and were claimed by another worker are left to that worker
+        for post_id, written in db.update_posts_sentiment_bulk(sentiment_updates, claim_id).items():
+            if written:
+                analysed_count += 1
+                processed_ids.append(post_id)
+            elif written is None:
+                lease_lost_count += 1
+            else:
+                error_count += 1
+        
+        try:
+            db.mark_posts_analysis_failed(failed_posts, claim_id)
+            db.mark_posts_analysis_skipped(skipped_posts, claim_id)
+        except Exception as mark_error:
+            logger.error(f"Error marking posts as failed or skipped: {str(mark_error)}")
+        
+        # Anything claimed but not written back goes back to the queue
+        lease_keeper.release(claim_id)
         
         # Get remaining counts
         remaining_counts = db.get_unanalysed_count()
@@ -139,12 +210,16 @@ def analyse_batch():
             "success": True,
             "processed": analysed_count,
             "errors": error_count,
+            "skipped_language": language_skipped_count,
+            "lease_lost": lease_lost_count,
             "remaining": remaining_counts,
-            "message": f"Processed {analysed_count} posts, with {error_count} errors. {remaining_counts['total']} posts remaining."
+            "message": f"Processed {analysed_count} posts, with {error_count} errors and {language_skipped_count} non-English posts skipped. {remaining_counts['total']} posts remaining."
         })
         
     except Exception as e:
         logger.error(f"Error in batch analysis: {str(e)}")
+        if claim_id is not None:
+            lease_keeper.release(claim_id)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -163,7 +238,7 @@ def analyse_by_id():
         
         logger.info(f"Analyzing post with ID: {post_id}" + (f" from source: {source}" if source else ""))
         
-        post, detected_source = db.find_post_by_id(post_id)
+        post, detected_source = db.find_post_by_id(post_id, source)
         if not post:
             return jsonify({"error": f"Post with ID {post_id} not found"}), 404
 
@@ -214,12 +289,25 @@ def extract_entities():
         return jsonify({"error": str(e)}), 500
     
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    try:
+        if text_analyzer.cache is None:
+            return jsonify({"enabled": False})
+        return jsonify({"enabled": True, **text_analyzer.cache.stats()})
+    except Exception as e:
+        logger.error(f"Error fetching cache stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/unanalysed-count', methods=['GET'])
 def get_unanalysed_count():
     try:
         # Get source filter from query parameter if provided
         source = request.args.get('source')
-        counts = db.get_unanalysed_count()
+        # ?refresh=true recounts the collections instead of reading the backlog counters
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        counts = db.get_unanalysed_count(refresh=refresh)
         
         if source:
             source = source.lower()
@@ -237,4 +325,6 @@ def get_unanalysed_count():
 if __name__ == '__main__':
     if not db.start_db_connection():
         logger.warning("Error When Connecting To MongoDB.")
-    app.run(host='0.0.0.0', port=5004, debug=True)
\ No newline at end of file
+    # The reloader re-imports this module in a child process, which would fork a second set of
+    # inference workers and orphan the first, so it stays off while a pool is running
+    app.run(host='0.0.0.0', port=5004, debug=True, use_reloader=inference_pool is None)
\ No newline at end of file
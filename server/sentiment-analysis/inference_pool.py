@@ -0,0 +1,175 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+def _worker_main(analyzer, tasks, results, num_threads):
+    """
+    Worker process loop. The analyzer was inherited from the parent through fork, so its
+    weights are shared copy-on-write rather than loaded again
+    """
+    torch.set_num_threads(num_threads)
+    # The parent owns the result cache, and nested spaCy pools would oversubscribe the cores
+    analyzer.cache = None
+    analyzer.spacy_processes = 1
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, cleaned_texts = task
+        try:
+            results.put((task_id, analyzer.analyze_cleaned_batch(cleaned_texts), None))
+        except Exception as e:
+            results.put((task_id, None, f"{type(e).__name__}: {str(e)}"))
+
+def configured_pool_shape():
+    """
+    The pool InferencePool.from_env starts under the current environment
+
+    Returns:
+        dict: {"workers", "threads_per_worker"}, or None when inference runs in the server process
+    """
+    workers = int(os.environ.get("SENTIMENT_POOL_WORKERS", 0))
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    threads_per_worker = int(os.environ.get("SENTIMENT_POOL_THREADS", 0)) or max(1, (os.cpu_count() or 1) // workers)
+    return {"workers": workers, "threads_per_worker": threads_per_worker}
+
+class InferencePool:
+    """Forked worker processes that share one loaded analyzer and score batches in parallel."""
+    def __init__(self, analyzer, workers=None, threads_per_worker=None, chunk_size=None, timeout=None):
+        """
+        Args:
+            analyzer (CombinedAnalyzer): Fully loaded analyzer to fork the workers from
+            workers (int): Worker processes. Defaults to the SENTIMENT_POOL_WORKERS
+                environment variable, then the number of cores
+            threads_per_worker (int): torch intra-op threads per worker. Defaults to the
+                SENTIMENT_POOL_THREADS environment variable, then cores divided by workers
+            chunk_size (int): Texts per task sent to a worker. Defaults to the
+                SENTIMENT_POOL_CHUNK_SIZE environment variable, then 32
+            timeout (float): Seconds to wait for a task before giving up on it. Defaults to the
+                SENTIMENT_POOL_TIMEOUT environment variable, then 300
+        """
+        cores = os.cpu_count() or 1
+        self.analyzer = analyzer
+        self.workers = workers or int(os.environ.get("SENTIMENT_POOL_WORKERS", 0)) or cores
+        self.threads_per_worker = threads_per_worker or int(os.environ.get("SENTIMENT_POOL_THREADS", 0)) \
+            or max(1, cores // self.workers)
+        self.chunk_size = chunk_size or int(os.environ.get("SENTIMENT_POOL_CHUNK_SIZE", 32))
+        self.timeout = timeout or float(os.environ.get("SENTIMENT_POOL_TIMEOUT", 300))
+
+        # Fork right after the model load: the children share its memory pages, and the
+        # parent has not yet run inference, so no torch thread pool is copied mid-use
+        context = multiprocessing.get_context("fork")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(target=_worker_main, args=(analyzer, self._tasks, self._results, self.threads_per_worker),
+                            daemon=True)
+            for _ in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._futures = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect, name="inference-pool-collector", daemon=True)
+        self._collector.start()
+        logger.info(f"Inference pool started {self.workers} workers with {self.threads_per_worker} torch threads each")
+
+    @classmethod
+    def from_env(cls, analyzer):
+        """
+        Build a pool if SENTIMENT_POOL_WORKERS is above 1
+
+        Returns:
+            InferencePool, or None to run inference in this process
+        """
+        if int(os.environ.get("SENTIMENT_POOL_WORKERS", 0)) <= 1:
+            return None
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logger.warning("Fork is not available on this platform, running inference in-process")
+            return None
+        return cls(analyzer)
+
+    def _collect(self):
+        """Resolve task futures as workers report back"""
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            task_id, results, error = message
+            with self._lock:
+                future = self._futures.pop(task_id, None)
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(f"Inference worker failed: {error}"))
+            else:
+                future.set_result(results)
+
+    def run_cleaned(self, cleaned_texts):
+        """
+        Analyse cleaned texts across the workers
+        Args:
+            cleaned_texts (list): Texts as returned by clean_text
+        Returns:
+            list: Results in input order, as from CombinedAnalyzer.analyze_cleaned_batch
+        Raises:
+            RuntimeError: If a worker failed on one of the texts
+            concurrent.futures.TimeoutError: If a worker did not answer within the timeout
+        """
+        futures = {}
+        for start in range(0, len(cleaned_texts), self.chunk_size):
+            future = Future()
+            with self._lock:
+                task_id = next(self._task_ids)
+                self._futures[task_id] = future
+            self._tasks.put((task_id, cleaned_texts[start:start + self.chunk_size]))
+            futures[task_id] = future
+
+        results = []
+        try:
+            for future in futures.values():
+                # A worker that died mid-task never reports back, so do not wait forever
+                results.extend(future.result(timeout=self.timeout))
+        finally:
+            with self._lock:
+                for task_id in futures:
+                    self._futures.pop(task_id, None)
+        return results
+
+    def analyze_batch(self, texts):
+        """
+        Analyze a list of texts on the workers. Cleaning and the result cache stay in this process
+        Returns:
+            list: One result per text, in the same format and order as CombinedAnalyzer.analyze_batch
+        """
+        return self.analyzer.analyze_batch(texts, runner=self.run_cleaned)
+
+    def stats(self):
+        """Return the pool size and the number of workers still alive"""
+        return {
+            "workers": self.workers,
+            "alive_workers": sum(process.is_alive() for process in self._processes),
+            "threads_per_worker": self.threads_per_worker,
+            "chunk_size": self.chunk_size,
+            "pending_tasks": len(self._futures)
+        }
+
+    def stop(self):
+        """Shut the workers and the collector thread down"""
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+        self._results.put(None)
+        self._collector.join(timeout=5)
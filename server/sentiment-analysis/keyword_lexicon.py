@@ -0,0 +1,90 @@
+import re
+
+import numpy as np
+from scipy import sparse
+
+WORD_CHAR = re.compile(r'\w')
+
+class KeywordLexicon:
+    """Sentiment keyword lexicon compiled once into a single word-bounded pattern."""
+    # Bump when matching semantics change so cached results are invalidated
+    VERSION = 2
+
+    def __init__(self, positive_keywords, negative_keywords):
+        """
+        Args:
+            positive_keywords (dict): keyword -> adjustment added to the positive score
+            negative_keywords (dict): keyword -> adjustment whose magnitude is subtracted
+        """
+        positive = {}
+        for keyword, adjustment in positive_keywords.items():
+            positive.setdefault(keyword.lower(), adjustment)
+        negative = {}
+        for keyword, adjustment in negative_keywords.items():
+            negative.setdefault(keyword.lower(), -abs(adjustment))
+
+        self.keywords = sorted(set(positive) | set(negative))
+        self.columns = {keyword: column for column, keyword in enumerate(self.keywords)}
+        self.weights = np.array(
+            [positive.get(keyword, 0.0) + negative.get(keyword, 0.0) for keyword in self.keywords],
+            dtype=np.float64
+        )
+
+        # The alternation finds the longest keyword starting at each word start. Shorter
+        # keywords that start at the same place and end on a word boundary inside it
+        # ("abundant" in "abundant harvest") are credited through implied_columns
+        self.implied_columns = []
+        for keyword in self.keywords:
+            columns = [self.columns[keyword]]
+            for index, char in enumerate(keyword):
+                if not WORD_CHAR.match(char) and keyword[:index] in self.columns:
+                    columns.append(self.columns[keyword[:index]])
+            self.implied_columns.append(columns)
+
+        self.pattern = None
+        if self.keywords:
+            alternation = "|".join(re.escape(keyword) for keyword in sorted(self.keywords, key=len, reverse=True))
+            self.pattern = re.compile(r'(?<!\w)(?=(' + alternation + r')(?!\w))')
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def hits(self, text):
+        """
+        Find every keyword present in the text as a whole word or phrase
+
+        Returns:
+            set: Column indices of the matched keywords
+        """
+        columns = set()
+        if self.pattern is None or not text:
+            return columns
+        for match in self.pattern.finditer(text.lower()):
+            columns.update(self.implied_columns[self.columns[match.group(1)]])
+        return columns
+
+    def adjustment(self, text):
+        """Total score adjustment for one text, each keyword counted once"""
+        return float(sum(self.weights[column] for column in self.hits(text)))
+
+    def hit_matrix(self, texts):
+        """
+        Build a sparse binary texts x keywords matrix of keyword hits
+
+        Returns:
+            scipy.sparse.csr_matrix: shape (len(texts), len(self))
+        """
+        rows = []
+        columns = []
+        for row, text in enumerate(texts):
+            text_columns = self.hits(text)
+            rows.extend([row] * len(text_columns))
+            columns.extend(text_columns)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, columns)),
+            shape=(len(texts), len(self.keywords))
+        )
+
+    def adjustments(self, texts):
+        """Score adjustments for a batch of texts as one sparse matrix-vector product"""
+        return self.hit_matrix(texts) @ self.weights
@@ -0,0 +1,62 @@
+import logging
+import os
+import re
+
+try:
+    from langid.langid import LanguageIdentifier, model as langid_model
+except ImportError:  # langid is optional, without it every post is analysed
+    LanguageIdentifier = None
+
+logger = logging.getLogger(__name__)
+
+# Language code stored for posts too short or too mixed to identify reliably; they are analysed
+UNDETERMINED = "und"
+
+# URLs, mentions and hashtags say nothing about the language of a post
+NON_LANGUAGE_PATTERN = re.compile(r'https?://\S+|www\.\S+|[@#]\w+')
+
+class LanguageFilter:
+    """Offline character n-gram language identification in front of the English-only models."""
+    def __init__(self, allowed_languages=None, min_confidence=None, min_letters=None):
+        """
+        Args:
+            allowed_languages (list): ISO 639-1 codes to analyse. Defaults to the comma-separated
+                SENTIMENT_LANGUAGES environment variable, then "en"
+            min_confidence (float): Probability below which a post counts as undetermined.
+                Defaults to the SENTIMENT_LANGUAGE_MIN_CONFIDENCE environment variable, then 0.9
+            min_letters (int): Posts with fewer letters count as undetermined. Defaults to the
+                SENTIMENT_LANGUAGE_MIN_LETTERS environment variable, then 20
+        """
+        if allowed_languages is None:
+            allowed_languages = os.environ.get("SENTIMENT_LANGUAGES", "en").split(",")
+        self.allowed_languages = {language.strip().lower() for language in allowed_languages if language.strip()}
+        self.min_confidence = min_confidence if min_confidence is not None else \
+            float(os.environ.get("SENTIMENT_LANGUAGE_MIN_CONFIDENCE", 0.9))
+        self.min_letters = min_letters if min_letters is not None else \
+            int(os.environ.get("SENTIMENT_LANGUAGE_MIN_LETTERS", 20))
+
+        self.identifier = None
+        if LanguageIdentifier is None:
+            logger.warning("langid is not installed, posts will not be filtered by language")
+        else:
+            self.identifier = LanguageIdentifier.from_modelstring(langid_model, norm_probs=True)
+
+    def detect(self, text):
+        """
+        Identify the language of a post
+
+        Returns:
+            str: ISO 639-1 code, UNDETERMINED if the post is too short or the model is unsure,
+                or None if language identification is unavailable
+        """
+        if self.identifier is None:
+            return None
+        stripped = NON_LANGUAGE_PATTERN.sub(" ", text or "")
+        if sum(char.isalpha() for char in stripped) < self.min_letters:
+            return UNDETERMINED
+        language, confidence = self.identifier.classify(stripped)
+        return language if confidence >= self.min_confidence else UNDETERMINED
+
+    def should_analyse(self, language):
+        """Whether a post in this language goes through the models; unknown languages are analysed"""
+        return language in (None, UNDETERMINED) or language in self.allowed_languages
@@ -0,0 +1,77 @@
+import logging
+import os
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+class LeaseKeeper:
+    """Renew the leases of posts this worker is analysing and reap leases abandoned by others."""
+    def __init__(self, db, worker_id=None, interval=None):
+        """
+        Start the background renewal thread
+
+        Args:
+            db (db_connection): Database connection providing the claim API
+            worker_id (str): Identifies this worker in claims. Defaults to the SENTIMENT_WORKER_ID
+                environment variable, then host name and process ID
+            interval (float): Seconds between renewals. Defaults to a third of the lease length,
+                so a lease survives two missed renewals
+        """
+        self.db = db
+        self.worker_id = worker_id or os.environ.get("SENTIMENT_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+        self.interval = interval or max(1.0, db.lease_seconds / 3)
+        self._claims = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+        self._worker.start()
+        logger.info(f"Lease keeper started for worker {self.worker_id} (renewing every {self.interval:.0f}s)")
+
+    def claim(self, limit, source=None):
+        """
+        Claim unanalysed posts and keep their leases alive until release is called
+
+        Returns:
+            tuple: (claim_id, claimed posts), as from db_connection.claim_posts
+        """
+        claim_id, posts = self.db.claim_posts(self.worker_id, limit, source)
+        if posts:
+            with self._lock:
+                self._claims.add(claim_id)
+        return claim_id, posts
+
+    def release(self, claim_id):
+        """Stop renewing a claim and return any of its posts that were not written back to the queue"""
+        with self._lock:
+            self._claims.discard(claim_id)
+        try:
+            self.db.release_claims([claim_id])
+        except Exception as e:
+            # The lease runs out on its own and the reaper returns the posts
+            logger.error(f"Error releasing claim {claim_id}: {str(e)}")
+
+    def renew(self):
+        """Renew this worker's claims and return expired leases to the queue"""
+        with self._lock:
+            claim_ids = list(self._claims)
+        if claim_ids:
+            self.db.renew_leases(claim_ids)
+        self.db.release_expired_leases()
+
+    def stats(self):
+        """Return the worker ID and the number of claims being renewed"""
+        with self._lock:
+            return {"worker_id": self.worker_id, "active_claims": len(self._claims)}
+
+    def stop(self):
+        """Stop the renewal thread"""
+        self._stopped.set()
+        self._worker.join(timeout=5)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.renew()
+            except Exception as e:
+                logger.error(f"Error renewing leases: {str(e)}")
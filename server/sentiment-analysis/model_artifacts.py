@@ -0,0 +1,117 @@
+"""
+Pinned local copies of the models the analyzer needs, so it can start without network access.
+
+Populate the artifact directory once, from the sentiment-analysis directory:
+    python model_artifacts.py --fetch
+then point the analyzer at it with SENTIMENT_ARTIFACT_DIR (the default location is used automatically
+when it holds a manifest).
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "artifacts")
+MANIFEST_FILE = "manifest.json"
+SENTIMENT_MODEL_DIR = "sentiment-model"
+SPACY_MODEL_DIR = "spacy"
+
+DEFAULT_MODEL_ID = "group21/agricultural-sentiment-model"
+DEFAULT_SPACY_MODEL = "en_core_web_sm"
+
+def resolve_artifact_dir(artifact_dir=None):
+    """
+    Pick the artifact directory to load from
+
+    Args:
+        artifact_dir (str): Explicit directory, overrides the environment
+    Returns:
+        str: The directory, or None to load from the Hugging Face Hub and installed spaCy packages
+    """
+    artifact_dir = artifact_dir or os.environ.get("SENTIMENT_ARTIFACT_DIR")
+    if artifact_dir:
+        return artifact_dir
+    if os.path.exists(os.path.join(DEFAULT_ARTIFACT_DIR, MANIFEST_FILE)):
+        return DEFAULT_ARTIFACT_DIR
+    return None
+
+def load_manifest(artifact_dir):
+    """
+    Read the manifest written by fetch_artifacts
+
+    Raises:
+        FileNotFoundError: If the directory was never populated
+    """
+    with open(os.path.join(artifact_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def sentiment_model_path(artifact_dir):
+    """Directory holding the safetensors weights and tokenizer files"""
+    return os.path.join(artifact_dir, SENTIMENT_MODEL_DIR)
+
+def spacy_model_path(artifact_dir, spacy_model=DEFAULT_SPACY_MODEL):
+    """Directory holding the serialized spaCy pipeline"""
+    return os.path.join(artifact_dir, SPACY_MODEL_DIR, spacy_model)
+
+def fetch_artifacts(artifact_dir=DEFAULT_ARTIFACT_DIR, model_id=DEFAULT_MODEL_ID, spacy_model=DEFAULT_SPACY_MODEL):
+    """
+    Download the sentiment model, its tokenizer and the spaCy pipeline into artifact_dir
+
+    The model is saved as safetensors so offline loads memory-map the weights instead of
+    unpickling them.
+
+    Args:
+        artifact_dir (str): Destination directory
+        model_id (str): Hugging Face Hub ID of the sentiment model
+        spacy_model (str): spaCy package to serialize
+    Returns:
+        dict: The manifest written next to the artifacts
+    """
+    import spacy
+    import spacy.util
+    from spacy.cli import download
+    from transformers import RobertaTokenizerFast, RobertaForSequenceClassification
+
+    os.makedirs(artifact_dir, exist_ok=True)
+
+    logger.info(f"Fetching {model_id}")
+    tokenizer = RobertaTokenizerFast.from_pretrained(model_id)
+    model = RobertaForSequenceClassification.from_pretrained(model_id)
+    model.save_pretrained(sentiment_model_path(artifact_dir), safe_serialization=True)
+    tokenizer.save_pretrained(sentiment_model_path(artifact_dir))
+
+    if not spacy.util.is_package(spacy_model):
+        logger.info(f"Downloading {spacy_model}")
+        download(spacy_model)
+    nlp = spacy.load(spacy_model)
+    nlp.to_disk(spacy_model_path(artifact_dir, spacy_model))
+
+    manifest = {
+        "model_id": model_id,
+        "model_revision": getattr(model.config, "_commit_hash", None),
+        "spacy_model": spacy_model,
+        "spacy_model_version": nlp.meta.get("version"),
+        "spacy_version": spacy.__version__,
+        "fetched_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+    }
+    with open(os.path.join(artifact_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Artifacts written to {artifact_dir}")
+    return manifest
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Populate the offline model artifact directory")
+    parser.add_argument("--fetch", action="store_true", help="Download the models and write them to the artifact directory")
+    parser.add_argument("--dir", default=os.environ.get("SENTIMENT_ARTIFACT_DIR") or DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--model-id", default=DEFAULT_MODEL_ID)
+    parser.add_argument("--spacy-model", default=DEFAULT_SPACY_MODEL)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.fetch:
+        print(json.dumps(fetch_artifacts(args.dir, args.model_id, args.spacy_model), indent=2))
+    else:
+        parser.print_help()
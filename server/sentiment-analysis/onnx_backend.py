@@ -0,0 +1,151 @@
+"""
+ONNX Runtime backend for the RoBERTa sentiment classifier.
+
+Export the model once, from the sentiment-analysis directory:
+    python onnx_backend.py --export
+"""
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import torch
+
+try:
+    import onnxruntime as ort
+except ImportError:  # onnxruntime is optional, the analyzer falls back to torch
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ONNX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "models", "onnx", "agricultural-sentiment-model.onnx")
+
+class _LogitsOnly(torch.nn.Module):
+    """Wrap the classifier so the exported graph has a single logits output"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+def export_onnx_model(model, tokenizer, model_id, path=DEFAULT_ONNX_PATH, opset=14):
+    """
+    Export an fp32 RoBERTa classifier to ONNX with dynamic batch and sequence axes
+
+    Args:
+        model: RobertaForSequenceClassification in fp32
+        tokenizer: The model's tokenizer, used to build example inputs
+        model_id (str): Model ID recorded next to the graph so stale exports are not served
+        path (str): Where to write the .onnx file
+        opset (int): ONNX opset version
+
+    Returns:
+        str: Path of the exported graph
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model.eval()
+    example = tokenizer(["wheat rust outbreak", "healthy barley"], return_tensors="pt", padding=True)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model),
+            (example["input_ids"], example["attention_mask"]),
+            path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"}
+            },
+            opset_version=opset
+        )
+
+    with open(path + ".json", 'w', encoding='utf-8') as f:
+        json.dump({"model_id": model_id, "opset": opset}, f, indent=2)
+
+    logger.info(f"Exported {model_id} to ONNX at {path}")
+    return path
+
+class OnnxSentimentBackend:
+    """Runs the exported classifier through ONNX Runtime's CPU execution provider."""
+    def __init__(self, path=DEFAULT_ONNX_PATH, intra_op_threads=None):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def predict_logits(self, input_ids, attention_mask):
+        """
+        Run one forward pass
+
+        Args:
+            input_ids (np.ndarray): Token IDs, shape (batch, sequence)
+            attention_mask (np.ndarray): Attention mask, shape (batch, sequence)
+
+        Returns:
+            np.ndarray: Logits, shape (batch, 3)
+        """
+        return self.session.run(["logits"], {
+            "input_ids": input_ids.astype(np.int64),
+            "attention_mask": attention_mask.astype(np.int64)
+        })[0]
+
+def load_onnx_backend(model_id, path=DEFAULT_ONNX_PATH, intra_op_threads=None):
+    """
+    Load the exported graph for model_id
+
+    Returns:
+        OnnxSentimentBackend, or None if onnxruntime or a matching export is unavailable
+    """
+    if ort is None:
+        logger.warning("onnxruntime is not installed, using the torch backend")
+        return None
+    if not os.path.exists(path):
+        logger.warning(f"No exported ONNX graph at {path}, using the torch backend. Run 'python onnx_backend.py --export' to create it.")
+        return None
+
+    try:
+        with open(path + ".json", 'r', encoding='utf-8') as f:
+            exported_model_id = json.load(f).get("model_id")
+    except (FileNotFoundError, json.JSONDecodeError):
+        exported_model_id = None
+    if exported_model_id != model_id:
+        logger.warning(f"ONNX graph at {path} was exported from {exported_model_id}, not {model_id}. Using the torch backend.")
+        return None
+
+    try:
+        backend = OnnxSentimentBackend(path, intra_op_threads)
+        logger.info(f"Loaded ONNX Runtime backend from {path}")
+        return backend
+    except Exception as e:
+        logger.error(f"Error loading ONNX graph from {path}: {str(e)}. Using the torch backend.")
+        return None
+
+if __name__ == '__main__':
+    from combined_analyzer import CombinedAnalyzer, MODEL_TIERS
+    from sentiment_cache import SentimentCache
+
+    parser = argparse.ArgumentParser(description="Export the sentiment classifier to ONNX")
+    parser.add_argument("--export", action="store_true", help="Export the model and cache the graph on disk")
+    parser.add_argument("--model-tier", choices=MODEL_TIERS, default=None,
+                        help="Defaults to SENTIMENT_MODEL_TIER, as the analyzer does")
+    parser.add_argument("--artifact-dir", default=None,
+                        help="Defaults to SENTIMENT_ARTIFACT_DIR, as the analyzer does")
+    parser.add_argument("--path", default=None, help="Defaults to SENTIMENT_ONNX_PATH, then models/onnx/")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.export:
+        # Resolve the model exactly as the server will, so the recorded model_id matches at load time
+        analyzer = CombinedAnalyzer(precision="fp32", backend="torch", cache=SentimentCache(max_memory_entries=1),
+                                    artifact_dir=args.artifact_dir, model_tier=args.model_tier)
+        export_onnx_model(analyzer.load_fp32_model(), analyzer.roberta_tokenizer, analyzer.model_id,
+                          args.path or os.environ.get("SENTIMENT_ONNX_PATH", DEFAULT_ONNX_PATH))
+    else:
+        parser.print_help()
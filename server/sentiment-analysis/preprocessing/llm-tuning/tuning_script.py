@@ -1,4 +1,6 @@
 import os
+import sys
+import argparse
 import json
 import torch
 import numpy as np
@@ -17,6 +19,17 @@ import evaluate
 import shutil
 from huggingface_hub import login
 
+parser = argparse.ArgumentParser(description="Fine-tune the agricultural sentiment model, or distil it into a smaller student")
+parser.add_argument("--distill", action="store_true",
+                    help="Train a smaller student on the fine-tuned model's soft labels and save it locally instead of fine-tuning")
+parser.add_argument("--student-base", default="distilroberta-base", help="Pre-trained model the student starts from")
+parser.add_argument("--student-path", default="server/sentiment-analysis/models/student", help="Where the student is saved")
+parser.add_argument("--unlabeled-posts", type=int, default=2000,
+                    help="Posts per source exported from MongoDB as unlabeled distillation data (0 to skip)")
+parser.add_argument("--temperature", type=float, default=2.0, help="Softmax temperature of the soft labels")
+parser.add_argument("--alpha", type=float, default=0.5, help="Weight of the soft-label loss against the gold-label loss")
+args = parser.parse_args()
+
 # Login to Hugging Face Hub - add your token here
 login(token="your_actual_token_here")  # Replace with your actual token
 
@@ -44,16 +57,23 @@ try:
     tokeniser = RobertaTokenizerFast.from_pretrained(model_name)
     logger.info(f"Found existing model on Hub: {model_name}, will continue training")
     is_continuing_training = True
+    base_model_id = model_name
 except Exception as e:
     logger.info(f"No existing model found on Hub ({str(e)}), starting with pre-trained model")
     model = RobertaForSequenceClassification.from_pretrained("cardiffnlp/twitter-roberta-base-sentiment")
     tokeniser = RobertaTokenizerFast.from_pretrained("cardiffnlp/twitter-roberta-base-sentiment")
     is_continuing_training = False
+    base_model_id = "cardiffnlp/twitter-roberta-base-sentiment"
 
 # Load the evaluation metric
 metric = evaluate.load("accuracy")
 data_collator = DataCollatorWithPadding(tokenizer=tokeniser)
 
+def compute_metrics(eval_pred):
+    logits, labels = eval_pred
+    predictions = np.argmax(logits, axis=1)
+    return metric.compute(predictions=predictions, references=labels)
+
 def load_training_data(file):
     """Load the training data from a JSON file."""
     logger.info(f"Attempting to load training data from {file}")
@@ -97,6 +117,149 @@ except FileNotFoundError:
 train_texts, val_texts, train_labels, val_labels = train_test_split(texts, labels, test_size=0.2, random_state=42)
 logger.info(f"Split data: {len(train_texts)} training samples, {len(val_texts)} validation samples")
 
+def model_logits(classifier, texts, batch_size=64):
+    """Score texts with a classifier, returning its raw logits"""
+    classifier.eval()
+    logits = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            encoded = tokeniser(texts[start:start + batch_size], truncation=True, padding=True, max_length=128, return_tensors="pt")
+            encoded = {key: value.to(classifier.device) for key, value in encoded.items()}
+            logits.extend(classifier(**encoded).logits.cpu().tolist())
+    return logits
+
+def export_unlabeled_posts(limit):
+    """Export post texts from MongoDB to use as unlabeled distillation data"""
+    if limit <= 0:
+        return []
+    sys.path.append("server/sentiment-analysis")
+    from db_connection import db_connection
+    posts = db_connection().get_post_texts(limit)
+    if not posts:
+        logger.warning("No posts exported from MongoDB, distilling on the training data only")
+    return posts
+
+class DistillationTrainer(Trainer):
+    """Trainer whose loss mixes KL divergence to the teacher's softened outputs with cross-entropy on gold labels"""
+    def __init__(self, *trainer_args, temperature=2.0, alpha=0.5, **trainer_kwargs):
+        super().__init__(*trainer_args, **trainer_kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        outputs = model(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+        student_logits = outputs.logits
+        soft_loss = torch.nn.functional.kl_div(
+            torch.nn.functional.log_softmax(student_logits / self.temperature, dim=-1),
+            torch.nn.functional.softmax(inputs["teacher_logits"] / self.temperature, dim=-1),
+            reduction="batchmean"
+        ) * self.temperature ** 2
+
+        # Exported posts have no gold label (-100) and only learn from the teacher
+        labelled = inputs["labels"] >= 0
+        if labelled.any():
+            hard_loss = torch.nn.functional.cross_entropy(student_logits[labelled], inputs["labels"][labelled])
+            loss = self.alpha * soft_loss + (1 - self.alpha) * hard_loss
+        else:
+            loss = soft_loss
+        return (loss, outputs) if return_outputs else loss
+
+def distill_student():
+    """Train a smaller student on the teacher's soft labels and save it for the analyzer's fast tier"""
+    unlabeled_texts = export_unlabeled_posts(args.unlabeled_posts)
+    distill_texts = train_texts + unlabeled_texts
+    distill_labels = train_labels + [-100] * len(unlabeled_texts)
+
+    logger.info(f"Computing teacher soft labels for {len(distill_texts)} training and {len(val_texts)} validation texts")
+    distill_dataset = ds.from_dict({"text": distill_texts, "label": distill_labels,
+                                    "teacher_logits": model_logits(model, distill_texts)})
+    distill_val_dataset = ds.from_dict({"text": val_texts, "label": val_labels,
+                                        "teacher_logits": model_logits(model, val_texts)})
+
+    def tokenize_for_distillation(examples):
+        return tokeniser(examples["text"], truncation=True, max_length=128)
+
+    tokenized_distill = distill_dataset.map(tokenize_for_distillation, batched=True, remove_columns=["text"])
+    tokenized_distill_val = distill_val_dataset.map(tokenize_for_distillation, batched=True, remove_columns=["text"])
+
+    # The student shares the teacher's tokenizer and label mapping
+    student = RobertaForSequenceClassification.from_pretrained(
+        args.student_base,
+        num_labels=model.config.num_labels,
+        id2label=model.config.id2label,
+        label2id=model.config.label2id
+    )
+    logger.info(f"Student {args.student_base} has {student.config.num_hidden_layers} layers, "
+                f"teacher {base_model_id} has {model.config.num_hidden_layers}")
+
+    checkpoint_path = args.student_path + "-checkpoints"
+    os.makedirs(checkpoint_path, exist_ok=True)
+    distill_args = TrainingArguments(
+        output_dir=checkpoint_path,
+        learning_rate=5e-5,
+        per_device_train_batch_size=16,
+        per_device_eval_batch_size=16,
+        num_train_epochs=3,
+        weight_decay=0.01,
+        evaluation_strategy="epoch",
+        save_strategy="epoch",
+        load_best_model_at_end=True,
+        remove_unused_columns=False,  # Keep teacher_logits for the loss
+        report_to="none",
+    )
+    distill_trainer = DistillationTrainer(
+        model=student,
+        args=distill_args,
+        train_dataset=tokenized_distill,
+        eval_dataset=tokenized_distill_val,
+        tokenizer=tokeniser,
+        data_collator=data_collator,
+        compute_metrics=compute_metrics,
+        temperature=args.temperature,
+        alpha=args.alpha,
+    )
+
+    logger.info("Starting distillation...")
+    distill_result = distill_trainer.train()
+    final_eval = distill_trainer.evaluate()
+    logger.info(f"Student evaluation metrics: {final_eval}")
+
+    student = distill_trainer.model
+    teacher_predictions = np.argmax(np.array(tokenized_distill_val["teacher_logits"]), axis=1)
+    student_predictions = np.argmax(np.array(model_logits(student, val_texts)), axis=1)
+    teacher_agreement = float(np.mean(teacher_predictions == student_predictions))
+    logger.info(f"Student agrees with the teacher on {teacher_agreement:.2%} of validation texts")
+
+    # Save as safetensors next to a description the analyzer reads to identify the student
+    trained_at = datetime.datetime.now()
+    student.save_pretrained(args.student_path, safe_serialization=True)
+    tokeniser.save_pretrained(args.student_path)
+    distillation_info = {
+        "model_id": f"{model_name}-student-{trained_at.strftime('%Y%m%d%H%M%S')}",
+        "teacher_model_id": base_model_id,
+        "student_base": args.student_base,
+        "layers": student.config.num_hidden_layers,
+        "temperature": args.temperature,
+        "alpha": args.alpha,
+        "labelled_samples": len(train_texts),
+        "unlabeled_samples": len(unlabeled_texts),
+        "training_metrics": distill_result.metrics,
+        "eval_metrics": final_eval,
+        "teacher_agreement": teacher_agreement,
+        "trained_at": trained_at.isoformat()
+    }
+    with open(os.path.join(args.student_path, "distillation.json"), 'w') as f:
+        json.dump(distillation_info, f, indent=2)
+
+    if os.path.exists(checkpoint_path):
+        logger.info(f"Cleaning up checkpoint directory: {checkpoint_path}")
+        shutil.rmtree(checkpoint_path)
+    logger.info(f"Student saved to {args.student_path}, serve it with SENTIMENT_MODEL_TIER=fast")
+
+if args.distill:
+    distill_student()
+    sys.exit(0)
+
 # Create datasets
 train_dataset = ds.from_dict({"text": train_texts, "label": train_labels}) # Training dataset
 val_dataset = ds.from_dict({"text": val_texts, "label": val_labels}) # Validation dataset
@@ -111,11 +274,6 @@ tokenized_train = train_dataset.map(tokenize_function, batched=True)
 tokenized_val = val_dataset.map(tokenize_function, batched=True)
 logger.info("Tokenization complete")
 
-def compute_metrics(eval_pred):
-    logits, labels = eval_pred
-    predictions = np.argmax(logits, axis=1)
-    return metric.compute(predictions=predictions, references=labels)
-
 # Define the training configuration, learning rate will differ if continuing training 
 learning_rate = 2e-5 if is_continuing_training else 5e-5
 epochs = 2 if is_continuing_training else 3  # Fewer epochs for continued training
@@ -0,0 +1,139 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class RequestBatcher:
+    """Coalesce concurrent single-text requests into batched analyzer calls."""
+    def __init__(self, analyzer, max_wait_ms=None, max_tokens=None, max_batch_size=None):
+        """
+        Start the background batching thread
+
+        Args:
+            analyzer: Object providing analyze_batch(texts), e.g. CombinedAnalyzer
+            max_wait_ms (float): How long to wait for more requests after the first one arrives.
+                Defaults to SENTIMENT_BATCH_MAX_WAIT_MS or 10
+            max_tokens (int): Approximate token budget per batch.
+                Defaults to SENTIMENT_BATCH_MAX_TOKENS or 4096
+            max_batch_size (int): Maximum number of requests per batch.
+                Defaults to SENTIMENT_BATCH_MAX_SIZE, then the analyzer's (possibly tuned) batch_size, then 64
+        """
+        if max_wait_ms is None:
+            max_wait_ms = float(os.environ.get("SENTIMENT_BATCH_MAX_WAIT_MS", 10))
+        if max_tokens is None:
+            max_tokens = int(os.environ.get("SENTIMENT_BATCH_MAX_TOKENS", 4096))
+        if max_batch_size is None:
+            max_batch_size = int(os.environ.get("SENTIMENT_BATCH_MAX_SIZE", 0)) or getattr(analyzer, "batch_size", None) or 64
+
+        self.analyzer = analyzer
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.batch_count = 0
+        self.request_count = 0
+
+        self._queue = queue.Queue()
+        self._carry_over = None
+        self._worker = threading.Thread(target=self._run, name="request-batcher", daemon=True)
+        self._worker.start()
+        logger.info(f"Request batcher started (max_wait={max_wait_ms}ms, max_tokens={max_tokens}, max_batch_size={max_batch_size})")
+
+    @staticmethod
+    def estimate_tokens(text):
+        """Cheap RoBERTa token estimate (about four characters per BPE token, capped at the model limit)"""
+        return min(512, len(text or "") // 4 + 2)
+
+    def submit(self, text):
+        """
+        Queue a text for analysis
+
+        Args:
+            text (str): The text to analyse
+
+        Returns:
+            Future: Resolves to the analyze_text style result for this text
+        """
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def analyze_text(self, text, timeout=None):
+        """Analyse a single text through the batcher, blocking until its result is ready"""
+        return self.submit(text).result(timeout=timeout)
+
+    def stats(self):
+        """Return batching statistics"""
+        return {
+            "batches": self.batch_count,
+            "requests": self.request_count,
+            "average_batch_size": round(self.request_count / self.batch_count, 2) if self.batch_count else 0.0
+        }
+
+    def stop(self):
+        """Stop the batching thread once queued requests are processed"""
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the wait or token budget runs out"""
+        if self._carry_over is not None:
+            first, self._carry_over = self._carry_over, None
+        else:
+            first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        tokens = self.estimate_tokens(first[0])
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size and tokens < self.max_tokens:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    item = self._queue.get(timeout=timeout)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                # Finish this batch first, then shut down
+                self._queue.put(None)
+                break
+
+            item_tokens = self.estimate_tokens(item[0])
+            if tokens + item_tokens > self.max_tokens:
+                # Keep it for the next batch rather than exceed the budget
+                self._carry_over = item
+                break
+
+            batch.append(item)
+            tokens += item_tokens
+
+        return batch
+
+    def _run(self):
+        """Worker loop: run each collected batch through the analyzer and resolve its futures"""
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            texts = [text for text, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.analyzer.analyze_batch(texts)
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Batched analysis of {len(texts)} requests failed: {str(e)}")
+                for future in futures:
+                    future.set_exception(e)
+
+            self.batch_count += 1
+            self.request_count += len(batch)
@@ -0,0 +1,69 @@
+"""
+Re-score stored posts after a change to preprocessing/roberta_sentiment_keywords.json.
+
+Posts keep their raw model probabilities in sentiment_raw, so only the keyword refinement,
+window combination and labelling are re-applied; the model is never loaded.
+
+Run from the sentiment-analysis directory:
+    python rescore_sentiment.py [--source Reddit] [--batch-size 5000] [--dry-run]
+"""
+import argparse
+import datetime
+import json
+import logging
+
+from combined_analyzer import CombinedAnalyzer
+from db_connection import db_connection
+
+logger = logging.getLogger(__name__)
+
+def rescore_posts(db, analyzer, batch_size=5000, source=None, dry_run=False):
+    """
+    Re-score every post refined with an older lexicon
+
+    Args:
+        db (db_connection): Database connection
+        analyzer (CombinedAnalyzer): Analyzer with the current lexicon, e.g. CombinedAnalyzer.for_rescoring()
+        batch_size (int): Posts re-scored and written per batch
+        source (str): Optional source filter ('Twitter', 'Reddit' or 'Bluesky')
+        dry_run (bool): Count the label changes without writing them
+    Returns:
+        dict: Posts re-scored, labels changed and posts written
+    """
+    start_time = datetime.datetime.now()
+    rescored = changed = written = 0
+    for post_source, posts in db.iter_posts_to_rescore(analyzer.keywords_version, batch_size, source):
+        sentiments = analyzer.rescore_sentiment(
+            [post.get("processed_text") or "" for post in posts],
+            [post["sentiment_raw"] for post in posts]
+        )
+        rescored += len(posts)
+        changed += sum(
+            (post.get("sentiment") or {}).get("sentiment") != sentiment["sentiment"]
+            for post, sentiment in zip(posts, sentiments)
+        )
+        if not dry_run:
+            written += db.update_rescored_sentiment(
+                post_source, [(post["_id"], sentiment) for post, sentiment in zip(posts, sentiments)],
+                analyzer.keywords_version
+            )
+        logger.info(f"Re-scored {rescored} posts so far")
+
+    return {
+        "keywords_version": analyzer.keywords_version,
+        "rescored": rescored,
+        "labels_changed": changed,
+        "written": written,
+        "seconds": round((datetime.datetime.now() - start_time).total_seconds(), 2)
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-score stored sentiment under the current keyword lexicon")
+    parser.add_argument("--source", choices=["Twitter", "Reddit", "Bluesky"], default=None)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="Report label changes without writing them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = rescore_posts(db_connection(), CombinedAnalyzer.for_rescoring(), args.batch_size, args.source, args.dry_run)
+    print(json.dumps(report, indent=2))
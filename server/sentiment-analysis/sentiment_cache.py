@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "sentiment_cache.db")
+
+class SentimentCache:
+    """Two-tier cache of analysis results: an in-memory LRU in front of an SQLite table."""
+    def __init__(self, max_memory_entries=10000, db_path=None, max_disk_entries=500000):
+        """
+        Args:
+            max_memory_entries (int): Size bound of the in-memory LRU tier
+            db_path (str): SQLite file for the persistent tier, or None for memory only
+            max_disk_entries (int): Size bound of the persistent tier
+        """
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.db_path = db_path
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._puts_since_trim = 0
+        # Trimming scans the table, so only do it every so many writes
+        self._trim_interval = max(1, min(500, max_disk_entries // 10))
+
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._connection = sqlite3.connect(db_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sentiment_cache ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS sentiment_cache_last_access ON sentiment_cache (last_access)"
+            )
+            self._connection.commit()
+            self._trim_disk()
+            logger.info(f"Sentiment cache persistent tier at {db_path}")
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the cache from SENTIMENT_CACHE_SIZE, SENTIMENT_CACHE_PATH and SENTIMENT_CACHE_DISK_SIZE
+
+        Returns:
+            SentimentCache, or None if SENTIMENT_CACHE_SIZE is 0
+        """
+        max_memory_entries = int(os.environ.get("SENTIMENT_CACHE_SIZE", 10000))
+        if max_memory_entries <= 0:
+            return None
+        db_path = os.environ.get("SENTIMENT_CACHE_PATH", DEFAULT_CACHE_PATH) or None
+        max_disk_entries = int(os.environ.get("SENTIMENT_CACHE_DISK_SIZE", 500000))
+        return cls(max_memory_entries, db_path, max_disk_entries)
+
+    @staticmethod
+    def make_key(cleaned_text, model_version, keywords_version):
+        """Hash the cleaned text together with the model and lexicon versions"""
+        digest = hashlib.sha256()
+        for part in (model_version, keywords_version, cleaned_text):
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b"\x1f")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Look a result up in memory, then on disk
+
+        Returns:
+            dict: A fresh copy of the cached result, or None on a miss
+        """
+        with self._lock:
+            serialized = self.memory.get(key)
+            if serialized is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(serialized)
+
+            if self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT result FROM sentiment_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._connection.execute(
+                        "UPDATE sentiment_cache SET last_access = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self._connection.commit()
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def get_many(self, keys):
+        """
+        Look many results up at once: one SELECT for the keys missing from memory, and their
+        last-access times refreshed with a single commit, so a batch of disk hits costs one disk sync
+
+        Args:
+            keys (list): Cache keys, duplicates allowed
+
+        Returns:
+            dict: key -> fresh copy of the cached result, for the keys that were found
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for key in dict.fromkeys(keys):
+                serialized = self.memory.get(key)
+                if serialized is not None:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    found[key] = serialized
+                else:
+                    missing.append(key)
+
+            rows = []
+            if self._connection is not None and missing:
+                # Stay well under SQLite's limit on bound parameters per statement
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows.extend(self._connection.execute(
+                        f"SELECT key, result FROM sentiment_cache WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                    ).fetchall())
+                if rows:
+                    now = time.time()
+                    self._connection.executemany(
+                        "UPDATE sentiment_cache SET last_access = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+                    self._connection.commit()
+                    for key, serialized in rows:
+                        self._remember(key, serialized)
+                        found[key] = serialized
+                    self.disk_hits += len(rows)
+
+            self.misses += len(missing) - len(rows)
+        return {key: json.loads(serialized) for key, serialized in found.items()}
+
+    def put(self, key, result):
+        """Store a JSON-serializable result in both tiers"""
+        self.put_many([(key, result)])
+
+    def put_many(self, items):
+        """
+        Store many results with a single SQLite commit, so a batch costs one disk sync
+
+        Args:
+            items (list): (key, JSON-serializable result) pairs
+        """
+        rows = [(key, json.dumps(result)) for key, result in items]
+        if not rows:
+            return
+        with self._lock:
+            for key, serialized in rows:
+                self._remember(key, serialized)
+            if self._connection is not None:
+                now = time.time()
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO sentiment_cache (key, result, last_access) VALUES (?, ?, ?)",
+                    [(key, serialized, now) for key, serialized in rows]
+                )
+                self._connection.commit()
+                self._puts_since_trim += len(rows)
+                if self._puts_since_trim >= self._trim_interval:
+                    self._trim_disk()
+
+    def stats(self):
+        """Return hit-rate statistics and tier sizes"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_entries = 0
+            if self._connection is not None:
+                disk_entries = self._connection.execute("SELECT COUNT(*) FROM sentiment_cache").fetchone()[0]
+            return {
+                "lookups": lookups,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 5) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "max_memory_entries": self.max_memory_entries,
+                "disk_entries": disk_entries,
+                "max_disk_entries": self.max_disk_entries if self._connection is not None else 0
+            }
+
+    def clear(self):
+        """Drop every cached result and reset the statistics"""
+        with self._lock:
+            self.memory.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM sentiment_cache")
+                self._connection.commit()
+
+    def _remember(self, key, serialized):
+        """Insert into the memory tier, evicting the least recently used entries"""
+        self.memory[key] = serialized
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _trim_disk(self):
+        """Delete the least recently used rows beyond the disk size bound"""
+        self._puts_since_trim = 0
+        count = self._connection.execute("SELECT COUNT(*) FROM sentiment_cache").fetchone()[0]
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._connection.execute(
+                "DELETE FROM sentiment_cache WHERE key IN "
+                "(SELECT key FROM sentiment_cache ORDER BY last_access LIMIT ?)", (excess,)
+            )
+            self._connection.commit()
+            logger.info(f"Trimmed {excess} entries from the sentiment cache")
@@ -0,0 +1,227 @@
+"""
+Versioned, pre-built spaCy pipelines with the attribute ruler and the agricultural gazetteer baked in.
+
+Build the bundles once, from the sentiment-analysis directory:
+    python spacy_bundle.py --build
+Every analyzer (and every worker process) then loads the same serialized pipeline with nlp.from_disk
+semantics instead of assembling it at startup.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import spacy
+from spacy.language import Language
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Span
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pipeline layout changes so stale bundles are rebuilt
+BUNDLE_VERSION = 2
+
+DEFAULT_BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "spacy-bundles")
+
+# doc.spans key the agricultural_matcher component writes its matches to
+AGRICULTURAL_SPAN_KEY = "agricultural_terms"
+
+# Tags forced on agricultural nouns by the attribute ruler of the full profile
+ATTRIBUTE_RULER_PATTERNS = [
+    {"patterns": [[{"ORTH": "rust"}]], "attrs": {"TAG": "NN"}},
+    {"patterns": [[{"ORTH": "mildew"}]], "attrs": {"TAG": "NN"}},
+    {"patterns": [[{"ORTH": "wheat"}]], "attrs": {"TAG": "NN"}},
+    {"patterns": [[{"ORTH": "barley"}]], "attrs": {"TAG": "NN"}},
+    {"patterns": [[{"ORTH": "disease"}]], "attrs": {"TAG": "NN"}},
+    {"patterns": [[{"ORTH": "infection"}]], "attrs": {"TAG": "NN"}}
+]
+
+DEFAULT_GAZETTEER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preprocessing", "gazetteer")
+
+def load_gazetteer(gazetteer_dir=None):
+    """
+    Read the agricultural vocabularies listed in the gazetteer manifest
+
+    Args:
+        gazetteer_dir (str): Directory with manifest.json and one term file per label.
+            Defaults to the SENTIMENT_GAZETTEER_DIR environment variable, then preprocessing/gazetteer
+    Returns:
+        dict: label -> list of terms, blank lines and # comments dropped
+    """
+    gazetteer_dir = gazetteer_dir or os.environ.get("SENTIMENT_GAZETTEER_DIR", DEFAULT_GAZETTEER_DIR)
+    with open(os.path.join(gazetteer_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    gazetteer = {}
+    for label, file_name in manifest["labels"].items():
+        with open(os.path.join(gazetteer_dir, file_name), 'r', encoding='utf-8') as f:
+            terms = [line.strip() for line in f]
+        gazetteer[label] = [term for term in terms if term and not term.startswith("#")]
+    return gazetteer
+
+def gazetteer_version(gazetteer):
+    """Hash of a gazetteer's terms, which versions the agricultural_terms it produces"""
+    return hashlib.sha256(json.dumps(gazetteer, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+def patterns_version(gazetteer):
+    """Hash of the ruler patterns and gazetteer, so a bundle built from older vocabulary is detected"""
+    return hashlib.sha256(
+        json.dumps([ATTRIBUTE_RULER_PATTERNS, gazetteer_version(gazetteer)], sort_keys=True).encode('utf-8')
+    ).hexdigest()[:12]
+
+class AgriculturalMatcher:
+    """Pipeline component matching the gazetteer with a PhraseMatcher and storing matches in doc.spans"""
+    def __init__(self, nlp, name="agricultural_matcher"):
+        self.nlp = nlp
+        self.name = name
+        self.patterns = {}
+        self.version = gazetteer_version(self.patterns)
+        # Matching on LOWER makes the gazetteer case-insensitive; lookup cost does not grow with its size
+        self.matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+
+    def add_patterns(self, patterns):
+        """Add gazetteer terms keyed by label"""
+        for label, terms in patterns.items():
+            self.patterns.setdefault(label, []).extend(terms)
+            self.matcher.add(label, list(self.nlp.tokenizer.pipe(terms)))
+        self.version = gazetteer_version(self.patterns)
+
+    def __call__(self, doc):
+        # Sorted so overlapping matches come out in a stable order
+        matches = sorted(self.matcher(doc), key=lambda match: (match[1], match[2], self.nlp.vocab.strings[match[0]]))
+        doc.spans[AGRICULTURAL_SPAN_KEY] = [Span(doc, start, end, label=match_id) for match_id, start, end in matches]
+        return doc
+
+    def _reset(self, patterns):
+        self.patterns = {}
+        self.matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        self.add_patterns(patterns)
+        return self
+
+    def to_bytes(self, exclude=tuple()):
+        return json.dumps(self.patterns).encode('utf-8')
+
+    def from_bytes(self, bytes_data, exclude=tuple()):
+        return self._reset(json.loads(bytes_data.decode('utf-8')))
+
+    def to_disk(self, path, exclude=tuple()):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / "patterns.json", 'w', encoding='utf-8') as f:
+            json.dump(self.patterns, f)
+
+    def from_disk(self, path, exclude=tuple()):
+        with open(Path(path) / "patterns.json", 'r', encoding='utf-8') as f:
+            return self._reset(json.load(f))
+
+@Language.factory("agricultural_matcher")
+def create_agricultural_matcher(nlp, name):
+    return AgriculturalMatcher(nlp, name)
+
+def build_pipeline(profile, spacy_model="en_core_web_sm", gazetteer=None):
+    """
+    Assemble the spaCy pipeline for a profile from scratch
+
+    Args:
+        profile (str): "lean" (tokenizer only) or "full" (en_core_web_sm components)
+        spacy_model (str): Package name or path of the pipeline the full profile starts from
+        gazetteer (dict): label -> terms for the agricultural_matcher. Defaults to load_gazetteer()
+    Returns:
+        Language: The pipeline, ending in the agricultural_matcher component
+    """
+    if profile == "lean":
+        # Preprocessing only reads is_stop, like_num and is_space, and the PhraseMatcher only
+        # uses LOWER; all of these come from the tokenizer and lexical attributes
+        nlp = spacy.blank("en")
+    else:
+        # Create spaCy model with all necessary components
+        nlp = spacy.load(spacy_model, disable=["ner"])  # Disable NER for faster processing
+        # Configure pipeline components
+        if "tagger" not in nlp.pipe_names:
+            nlp.add_pipe("tagger", before="parser")
+
+        if "attribute_ruler" not in nlp.pipe_names:
+            nlp.add_pipe("attribute_ruler", after="tagger")
+
+        # Configure attribute ruler patterns
+        ruler = nlp.get_pipe("attribute_ruler")
+        for pattern in ATTRIBUTE_RULER_PATTERNS:
+            ruler.add(pattern["patterns"], pattern["attrs"])
+
+    gazetteer = gazetteer if gazetteer is not None else load_gazetteer()
+    nlp.add_pipe("agricultural_matcher").add_patterns(gazetteer)
+    nlp.meta["sentiment_bundle"] = {
+        "version": BUNDLE_VERSION,
+        "profile": profile,
+        "patterns_version": patterns_version(gazetteer)
+    }
+    return nlp
+
+def bundle_path(profile, bundle_dir=None):
+    """Directory of the bundle for a profile at the current BUNDLE_VERSION"""
+    bundle_dir = bundle_dir or os.environ.get("SENTIMENT_SPACY_BUNDLE_DIR", DEFAULT_BUNDLE_DIR)
+    return os.path.join(bundle_dir, f"{profile}-v{BUNDLE_VERSION}")
+
+def build_bundle(profile, bundle_dir=None, spacy_model="en_core_web_sm"):
+    """
+    Build the pipeline for a profile and serialize it with nlp.to_disk
+
+    Returns:
+        str: The bundle directory
+    """
+    path = bundle_path(profile, bundle_dir)
+    build_pipeline(profile, spacy_model).to_disk(path)
+    logger.info(f"Wrote the {profile} spaCy bundle to {path}")
+    return path
+
+def load_bundle(profile, bundle_dir=None):
+    """
+    Load the pre-built pipeline for a profile
+
+    Returns:
+        Language, or None if no bundle was built or it is stale
+    """
+    path = bundle_path(profile, bundle_dir)
+    if not os.path.exists(path):
+        logger.info(f"No spaCy bundle at {path}, building the {profile} pipeline. Run 'python spacy_bundle.py --build' to pre-build it.")
+        return None
+
+    try:
+        nlp = spacy.load(path)
+    except Exception as e:
+        logger.error(f"Error loading spaCy bundle from {path}: {str(e)}. Building the pipeline instead.")
+        return None
+
+    meta = nlp.meta.get("sentiment_bundle", {})
+    if meta.get("profile") != profile or meta.get("patterns_version") != patterns_version(load_gazetteer()):
+        logger.warning(f"spaCy bundle at {path} was built from a different gazetteer or ruler patterns, building the pipeline instead. Rebuild it with 'python spacy_bundle.py --build'.")
+        return None
+    logger.info(f"Loaded the {profile} spaCy bundle from {path}")
+    return nlp
+
+if __name__ == '__main__':
+    import spacy.util
+    from spacy.cli import download
+    from model_artifacts import DEFAULT_SPACY_MODEL, load_manifest, resolve_artifact_dir, spacy_model_path
+
+    parser = argparse.ArgumentParser(description="Build the serialized spaCy pipeline bundles")
+    parser.add_argument("--build", action="store_true", help="Build and serialize the pipelines")
+    parser.add_argument("--profile", choices=["lean", "full", "all"], default="all")
+    parser.add_argument("--dir", default=None, help="Bundle directory (default SENTIMENT_SPACY_BUNDLE_DIR or models/spacy-bundles)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.build:
+        # Build the full profile from the pinned artifact copy when there is one
+        artifact_dir = resolve_artifact_dir()
+        source_model = DEFAULT_SPACY_MODEL
+        if artifact_dir:
+            source_model = spacy_model_path(artifact_dir, load_manifest(artifact_dir).get("spacy_model", DEFAULT_SPACY_MODEL))
+        elif args.profile != "lean" and not spacy.util.is_package(source_model):
+            download(source_model)
+        for profile in (["lean", "full"] if args.profile == "all" else [args.profile]):
+            build_bundle(profile, args.dir, source_model)
+    else:
+        parser.print_help()
@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import time
+from unittest import mock
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autotune import autotune_on_startup, host_fingerprint, load_tuning, run_sweep, save_tuning, synthetic_corpus
+
+class FakeAnalyzer:
+    """int8 is fastest but flips labels, bf16 is faster than fp32 and agrees with it"""
+    SECONDS_PER_POST = {"fp32": 0.0004, "bf16": 0.0002, "int8": 0.0001}
+
+    def __init__(self):
+        self.precision = "fp32"
+        self.batch_size = 64
+        self.model_id = "fake-model"
+        self.backend = "torch"
+        self.tuning = None
+        self.analysed = 0
+
+    def set_precision(self, precision):
+        self.precision = precision
+
+    def clean_text(self, text):
+        return text.lower()
+
+    def analyze_cleaned_batch(self, cleaned_texts, batch_size=None):
+        self.analysed += len(cleaned_texts)
+        time.sleep(self.SECONDS_PER_POST[self.precision] * len(cleaned_texts))
+        label = "negative" if self.precision == "int8" else "positive"
+        return [{"sentiment": {"sentiment": label}} for _ in cleaned_texts]
+
+class TestAutotune(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "autotune.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_synthetic_corpus(self):
+        """Test the corpus is reproducible and mentions gazetteer terms"""
+        corpus = synthetic_corpus(50)
+        self.assertEqual(len(corpus), 50)
+        self.assertEqual(corpus, synthetic_corpus(50))
+        self.assertNotEqual(corpus, synthetic_corpus(50, seed=7))
+
+    def test_sweep_selects_fastest_accurate_configuration(self):
+        """Test a faster precision that changes labels is rejected and the analyzer is left tuned"""
+        analyzer = FakeAnalyzer()
+        tuning = run_sweep(analyzer, synthetic_corpus(40), threads=[1], batch_sizes=[8, 16],
+                           precisions=["bf16", "int8"])
+        self.assertEqual(len(tuning["results"]), 6)
+        self.assertEqual(tuning["selected"]["precision"], "bf16")
+        self.assertEqual(analyzer.precision, "bf16")
+        self.assertEqual(analyzer.batch_size, tuning["selected"]["batch_size"])
+        int8_result = next(result for result in tuning["results"] if result["precision"] == "int8")
+        self.assertEqual(int8_result["label_agreement"], 0.0)
+
+    def test_tuning_is_host_specific(self):
+        """Test a saved tuning loads back on this host and is ignored from another one"""
+        tuning = run_sweep(FakeAnalyzer(), synthetic_corpus(10), threads=[1], batch_sizes=[8], precisions=["fp32"])
+        save_tuning(tuning, self.path)
+        self.assertEqual(load_tuning(self.path)["selected"], tuning["selected"])
+
+        tuning["host"] = dict(host_fingerprint(), cpu_count=(os.cpu_count() or 1) + 1)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(tuning, f)
+        self.assertIsNone(load_tuning(self.path))
+        self.assertIsNone(load_tuning(os.path.join(self.tmp_dir.name, "missing.json")))
+
+    def test_pool_shape(self):
+        """Test with an inference pool only the per-worker thread count is measured and recorded"""
+        with mock.patch.dict(os.environ, {"SENTIMENT_POOL_WORKERS": "2", "SENTIMENT_POOL_THREADS": "3"}):
+            tuning = run_sweep(FakeAnalyzer(), synthetic_corpus(10), threads=[1, 2], batch_sizes=[8],
+                               precisions=["fp32"])
+            self.assertEqual({result["torch_threads"] for result in tuning["results"]}, {3})
+            self.assertEqual(tuning["pool"], {"workers": 2, "threads_per_worker": 3})
+            save_tuning(tuning, self.path)
+            self.assertIsNotNone(load_tuning(self.path))
+        with mock.patch.dict(os.environ, {"SENTIMENT_POOL_WORKERS": "0"}):
+            self.assertIsNone(load_tuning(self.path))
+
+    def test_startup_sweep_runs_out_of_process(self):
+        """Test the startup sweep leaves the server process without inference and applies the result"""
+        def sweep_in_subprocess(command, cwd=None):
+            save_tuning(run_sweep(FakeAnalyzer(), synthetic_corpus(20), threads=[1], batch_sizes=[8],
+                                  precisions=["bf16"]), command[command.index("--output") + 1])
+            return mock.Mock(returncode=0)
+
+        analyzer = FakeAnalyzer()
+        with mock.patch.dict(os.environ, {"SENTIMENT_AUTOTUNE": "1"}), \
+                mock.patch("autotune.subprocess.run", side_effect=sweep_in_subprocess):
+            tuning = autotune_on_startup(analyzer, self.path)
+        self.assertEqual(analyzer.analysed, 0)
+        self.assertEqual(analyzer.precision, tuning["selected"]["precision"])
+        self.assertEqual(analyzer.batch_size, 8)
+        self.assertIs(analyzer.tuning, tuning)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,14 @@
 import unittest
 import sys
 import os
+import tempfile
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from combined_analyzer import CombinedAnalyzer
+from model_artifacts import fetch_artifacts
+from sentiment_cache import SentimentCache
 import json
 
 class TestCombinedAnalyzer(unittest.TestCase):
@@ -45,6 +48,15 @@ class TestCombinedAnalyzer(unittest.TestCase):
         self.assertIn("wheat", found_entities)
         self.assertIn("rust", found_entities)
 
+    def test_offsets_point_into_original_text(self):
+        """Test term and entity offsets refer to the raw input, not the cleaned text"""
+        test_text = "Update https://t.co/xyz #farming: Our WHEAT has stem-rust!!"
+        result = self.analyzer.analyze_text(test_text)
+        
+        self.assertTrue(result["agricultural_terms"])
+        for term in result["agricultural_terms"] + result["entities"]:
+            self.assertEqual(test_text[term["start"]:term["end"]].lower().replace("-", " "), term["text"])
+
     def test_sentiment_analysis(self):
         """Test sentiment analysis"""
         test_text = "Wheat plants showing severe rust infection"
@@ -57,6 +69,17 @@ class TestCombinedAnalyzer(unittest.TestCase):
         self.assertIn("sentiment", sentiment)
         self.assertIn("neutral_leaning", sentiment)
 
+    def test_long_text_sliding_windows(self):
+        """Test long texts are split into overlapping token windows and combined"""
+        long_text = "healthy wheat crop " * 300 + "severe rust outbreak " * 300
+        windows = self.analyzer._score_windows([long_text, "short post"])
+        
+        self.assertGreater(len(windows["texts"]), 2)
+        self.assertEqual(list(windows["doc_index"]).count(1), 1)
+        sentiment = self.analyzer.sentiment_analysis(long_text)
+        total = sentiment["positive"] + sentiment["negative"] + sentiment["neutral"]
+        self.assertAlmostEqual(total, 1.0, places=3)
+
     def test_error_handling(self):
         """Test error handling and edge cases"""
         # Test empty text
@@ -104,5 +127,98 @@ class TestCombinedAnalyzer(unittest.TestCase):
         self.assertIn("wheat", found_terms)
         self.assertIn("rust", found_terms)
 
+    def test_analyze_batch(self):
+        """Test batched analysis matches single-text analysis"""
+        test_texts = [
+            "Wheat plants showing severe rust infection",
+            "Healthy barley field",
+            "",
+            "wheat " * 450
+        ]
+        results = self.analyzer.analyze_batch(test_texts, batch_size=2)
+        
+        self.assertEqual(len(results), len(test_texts))
+        for text, result in zip(test_texts, results):
+            expected = self.analyzer.analyze_text(text)
+            self.assertEqual(result["processed_text"], expected["processed_text"])
+            self.assertEqual(result["sentiment"]["sentiment"], expected["sentiment"]["sentiment"])
+            self.assertAlmostEqual(result["sentiment"]["compound"], expected["sentiment"]["compound"], places=3)
+
+    def test_int8_precision(self):
+        """Test int8 quantization stays close to fp32"""
+        analyzer = CombinedAnalyzer(precision="int8")
+        self.assertEqual(analyzer.precision, "int8")
+        report = analyzer.evaluate_precision(["Wheat plants showing severe rust infection",
+                                              "Healthy barley field"])
+        self.assertEqual(report["samples"], 2)
+        self.assertLess(report["max_probability_drift"], 0.2)
+
+    def test_onnx_backend_falls_back_to_torch(self):
+        """Test the ONNX backend falls back to torch when no graph is exported"""
+        os.environ["SENTIMENT_ONNX_PATH"] = os.path.join(os.path.dirname(__file__), "missing.onnx")
+        try:
+            analyzer = CombinedAnalyzer(backend="onnx")
+        finally:
+            del os.environ["SENTIMENT_ONNX_PATH"]
+        self.assertEqual(analyzer.backend, "torch")
+        self.assertIsNone(analyzer.onnx_backend)
+        self.assertIn("sentiment", analyzer.analyze_text("Healthy barley field"))
+
+    def test_cascade_tiers(self):
+        """Test short neutral posts skip RoBERTa in cascade mode while sentiment-bearing ones do not"""
+        self.assertEqual(self.analyzer.analyze_text("Field day at the research station on Friday")["tier"], "model")
+
+        analyzer = CombinedAnalyzer(cascade=True, cascade_threshold=0.8, cache=SentimentCache(max_memory_entries=1))
+        neutral, negative = analyzer.analyze_batch(["Field day at the research station on Friday",
+                                                    "Severe stem rust and leaf spot wiped out the infected wheat"])
+        self.assertEqual(neutral["tier"], "cascade")
+        self.assertEqual(neutral["sentiment"]["sentiment"], "Neutral")
+        self.assertEqual(negative["tier"], "model")
+
+        report = analyzer.evaluate_cascade(["Field day at the research station on Friday"], thresholds=(0.8,))
+        self.assertEqual(report["thresholds"][0]["skipped_share"], 1.0)
+
+    def test_rescore_from_raw_probabilities(self):
+        """Test stored raw scores re-score to the same sentiment without running the model"""
+        long_text = " ".join(["The wheat crop looks healthy but rust is spreading in the north paddock."] * 80)
+        results = self.analyzer.analyze_batch(["Severe rust infection in wheat", long_text])
+        self.assertGreater(len(results[1]["sentiment_raw"]["spans"]), 1)
+
+        rescorer = CombinedAnalyzer.for_rescoring()
+        self.assertEqual(rescorer.keywords_version, self.analyzer.keywords_version)
+        rescored = rescorer.rescore_sentiment([result["processed_text"] for result in results],
+                                              [result["sentiment_raw"] for result in results])
+        for result, sentiment in zip(results, rescored):
+            self.assertEqual(sentiment["sentiment"], result["sentiment"]["sentiment"])
+            self.assertAlmostEqual(sentiment["compound"], result["sentiment"]["compound"], places=4)
+
+    def test_fast_tier_falls_back_without_student(self):
+        """Test the fast tier falls back to the full model when no student has been distilled"""
+        os.environ["SENTIMENT_STUDENT_PATH"] = os.path.join(os.path.dirname(__file__), "missing-student")
+        try:
+            analyzer = CombinedAnalyzer(model_tier="fast", cache=SentimentCache(max_memory_entries=1))
+        finally:
+            del os.environ["SENTIMENT_STUDENT_PATH"]
+        self.assertEqual(analyzer.model_tier, "full")
+        self.assertEqual(analyzer.model_id, self.analyzer.model_id)
+
+    def test_offline_artifact_dir(self):
+        """Test a fetched artifact directory loads without the Hub and scores like the Hub model"""
+        with tempfile.TemporaryDirectory() as artifact_dir:
+            fetch_artifacts(artifact_dir, self.analyzer.model_id)
+            os.environ["HF_HUB_OFFLINE"] = "1"
+            try:
+                analyzer = CombinedAnalyzer(artifact_dir=artifact_dir, spacy_profile="full",
+                                            cache=SentimentCache(max_memory_entries=1))
+            finally:
+                del os.environ["HF_HUB_OFFLINE"]
+
+        self.assertEqual(analyzer.model_id, self.analyzer.model_id)
+        for phase in ("spacy_pipeline", "sentiment_model", "total"):
+            self.assertIn(phase, analyzer.startup_timings)
+        text = "Wheat plants showing severe rust infection"
+        self.assertAlmostEqual(analyzer.sentiment_analysis(text)["compound"],
+                               self.analyzer.sentiment_analysis(text)["compound"], places=4)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
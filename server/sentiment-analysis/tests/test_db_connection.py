@@ -0,0 +1,464 @@
+import unittest
+import sys
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import OperationFailure
+
+from db_connection import BACKLOG_STATS_ID, IN_PROGRESS, POST_ID_INDEX, UNANALYSED_INDEX, db_connection
+
+MISSING = object()
+
+def condition_holds(value, condition):
+    """One field condition: equality (None also matches a missing field) or a few operators"""
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for operator, operand in condition.items():
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$ne" and condition_holds(value, operand):
+                return False
+            if operator == "$exists" and (value is not MISSING) != operand:
+                return False
+            if operator == "$not" and condition_holds(value, operand):
+                return False
+            if operator == "$gt" and (value in (MISSING, None) or not value > operand):
+                return False
+            if operator == "$lte" and (value in (MISSING, None) or not value <= operand):
+                return False
+        return True
+    if condition is None:
+        return value in (MISSING, None)
+    return value == condition
+
+def matches(document, query):
+    """Enough of MongoDB's query language for the queries db_connection sends"""
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif not condition_holds(document.get(field, MISSING), condition):
+            return False
+    return True
+
+def apply_update(document, update):
+    document.update(update.get("$set", {}))
+    for field, amount in update.get("$inc", {}).items():
+        document[field] = document.get(field, 0) + amount
+    for field in update.get("$unset", {}):
+        document.pop(field, None)
+
+def query_fields(query):
+    """Field names a query filters on, looking inside $and"""
+    fields = []
+    for field, condition in query.items():
+        if field == "$and":
+            for clause in condition:
+                fields.extend(query_fields(clause))
+        else:
+            fields.append(field)
+    return fields
+
+class FakeCursor(list):
+    def __init__(self, documents, collection, query):
+        super().__init__(documents)
+        self.collection = collection
+        self.query = query
+
+    def limit(self, count):
+        return FakeCursor(self[:count], self.collection, self.query)
+
+    def explain(self):
+        """A winning plan that scans the first index on a queried field, nested like SBE plans"""
+        fields = query_fields(self.query)
+        for name, info in self.collection.indexes.items():
+            if info["key"][0][0] in fields:
+                scan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": name}}
+                return {"queryPlanner": {"winningPlan": {"queryPlan": scan}}}
+        return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+def make_db():
+    """A db_connection over fake collections set by the test, without connecting"""
+    db = db_connection.__new__(db_connection)
+    db.lease_seconds = 300
+    db._routes = OrderedDict()
+    db.route_cache_size = 1000
+    db.analysis_stats_collection = FakeCollection("analysis_stats")
+    db.backlog_ttl = 60
+    db.backlog_reconcile_seconds = 600
+    db._backlog = None
+    db._backlog_expires = 0.0
+    return db
+
+class FakeCollection:
+    """In-memory stand-in for a pymongo collection that counts round trips"""
+    def __init__(self, name, documents=()):
+        self.name = name
+        self.documents = [dict({"_id": f"{name}-{index}"}, **document) for index, document in enumerate(documents)]
+        self.round_trips = 0
+        self.indexes = {"_id_": {"key": [("_id", 1)]}}
+
+    def index_information(self):
+        return self.indexes
+
+    def create_index(self, keys, name, unique=False, partialFilterExpression=None):
+        if unique:
+            values = [document.get(keys[0][0]) for document in self.documents]
+            if len(values) != len(set(values)):
+                raise OperationFailure("E11000 duplicate key error", code=11000)
+        self.indexes.setdefault(name, {"key": keys, "unique": unique})
+        return name
+
+    def bulk_write(self, operations, ordered=True):
+        self.round_trips += 1
+        modified = 0
+        for operation in operations:
+            for document in self.documents:
+                if matches(document, operation._filter):
+                    apply_update(document, operation._doc)
+                    modified += 1
+                    break
+        return SimpleNamespace(modified_count=modified)
+
+    def update_many(self, query, update):
+        self.round_trips += 1
+        matched = [document for document in self.documents if matches(document, query)]
+        for document in matched:
+            apply_update(document, update)
+        return SimpleNamespace(modified_count=len(matched))
+
+    def update_one(self, query, update, upsert=False):
+        self.round_trips += 1
+        for document in self.documents:
+            if matches(document, query):
+                apply_update(document, update)
+                return SimpleNamespace(matched_count=1, modified_count=1)
+        if upsert:
+            document = {field: value for field, value in query.items() if not field.startswith("$")}
+            apply_update(document, update)
+            self.documents.append(document)
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    def find_one_and_update(self, query, update, projection=None):
+        self.round_trips += 1
+        for document in self.documents:
+            if matches(document, query):
+                before = dict(document)
+                apply_update(document, update)
+                return before
+        return None
+
+    def count_documents(self, query):
+        self.round_trips += 1
+        return sum(1 for document in self.documents if matches(document, query))
+
+    def find_one(self, query, projection=None):
+        self.round_trips += 1
+        return next((dict(document) for document in self.documents if matches(document, query)), None)
+
+    def find(self, query, projection=None):
+        self.round_trips += 1
+        return FakeCursor([dict(document) for document in self.documents if matches(document, query)], self, query)
+
+class TestBulkWriteBack(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db()
+        self.db.tweet_posts_collection = FakeCollection("tweets", [{"post_id": "t1"}, {"post_id": "t2"}])
+        self.db.reddit_posts_collection = FakeCollection("reddit_posts", [{"post_id": "r1"}])
+        self.db.bluesky_posts_collection = FakeCollection("bluesky_posts", [{"post_id": "b1"}])
+
+    def test_updates_grouped_by_collection(self):
+        """Test each collection gets one bulk write and every post reports success"""
+        status = self.db.update_posts_sentiment_bulk([
+            ("t1", {"sentiment": {"sentiment": "positive"}, "language": "en"}, "Twitter"),
+            ("t2", {"sentiment": {"sentiment": "negative"}}, "Twitter"),
+            ("r1", {"sentiment": {"sentiment": "neutral"}}, "Reddit")
+        ])
+        self.assertEqual(status, {"t1": True, "t2": True, "r1": True})
+        self.assertEqual(self.db.tweet_posts_collection.round_trips, 1)
+        self.assertEqual(self.db.reddit_posts_collection.round_trips, 1)
+        self.assertEqual(self.db.bluesky_posts_collection.round_trips, 0)
+        tweet = self.db.tweet_posts_collection.documents[0]
+        self.assertEqual(tweet["sentiment_status"], "processed")
+        self.assertEqual(tweet["language"], "en")
+        self.assertNotIn("language", self.db.tweet_posts_collection.documents[1])
+
+    def test_per_post_failure(self):
+        """Test posts missing from their collection are reported individually"""
+        status = self.db.update_posts_sentiment_bulk([
+            ("t1", {"sentiment": {"sentiment": "positive"}}, "Twitter"),
+            ("missing", {"sentiment": {"sentiment": "positive"}}, "Twitter")
+        ])
+        self.assertEqual(status, {"t1": True, "missing": False})
+
+    def test_unknown_source_tries_every_collection(self):
+        """Test posts without a source are found in whichever collection holds them"""
+        status = self.db.mark_posts_analysis_skipped([
+            ("b1", "Unsupported language: de", "de", None),
+            ("r1", "No content to analyse", None, None)
+        ])
+        self.assertEqual(status, {"b1": True, "r1": True})
+        self.assertEqual(self.db.bluesky_posts_collection.documents[0]["language"], "de")
+        self.assertTrue(self.db.reddit_posts_collection.documents[0]["sentiment_analysis_skipped"])
+
+        status = self.db.mark_posts_analysis_failed([("t2", "model error", None)])
+        self.assertEqual(status, {"t2": True})
+        self.assertEqual(self.db.tweet_posts_collection.documents[1]["sentiment_error"], "model error")
+
+class TestPostRouting(unittest.TestCase):
+    TWEET_ID = "1790000000000000001"
+    REDDIT_ID = "1cq2x9z"
+    BLUESKY_ID = "bafyreib" + "a" * 52
+
+    def setUp(self):
+        self.db = make_db()
+        self.db.tweet_posts_collection = FakeCollection("tweets", [{"post_id": self.TWEET_ID}])
+        self.db.reddit_posts_collection = FakeCollection("reddit_posts", [{"post_id": self.REDDIT_ID}])
+        self.db.bluesky_posts_collection = FakeCollection("bluesky_posts", [{"post_id": self.BLUESKY_ID}])
+
+    def round_trips(self):
+        return [collection.round_trips for collection in (
+            self.db.tweet_posts_collection, self.db.reddit_posts_collection, self.db.bluesky_posts_collection
+        )]
+
+    def test_id_shape_routes_to_one_collection(self):
+        """Test posts without a source are written with one round trip to their own collection"""
+        status = self.db.update_posts_sentiment_bulk([
+            (post_id, {"sentiment": {"sentiment": "neutral"}}, None)
+            for post_id in (self.TWEET_ID, self.REDDIT_ID, self.BLUESKY_ID)
+        ])
+        self.assertTrue(all(status.values()))
+        self.assertEqual(self.round_trips(), [1, 1, 1])
+
+        post, source = self.db.find_post_by_id(self.BLUESKY_ID)
+        self.assertEqual(post["post_id"], self.BLUESKY_ID)
+        self.assertEqual(source, "bluesky")
+        self.assertEqual(self.round_trips(), [1, 1, 2])
+
+    def test_route_cache(self):
+        """Test a post found outside the collection its ID points to is routed there next time"""
+        # Reddit-shaped, but stored with the tweets
+        self.db.tweet_posts_collection.documents.append({"post_id": "abc123"})
+        self.assertEqual(self.db.mark_post_analysis_failed("abc123", "model error"), True)
+        self.assertEqual(self.round_trips(), [1, 1, 0])
+
+        self.assertEqual(self.db.route_post("abc123")[0], "Twitter")
+        self.assertEqual(self.db.mark_post_analysis_skipped("abc123", "No content to analyse"), True)
+        self.assertEqual(self.round_trips(), [2, 1, 0])
+
+    def test_claimed_posts_are_routed(self):
+        """Test posts handed out by a claim are written straight back to their collection"""
+        self.db.tweet_posts_collection = FakeCollection("tweets", [{"post_id": "t1", "sentiment": None}])
+        _, posts = self.db.claim_posts("worker-a", 5, "Twitter")
+        self.assertEqual([post["post_id"] for post in posts], ["t1"])
+        self.assertEqual(self.db.route_post("t1")[0], "Twitter")
+
+    def test_source_spelling(self):
+        """Test sources are matched in any case and by collection name"""
+        self.assertIs(self.db.get_collection_for_source("bluesky"), self.db.bluesky_posts_collection)
+        self.assertIs(self.db.get_collection_for_source("TWITTER"), self.db.tweet_posts_collection)
+        self.assertIs(self.db.get_collection_for_source("reddit_posts"), self.db.reddit_posts_collection)
+
+        post, source = self.db.find_post_by_id(self.TWEET_ID, "twitter")
+        self.assertEqual(source, "twitter")
+        self.assertEqual(self.round_trips(), [1, 0, 0])
+
+class TestBacklogCounters(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db()
+        self.db.tweet_posts_collection = FakeCollection("tweets", [
+            {"post_id": "t1", "sentiment": None}, {"post_id": "t2", "sentiment": {"sentiment": "positive"}}
+        ])
+        self.db.reddit_posts_collection = FakeCollection("reddit_posts", [
+            {"post_id": f"r{index}", "sentiment": None} for index in range(4)
+        ])
+        self.db.bluesky_posts_collection = FakeCollection("bluesky_posts")
+        self.stats = self.db.analysis_stats_collection
+
+    def counted_collections(self):
+        return sum(collection.round_trips for collection in (
+            self.db.tweet_posts_collection, self.db.reddit_posts_collection, self.db.bluesky_posts_collection
+        ))
+
+    def stored_counts(self):
+        return next(document for document in self.stats.documents if document["_id"] == BACKLOG_STATS_ID)
+
+    def test_reads_are_served_from_counters(self):
+        """Test only the first read counts the collections and reads within the TTL cost nothing"""
+        expected = {"total": 5, "twitter": 1, "reddit": 4, "bluesky": 0}
+        self.assertEqual(self.db.get_unanalysed_count(), expected)
+        self.assertEqual(self.counted_collections(), 3)
+        self.assertEqual(self.stored_counts()["reddit"], 4)
+
+        self.assertEqual(self.db.get_unanalysed_count(), expected)
+        self.db._backlog_expires = 0.0
+        self.assertEqual(self.db.get_unanalysed_count(), expected)
+        self.assertEqual(self.counted_collections(), 3)
+        # find_one and the reconcile write, then one find_one once the TTL ran out
+        self.assertEqual(self.stats.round_trips, 3)
+
+    def test_write_back_decrements(self):
+        """Test posts written back leave the backlog, and re-analysed posts do not count twice"""
+        self.db.get_unanalysed_count()
+        self.db.update_posts_sentiment_bulk([
+            ("r0", {"sentiment": {"sentiment": "neutral"}}, "Reddit"),
+            ("r1", {"sentiment": {"sentiment": "neutral"}}, "Reddit")
+        ])
+        self.db.mark_posts_analysis_failed([("r2", "model error", "Reddit")])
+        self.assertEqual(self.db.get_unanalysed_count()["reddit"], 1)
+        self.assertEqual(self.stored_counts()["reddit"], 1)
+
+        self.db.update_post_sentiment("t2", {"sentiment": {"sentiment": "negative"}}, "Twitter")
+        self.assertEqual(self.db.get_unanalysed_count()["twitter"], 1)
+        self.db.update_post_sentiment("t1", {"sentiment": {"sentiment": "negative"}}, "Twitter")
+        self.assertEqual(self.db.get_unanalysed_count(), {"total": 1, "twitter": 0, "reddit": 1, "bluesky": 0})
+
+    def test_rewrites_do_not_decrement(self):
+        """Test writing back posts that already left the queue leaves the counters where they are"""
+        self.db.get_unanalysed_count()
+        result = {"sentiment": {"sentiment": "neutral"}}
+        self.assertEqual(self.db.update_posts_sentiment_bulk([("r0", result, "Reddit")]), {"r0": True})
+        self.assertEqual(self.stored_counts()["reddit"], 3)
+
+        # An already processed post and a post written twice are still written, but counted once
+        status = self.db.update_posts_sentiment_bulk([("t2", result, "Twitter"), ("r0", result, "Reddit")])
+        self.assertEqual(status, {"t2": True, "r0": True})
+        self.assertEqual(self.db.mark_posts_analysis_skipped([("r0", "No content to analyse", None, "Reddit")]),
+                         {"r0": True})
+        self.assertEqual((self.stored_counts()["twitter"], self.stored_counts()["reddit"]), (1, 3))
+        self.assertEqual(self.db.get_unanalysed_count(), {"total": 4, "twitter": 1, "reddit": 3, "bluesky": 0})
+        self.assertEqual(self.db.get_unanalysed_count(refresh=True)["total"], 4)
+
+    def test_reconcile(self):
+        """Test drifted counters are recounted once they are older than the reconcile interval"""
+        self.db.get_unanalysed_count()
+        self.stored_counts().update(reddit=40, reconciled_at=datetime.utcnow() - timedelta(seconds=601))
+        self.db._backlog_expires = 0.0
+        self.assertEqual(self.db.get_unanalysed_count()["reddit"], 4)
+
+        self.stored_counts().update(reddit=40)
+        self.assertEqual(self.db.get_unanalysed_count(refresh=True)["reddit"], 4)
+
+class TestEnsureIndexes(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db()
+        self.db.tweet_posts_collection = FakeCollection("tweets", [{"post_id": "t1"}, {"post_id": "t2"}])
+        self.db.reddit_posts_collection = FakeCollection("reddit_posts", [{"post_id": "r1"}, {"post_id": "r1"}])
+        self.db.bluesky_posts_collection = FakeCollection("bluesky_posts")
+        self.db.bluesky_posts_collection.indexes["post_id_1"] = {"key": [("post_id", 1)], "unique": True}
+
+    def test_indexes_created_and_used(self):
+        """Test the queue and post_id indexes are created once and explain() shows them in use"""
+        report = self.db.ensure_indexes()
+        self.assertEqual(report["tweets"], {
+            "post_id_index": POST_ID_INDEX,
+            "queue_index": UNANALYSED_INDEX,
+            "post_id_lookup_indexed": True,
+            "queue_query_indexed": True
+        })
+        self.assertTrue(self.db.tweet_posts_collection.indexes[POST_ID_INDEX]["unique"])
+        # An existing post_id index is reused rather than duplicated
+        self.assertEqual(report["bluesky_posts"]["post_id_index"], "post_id_1")
+        self.assertNotIn(POST_ID_INDEX, self.db.bluesky_posts_collection.indexes)
+        self.assertEqual(self.db.ensure_indexes(), report)
+
+    def test_duplicate_post_ids_fall_back_to_plain_index(self):
+        """Test a collection with duplicate post_ids still gets its lookups indexed"""
+        report = self.db.ensure_indexes()
+        self.assertEqual(report["reddit_posts"]["post_id_index"], "post_id")
+        self.assertFalse(self.db.reddit_posts_collection.indexes["post_id"]["unique"])
+        self.assertTrue(report["reddit_posts"]["post_id_lookup_indexed"])
+
+class TestWorkClaiming(unittest.TestCase):
+    def setUp(self):
+        self.db = make_db()
+        self.db.tweet_posts_collection = FakeCollection("tweets")
+        self.db.reddit_posts_collection = FakeCollection("reddit_posts", [
+            {"post_id": f"r{index}", "content_text": "wheat rust", "sentiment": None} for index in range(6)
+        ])
+        self.db.bluesky_posts_collection = FakeCollection("bluesky_posts")
+
+    def reddit_post(self, post_id):
+        return next(post for post in self.db.reddit_posts_collection.documents if post["post_id"] == post_id)
+
+    def test_workers_get_disjoint_posts(self):
+        """Test two workers never claim the same post and claimed posts are in progress"""
+        claim_a, posts_a = self.db.claim_posts("worker-a", 4, "Reddit")
+        claim_b, posts_b = self.db.claim_posts("worker-b", 4, "Reddit")
+        ids_a = {post["post_id"] for post in posts_a}
+        ids_b = {post["post_id"] for post in posts_b}
+        self.assertEqual(len(ids_a), 4)
+        self.assertEqual(len(ids_b), 2)
+        self.assertFalse(ids_a & ids_b)
+        self.assertNotEqual(claim_a, claim_b)
+        post = self.reddit_post(posts_a[0]["post_id"])
+        self.assertEqual(post["sentiment_status"], IN_PROGRESS)
+        self.assertEqual(post["sentiment_claimed_by"], "worker-a")
+        self.assertEqual(self.db.claim_posts("worker-c", 4, "Reddit")[1], [])
+
+    def test_write_back_ends_claim(self):
+        """Test written posts lose their lease and released posts return to the queue"""
+        claim_id, posts = self.db.claim_posts("worker-a", 2, "Reddit")
+        written, unwritten = posts[0]["post_id"], posts[1]["post_id"]
+        self.db.update_posts_sentiment_bulk([(written, {"sentiment": {"sentiment": "negative"}}, "Reddit")])
+        self.assertEqual(self.reddit_post(written)["sentiment_status"], "processed")
+        self.assertNotIn("sentiment_claim_id", self.reddit_post(written))
+
+        self.assertEqual(self.db.release_claims([claim_id]), 1)
+        self.assertNotIn("sentiment_status", self.reddit_post(unwritten))
+        reclaimed = {post["post_id"] for post in self.db.claim_posts("worker-b", 10, "Reddit")[1]}
+        self.assertIn(unwritten, reclaimed)
+        self.assertNotIn(written, reclaimed)
+
+    def test_expired_leases(self):
+        """Test renewal extends a lease and the reaper returns expired ones"""
+        claim_id, posts = self.db.claim_posts("worker-a", 6, "Reddit", lease_seconds=60)
+        post = self.reddit_post(posts[0]["post_id"])
+        expires_at = post["sentiment_lease_expires_at"]
+        self.assertEqual(self.db.renew_leases([claim_id], lease_seconds=600), 6)
+        self.assertGreater(post["sentiment_lease_expires_at"], expires_at)
+
+        # The worker died and its leases ran out
+        for document in self.db.reddit_posts_collection.documents:
+            document["sentiment_lease_expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+        self.assertEqual(self.db.release_expired_leases(), 6)
+        self.assertNotIn("sentiment_claimed_by", post)
+        self.assertEqual(len(self.db.claim_posts("worker-b", 10, "Reddit")[1]), 6)
+
+    def test_stale_claim_cannot_write_back(self):
+        """Test a worker whose lease expired cannot overwrite the post or claim of the worker that reclaimed it"""
+        stale_claim, posts = self.db.claim_posts("worker-a", 2, "Reddit", lease_seconds=60)
+        analysed, failed = posts[0]["post_id"], posts[1]["post_id"]
+        for document in self.db.reddit_posts_collection.documents:
+            document["sentiment_lease_expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+        self.db.release_expired_leases()
+        new_claim, _ = self.db.claim_posts("worker-b", 6, "Reddit")
+
+        collections = (self.db.tweet_posts_collection, self.db.reddit_posts_collection, self.db.bluesky_posts_collection)
+        round_trips = [collection.round_trips for collection in collections]
+        status = self.db.update_posts_sentiment_bulk(
+            [(analysed, {"sentiment": {"sentiment": "negative"}}, "Reddit")], stale_claim
+        )
+        self.assertEqual(status, {analysed: None})
+        self.assertEqual(self.db.mark_posts_analysis_failed([(failed, "model error", None)], stale_claim), {failed: None})
+        for post_id in (analysed, failed):
+            post = self.reddit_post(post_id)
+            self.assertEqual(post["sentiment_claim_id"], new_claim)
+            self.assertEqual(post["sentiment_status"], IN_PROGRESS)
+            self.assertNotIn("sentiment_updated_at", post)
+        # Lost leases are not looked for in the other collections: a bulk write and a read-back each
+        self.assertEqual([collection.round_trips for collection in collections],
+                         [round_trips[0], round_trips[1] + 4, round_trips[2]])
+
+        status = self.db.update_posts_sentiment_bulk(
+            [(analysed, {"sentiment": {"sentiment": "negative"}}, "Reddit")], new_claim
+        )
+        self.assertEqual(status, {analysed: True})
+        self.assertNotIn("sentiment_claim_id", self.reddit_post(analysed))
+
+if __name__ == '__main__':
+    unittest.main()
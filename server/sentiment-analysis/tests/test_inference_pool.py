@@ -0,0 +1,48 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_pool import InferencePool
+
+class FakeAnalyzer:
+    """Tags each result with the process that produced it"""
+    def __init__(self):
+        self.cache = object()
+        self.spacy_processes = 4
+
+    def analyze_cleaned_batch(self, cleaned_texts):
+        if "fail" in cleaned_texts:
+            raise ValueError("model error")
+        return [{"processed_text": text, "pid": os.getpid(), "cache": self.cache} for text in cleaned_texts]
+
+    def analyze_batch(self, texts, runner=None):
+        return runner(texts)
+
+class TestInferencePool(unittest.TestCase):
+    def setUp(self):
+        self.pool = InferencePool(FakeAnalyzer(), workers=2, threads_per_worker=1, chunk_size=3, timeout=30)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_results_keep_input_order(self):
+        """Test chunks scored in worker processes come back in input order"""
+        texts = [f"post {i}" for i in range(10)]
+        results = self.pool.analyze_batch(texts)
+        self.assertEqual([result["processed_text"] for result in results], texts)
+        self.assertNotIn(os.getpid(), {result["pid"] for result in results})
+        # Workers drop the parent's cache
+        self.assertTrue(all(result["cache"] is None for result in results))
+
+    def test_worker_error_is_raised(self):
+        """Test a failing chunk raises in the caller and the pool keeps serving"""
+        with self.assertRaises(RuntimeError):
+            self.pool.analyze_batch(["fail"])
+        self.assertEqual(self.pool.analyze_batch(["ok"])[0]["processed_text"], "ok")
+        self.assertEqual(self.pool.stats()["alive_workers"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_lexicon import KeywordLexicon
+
+class TestKeywordLexicon(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.lexicon = KeywordLexicon(
+            {"green": 0.1, "abundant": 0.1, "abundant harvest": 0.2, "disease-free": 0.1},
+            {"Blight": -0.1, "pest infestation": -0.3, "weak": 0.1}
+        )
+
+    def hit_keywords(self, text):
+        return sorted(self.lexicon.keywords[column] for column in self.lexicon.hits(text))
+
+    def test_word_boundaries(self):
+        """Test keywords do not match inside longer words"""
+        self.assertEqual(self.hit_keywords("greenhouse tomatoes"), [])
+        self.assertEqual(self.hit_keywords("green shoots"), ["green"])
+
+    def test_nested_and_case_insensitive_keywords(self):
+        """Test phrases and the keywords they start with both count, regardless of case"""
+        self.assertEqual(self.hit_keywords("An ABUNDANT harvest despite blight"),
+                         ["abundant", "abundant harvest", "blight"])
+        self.assertEqual(self.hit_keywords("disease-free seed"), ["disease-free"])
+
+    def test_adjustment(self):
+        """Test each keyword counts once and negative weights are subtracted"""
+        self.assertAlmostEqual(self.lexicon.adjustment("abundant harvest, abundant harvest"), 0.3)
+        self.assertAlmostEqual(self.lexicon.adjustment("weak plants after pest infestation"), -0.4)
+        self.assertEqual(self.lexicon.adjustment(""), 0.0)
+
+    def test_batch_matches_single(self):
+        """Test the sparse batch product equals per-text adjustments"""
+        texts = ["green abundant harvest", "weak blight", "nothing here", ""]
+        matrix = self.lexicon.hit_matrix(texts)
+        self.assertEqual(matrix.shape, (4, len(self.lexicon)))
+        np.testing.assert_allclose(self.lexicon.adjustments(texts),
+                                   [self.lexicon.adjustment(text) for text in texts])
+
+if __name__ == '__main__':
+    unittest.main()
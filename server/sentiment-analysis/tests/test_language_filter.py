@@ -0,0 +1,35 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from language_filter import LanguageFilter, LanguageIdentifier, UNDETERMINED
+
+@unittest.skipIf(LanguageIdentifier is None, "langid is not installed")
+class TestLanguageFilter(unittest.TestCase):
+    def setUp(self):
+        self.language_filter = LanguageFilter(allowed_languages=["en"], min_confidence=0.9, min_letters=20)
+
+    def test_detects_language(self):
+        """Test English posts are analysed and clearly foreign posts are not"""
+        english = self.language_filter.detect("The wheat harvest looks much better than last year after the rain")
+        german = self.language_filter.detect("Die Weizenernte sieht nach dem Regen viel besser aus als im letzten Jahr")
+        spanish = self.language_filter.detect("La cosecha de trigo se ve mucho mejor que el año pasado después de la lluvia")
+        self.assertEqual(english, "en")
+        self.assertEqual(german, "de")
+        self.assertEqual(spanish, "es")
+        self.assertTrue(self.language_filter.should_analyse(english))
+        self.assertFalse(self.language_filter.should_analyse(german))
+        self.assertFalse(self.language_filter.should_analyse(spanish))
+
+    def test_short_posts_are_undetermined(self):
+        """Test posts with too few letters, once links and tags are removed, are analysed anyway"""
+        language = self.language_filter.detect("Regen! #weizen @bauer https://example.com/ernte")
+        self.assertEqual(language, UNDETERMINED)
+        self.assertTrue(self.language_filter.should_analyse(language))
+        self.assertTrue(self.language_filter.should_analyse(None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_keeper import LeaseKeeper
+
+class FakeDb:
+    """Records the claim API calls the keeper makes"""
+    lease_seconds = 300
+
+    def __init__(self):
+        self.renewed = []
+        self.released = []
+        self.reaped = 0
+
+    def claim_posts(self, worker_id, limit, source=None):
+        return f"claim-{len(self.released)}", [{"post_id": "p1"}] if limit else []
+
+    def renew_leases(self, claim_ids):
+        self.renewed.append(sorted(claim_ids))
+
+    def release_claims(self, claim_ids):
+        self.released.extend(claim_ids)
+
+    def release_expired_leases(self):
+        self.reaped += 1
+
+class TestLeaseKeeper(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDb()
+        # Renewals are driven by hand rather than by the background thread
+        self.keeper = LeaseKeeper(self.db, worker_id="worker-a", interval=3600)
+
+    def tearDown(self):
+        self.keeper.stop()
+
+    def test_renews_only_active_claims(self):
+        """Test claims are renewed until released, and expired leases are reaped on every pass"""
+        claim_id, posts = self.keeper.claim(10)
+        self.assertEqual(len(posts), 1)
+        self.keeper.renew()
+        self.assertEqual(self.db.renewed, [[claim_id]])
+
+        self.keeper.release(claim_id)
+        self.assertEqual(self.db.released, [claim_id])
+        self.keeper.renew()
+        self.assertEqual(self.db.renewed, [[claim_id]])
+        self.assertEqual(self.db.reaped, 2)
+        self.assertEqual(self.keeper.stats(), {"worker_id": "worker-a", "active_claims": 0})
+
+    def test_empty_claims_are_not_tracked(self):
+        """Test a claim that found no posts is never renewed"""
+        self.keeper.claim(0)
+        self.assertEqual(self.keeper.stats()["active_claims"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
+import tempfile
 import unittest
 from combined_analyzer import CombinedAnalyzer
+from spacy_bundle import AGRICULTURAL_SPAN_KEY, build_bundle, build_pipeline, load_bundle, load_gazetteer
 
 class TestPreprocessing(unittest.TestCase):
     @classmethod
@@ -104,5 +106,60 @@ class TestPreprocessing(unittest.TestCase):
         self.assertIn("excellent", processed_text4.split(),
                      f"Word 'excellent' should be preserved in: {text4}")
 
+    def test_preprocess_batch(self):
+        """Test batch preprocessing keeps order and ids and matches single-text preprocessing"""
+        texts = ["Wheat plants showing severe rust infection",
+                 "Test!@#$%^&*() preprocessing",
+                 "",
+                 "Powdery mildew on barley in early spring"]
+        ids = ["post-a", "post-b", "post-c", "post-d"]
+        results = self.analyzer.preprocess_batch(texts, ids=ids, batch_size=2)
+        
+        self.assertEqual([result["id"] for result in results], ids)
+        for text, result in zip(texts, results):
+            expected = self.analyzer.preprocess_text(text)
+            self.assertEqual(result["processed_text"], expected["processed_text"])
+            self.assertEqual(result["tokens"], expected["tokens"])
+            self.assertEqual(result["agricultural_terms"], expected["agricultural_terms"])
+
+    def test_lean_profile_matches_full_profile(self):
+        """Test the lean spaCy profile produces the same tokens and Matcher output as the full one"""
+        self.assertEqual(self.analyzer.spacy_profile, "lean")
+        full_analyzer = CombinedAnalyzer(spacy_profile="full")
+        texts = ["Wheat plants showing severe rust infection",
+                 "Powdery mildew and leaf spot on barley in early spring",
+                 "The crops are not infected, 20 hectares of canola look healthy",
+                 "Root rot and stem canker after the July floods"]
+        for text in texts:
+            lean = self.analyzer.preprocess_text(text)
+            full = full_analyzer.preprocess_text(text)
+            self.assertEqual(lean["processed_text"], full["processed_text"])
+            self.assertEqual(lean["agricultural_terms"], full["agricultural_terms"])
+
+    def test_spacy_bundle_round_trip(self):
+        """Test a serialized bundle loads with its patterns and matches like a freshly built pipeline"""
+        with tempfile.TemporaryDirectory() as bundle_dir:
+            build_bundle("lean", bundle_dir)
+            nlp = load_bundle("lean", bundle_dir)
+        self.assertIsNotNone(nlp)
+        self.assertIn("agricultural_matcher", nlp.pipe_names)
+
+        text = "powdery mildew and leaf spot on barley in early spring"
+        bundled = [(span.text, span.label_) for span in nlp(text).spans[AGRICULTURAL_SPAN_KEY]]
+        built = [(span.text, span.label_) for span in build_pipeline("lean")(text).spans[AGRICULTURAL_SPAN_KEY]]
+        self.assertEqual(bundled, built)
+        self.assertIn(("barley", "CROP"), bundled)
+
+    def test_gazetteer_phrase_matching(self):
+        """Test gazetteer terms match case-insensitively as whole tokens, overlaps included, in a stable order"""
+        gazetteer = load_gazetteer()
+        self.assertEqual(set(gazetteer), {"DISEASE", "CROP", "SYMPTOM", "SEASONAL"})
+        self.assertIn("powdery mildew", gazetteer["DISEASE"])
+
+        nlp = build_pipeline("lean", gazetteer={"DISEASE": ["Stripe Rust", "rust"], "PEST": ["russian wheat aphid"]})
+        doc = nlp("STRIPE rust and Russian wheat aphid, not rusty")
+        self.assertEqual([(span.text, span.label_) for span in doc.spans[AGRICULTURAL_SPAN_KEY]],
+                         [("STRIPE rust", "DISEASE"), ("rust", "DISEASE"), ("Russian wheat aphid", "PEST")])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import threading
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_batcher import RequestBatcher
+
+class FakeAnalyzer:
+    """Records each batch it receives and echoes the texts back"""
+    def __init__(self):
+        self.batches = []
+
+    def analyze_batch(self, texts):
+        self.batches.append(list(texts))
+        if "fail" in texts:
+            raise ValueError("model error")
+        return [{"processed_text": text} for text in texts]
+
+class TestRequestBatcher(unittest.TestCase):
+    def test_concurrent_requests_are_coalesced(self):
+        """Test concurrent callers share one batch and each get their own result"""
+        analyzer = FakeAnalyzer()
+        batcher = RequestBatcher(analyzer, max_wait_ms=200, max_tokens=10000, max_batch_size=16)
+        results = {}
+
+        def call(text):
+            results[text] = batcher.analyze_text(text, timeout=5)
+
+        threads = [threading.Thread(target=call, args=(f"post {i}",)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.stop()
+
+        for i in range(8):
+            self.assertEqual(results[f"post {i}"]["processed_text"], f"post {i}")
+        self.assertLess(len(analyzer.batches), 8)
+        self.assertEqual(batcher.stats()["requests"], 8)
+
+    def test_token_budget_splits_batches(self):
+        """Test a request that would exceed the token budget goes to the next batch"""
+        analyzer = FakeAnalyzer()
+        batcher = RequestBatcher(analyzer, max_wait_ms=200, max_tokens=60, max_batch_size=16)
+        long_text = "x" * 200  # ~52 estimated tokens
+        futures = [batcher.submit(long_text + str(i)) for i in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+        batcher.stop()
+
+        self.assertEqual([len(batch) for batch in analyzer.batches], [1, 1, 1])
+
+    def test_errors_reach_every_caller(self):
+        """Test a failed batch raises for every request in it"""
+        analyzer = FakeAnalyzer()
+        batcher = RequestBatcher(analyzer, max_wait_ms=200, max_tokens=10000, max_batch_size=2)
+        futures = [batcher.submit("fail"), batcher.submit("ok")]
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(timeout=5)
+        batcher.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment_cache import SentimentCache
+
+class TestSentimentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "cache.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_versions(self):
+        """Test a model or lexicon change produces a different key"""
+        key = SentimentCache.make_key("wheat rust", "model-a", "lexicon-1")
+        self.assertEqual(key, SentimentCache.make_key("wheat rust", "model-a", "lexicon-1"))
+        self.assertNotEqual(key, SentimentCache.make_key("wheat rust", "model-b", "lexicon-1"))
+        self.assertNotEqual(key, SentimentCache.make_key("wheat rust", "model-a", "lexicon-2"))
+
+    def test_memory_lru_eviction(self):
+        """Test the memory tier evicts the least recently used entry"""
+        cache = SentimentCache(max_memory_entries=2)
+        cache.put("a", {"value": 1})
+        cache.put("b", {"value": 2})
+        cache.get("a")
+        cache.put("c", {"value": 3})
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"value": 1})
+        self.assertEqual(cache.get("c"), {"value": 3})
+
+    def test_disk_tier_survives_restart(self):
+        """Test results persist on disk and are promoted to memory"""
+        SentimentCache(max_memory_entries=10, db_path=self.db_path).put("a", {"value": 1})
+
+        cache = SentimentCache(max_memory_entries=10, db_path=self.db_path)
+        self.assertEqual(cache.get("a"), {"value": 1})
+        self.assertEqual(cache.get("a"), {"value": 1})
+        stats = cache.stats()
+        self.assertEqual(stats["disk_hits"], 1)
+        self.assertEqual(stats["memory_hits"], 1)
+        self.assertEqual(stats["hit_rate"], 1.0)
+
+    def test_disk_size_bound(self):
+        """Test the disk tier is trimmed to its size bound"""
+        cache = SentimentCache(max_memory_entries=1, db_path=self.db_path, max_disk_entries=5)
+        for i in range(20):
+            cache.put(str(i), {"value": i})
+        self.assertLessEqual(cache.stats()["disk_entries"], 5)
+        self.assertIsNotNone(cache.get("19"))
+
+    def test_put_many_commits_once(self):
+        """Test a batch of results is written to disk with a single commit"""
+        cache = SentimentCache(max_memory_entries=100, db_path=self.db_path)
+        statements = []
+        cache._connection.set_trace_callback(statements.append)
+        cache.put_many([(str(i), {"value": i}) for i in range(50)])
+        cache._connection.set_trace_callback(None)
+
+        self.assertEqual(sum(statement.upper().startswith("COMMIT") for statement in statements), 1)
+        self.assertEqual(cache.stats()["disk_entries"], 50)
+        reopened = SentimentCache(max_memory_entries=10, db_path=self.db_path)
+        self.assertEqual(reopened.get("49"), {"value": 49})
+
+    def test_get_many_commits_once(self):
+        """Test a batch of disk hits refreshes last access with a single commit"""
+        SentimentCache(max_memory_entries=100, db_path=self.db_path).put_many(
+            [(str(i), {"value": i}) for i in range(50)]
+        )
+        cache = SentimentCache(max_memory_entries=100, db_path=self.db_path)
+        statements = []
+        cache._connection.set_trace_callback(statements.append)
+        found = cache.get_many([str(i) for i in range(50)] + ["0", "missing"])
+        cache._connection.set_trace_callback(None)
+
+        self.assertEqual(sum(statement.upper().startswith("COMMIT") for statement in statements), 1)
+        self.assertEqual(len(found), 50)
+        self.assertEqual(found["49"], {"value": 49})
+        stats = cache.stats()
+        self.assertEqual((stats["disk_hits"], stats["misses"]), (50, 1))
+        # Now served from memory
+        self.assertEqual(cache.get_many(["0"]), {"0": {"value": 0}})
+        self.assertEqual(cache.stats()["memory_hits"], 1)
+
+    def test_results_are_copies(self):
+        """Test callers cannot mutate cached results"""
+        cache = SentimentCache()
+        cache.put("a", {"entities": []})
+        cache.get("a")["entities"].append("rust")
+        self.assertEqual(cache.get("a"), {"entities": []})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_cleaning import TokenFilter, clean_batch_with_offsets, clean_text_with_offsets
+
+class TestTextCleaning(unittest.TestCase):
+    def test_strips_urls_mentions_and_special_characters(self):
+        """Test one pass removes URLs, mentions, hashtags and punctuation"""
+        cleaned, _ = clean_text_with_offsets("Wheat RUST spotted!! @farmer #harvest see https://example.com/a?b=1 :(")
+        self.assertEqual(cleaned, "wheat rust spotted see")
+        self.assertEqual(clean_text_with_offsets(None)[0], "")
+
+    def test_urls_glued_to_words(self):
+        """Test a URL directly after a word or mention is removed as it would be on its own"""
+        self.assertEqual(clean_text_with_offsets("crophttps://example.com blight")[0], "crop blight")
+        self.assertEqual(clean_text_with_offsets("@userwww.example.com blight")[0], "blight")
+        # Without anything after the scheme it is not a URL
+        self.assertEqual(clean_text_with_offsets("http:// www. wheat")[0], "http www wheat")
+
+    def test_batch_matches_single(self):
+        """Test batch cleaning gives the same texts and offsets as cleaning one post at a time"""
+        texts = ["Rust on the WHEAT", "", None, "İstanbul barley https://x.y #tag barley"]
+        batch = clean_batch_with_offsets(texts)
+        for text, (cleaned, offset_map) in zip(texts, batch):
+            single_cleaned, single_map = clean_text_with_offsets(text)
+            self.assertEqual(cleaned, single_cleaned)
+            self.assertEqual(offset_map.to_original(0), single_map.to_original(0))
+
+    def test_offsets_map_to_original(self):
+        """Test cleaned offsets point at the same word in the original text, including after case changes"""
+        for text in ["Check https://x.y the WHEAT rust", "İİ wheat rust"]:
+            cleaned, offset_map = clean_text_with_offsets(text)
+            start = cleaned.index("rust")
+            original_start = offset_map.to_original(start)
+            original_end = offset_map.to_original(start + len("rust"), end=True)
+            self.assertEqual(text[original_start:original_end], "rust")
+
+class TestTokenFilter(unittest.TestCase):
+    def make_token(self, text, orth, is_stop=False, like_num=False):
+        return SimpleNamespace(text=text, orth=orth, is_space=text.isspace(), is_stop=is_stop, like_num=like_num)
+
+    def test_filters_tokens(self):
+        """Test stopwords, numbers, short tokens, punctuation and tags are filtered"""
+        token_filter = TokenFilter({"farm"})
+        self.assertTrue(token_filter.keep(self.make_token("wheat", 1)))
+        self.assertFalse(token_filter.keep(self.make_token("the", 2, is_stop=True)))
+        self.assertFalse(token_filter.keep(self.make_token("farm", 3)))
+        self.assertFalse(token_filter.keep(self.make_token("42", 4, like_num=True)))
+        self.assertFalse(token_filter.keep(self.make_token("a", 5)))
+        self.assertFalse(token_filter.keep(self.make_token("?!", 6)))
+        self.assertFalse(token_filter.keep(self.make_token("#crop", 7)))
+        self.assertFalse(token_filter.keep(self.make_token("  ", 8)))
+
+    def test_decision_is_remembered(self):
+        """Test each vocabulary entry is decided once"""
+        token_filter = TokenFilter(set())
+        token_filter.keep(self.make_token("wheat", 1))
+        # The same orth is answered from the set without looking at the token again
+        self.assertTrue(token_filter.keep(self.make_token("ignored", 1, is_stop=True)))
+
+if __name__ == '__main__':
+    unittest.main()
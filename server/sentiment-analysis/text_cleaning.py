@@ -0,0 +1,137 @@
+import bisect
+import re
+
+# Word characters up to, but not into, the start of a URL. Only an 'h' or 'w' can start
+# one, so runs of other word characters are taken whole and the check runs on those two
+URL_SAFE_WORD = r'(?:[^\Whw]+|h(?!ttps?://\S)|w(?!ww\.\S))+'
+
+# One pass over the lowered text: URLs and hashtags/mentions match without the group,
+# words are the group. Special characters, emojis and whitespace fall between matches.
+# Because words stop where a URL starts, "@userhttps://x" and "texthttps://x" split the
+# same way as when URLs were removed in a pass of their own
+CLEANING_PATTERN = re.compile(
+    r'https?://\S+|www\.\S+'
+    r'|[@#]' + URL_SAFE_WORD +
+    r'|(' + URL_SAFE_WORD + r')'
+)
+
+PUNCTUATION_TOKEN = re.compile(r'[^\w\s]+')
+
+class OffsetMap:
+    """
+    Maps character offsets in a cleaned text back to the original text. Built lazily, since
+    most cleaned texts are never asked for an offset
+    """
+    __slots__ = ("text", "lowered", "_words")
+
+    def __init__(self, text, lowered):
+        self.text = text
+        self.lowered = lowered
+        self._words = None
+
+    def _build(self):
+        """Find where each cleaned word starts, in the cleaned and in the lowered text"""
+        cleaned_starts = []
+        lowered_starts = []
+        position = 0
+        for match in CLEANING_PATTERN.finditer(self.lowered):
+            if match.lastindex:
+                cleaned_starts.append(position)
+                lowered_starts.append(match.start(1))
+                position += len(match.group(1)) + 1
+
+        # lower() changes the length of a few characters, keep a per-character map back when it does
+        original_index = None
+        if len(self.lowered) != len(self.text):
+            original_index = []
+            for index, char in enumerate(self.text):
+                original_index.extend([index] * len(char.lower()))
+            original_index.append(len(self.text))
+        self._words = (cleaned_starts, lowered_starts, original_index)
+
+    def to_original(self, cleaned_offset, end=False):
+        """Map a character offset in the cleaned text to the original text"""
+        if self._words is None:
+            self._build()
+        cleaned_starts, lowered_starts, original_index = self._words
+        if not cleaned_starts:
+            return 0
+        # For an end offset, look up the character just before it
+        lookup = cleaned_offset - 1 if end else cleaned_offset
+        word = max(0, bisect.bisect_right(cleaned_starts, lookup) - 1)
+        lowered_offset = lowered_starts[word] + (cleaned_offset - cleaned_starts[word])
+        if original_index is None:
+            return lowered_offset
+        if end:
+            return original_index[lowered_offset - 1] + 1
+        return original_index[lowered_offset]
+
+def clean_text_with_offsets(text):
+    """
+    Lowercase the text and strip URLs, hashtags, mentions and special characters in one regex pass
+    Args:
+        text (str): The raw input text, None is treated as empty
+    Returns:
+        tuple: (cleaned_text, OffsetMap)
+    """
+    text = text or ""
+    lowered = text.lower()
+    # URL and mention matches come back as empty strings
+    return ' '.join(filter(None, CLEANING_PATTERN.findall(lowered))), OffsetMap(text, lowered)
+
+def clean_batch_with_offsets(texts):
+    """
+    Clean a batch of texts
+    Args:
+        texts (list): The raw input texts
+    Returns:
+        list: (cleaned_text, OffsetMap) per text, in input order
+    """
+    findall = CLEANING_PATTERN.findall
+    results = []
+    for text in texts:
+        text = text or ""
+        lowered = text.lower()
+        results.append((' '.join(filter(None, findall(lowered))), OffsetMap(text, lowered)))
+    return results
+
+class TokenFilter:
+    """
+    Decide which spaCy tokens are kept as content tokens. Every check reads lexical
+    attributes only, so the decision is made once per vocabulary entry and then served
+    from a set of known orth IDs
+    """
+    def __init__(self, stopwords):
+        """
+        Args:
+            stopwords (set): Domain stopwords skipped on top of spaCy's own
+        """
+        self.stopwords = set(stopwords)
+        self._kept = set()
+        self._skipped = set()
+
+    def keep(self, token):
+        """Whether a token belongs in the processed text"""
+        orth = token.orth
+        if orth in self._kept:
+            return True
+        if orth in self._skipped:
+            return False
+        kept = self._decide(token)
+        (self._kept if kept else self._skipped).add(orth)
+        return kept
+
+    def _decide(self, token):
+        text = token.text
+        return not (
+            # Whitespace, stopwords (including articles like 'the' and pronouns like 'it'),
+            # domain stopwords, numbers and single characters
+            token.is_space
+            or token.is_stop
+            or text in self.stopwords
+            or token.like_num
+            or len(text) <= 1
+            # Special characters, hashtags and mentions
+            or PUNCTUATION_TOKEN.fullmatch(text)
+            or text[0] in "@#"
+        )
@@ -24,6 +24,8 @@ print(f"[OK] Loaded DB name: {os.getenv('MONGO_DB_NAME')}")
 client = MongoClient(os.getenv("MONGO_URI"))
 db = client[os.getenv("MONGO_DB_NAME", "social-listening")]
 collection = db["tweets"]
+# Unanalysed post counters kept by the sentiment-analysis service (see its db_connection.py)
+stats_collection = db["analysis_stats"]
 
 # Print debug information to help with troubleshooting
 print(f"{datetime.now()} - Twitter Scraper Starting")
@@ -664,6 +666,11 @@ async def main_async():
                 print(f"[INFO] {datetime.now()} - Successfully saved tweet to MongoDB")
             except Exception as e:
                 print(f"[INFO] {datetime.now()} - Error saving to MongoDB:", e)
+            else:
+                try:
+                    stats_collection.update_one({"_id": "unanalysed_backlog"}, {"$inc": {"twitter": 1}})
+                except Exception as e:
+                    print(f"[INFO] {datetime.now()} - Error updating the unanalysed tweet count:", e)
             print(f'{datetime.now()} - Got {tweet_count} tweets total (Batch {total_batches+1}: {current_batch_count}/{batch_size})')
             
             # If we've reached our batch size, take a break but don't exit the scraper